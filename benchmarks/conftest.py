@@ -0,0 +1,43 @@
+""" pytest-benchmark configuration: every benchmark runs on synthetic data,
+with the modules that read from the data folder pointed to a synthetic one.
+"""
+
+""" IMPORTS """
+from core import synthetic
+from core import GCP_flux
+from core import inv_flux
+from core import trendy_flux
+from core import feedbacks
+
+import pytest
+
+
+""" SETUP """
+# (resolution in degrees, number of months) of the gridded benchmarks.
+SIZES = {
+    '5deg-10yr': (5., 120),
+    '2deg-20yr': (2., 240),
+    '1deg-40yr': (1., 480)
+}
+
+@pytest.fixture(scope='session', autouse=True)
+def data_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('synthetic')) + '/'
+    synthetic.write_data_dir(directory)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(inv_flux, 'MAIN_DIR', directory)
+        mp.setattr(trendy_flux, 'MAIN_DIR', directory)
+        mp.setattr(GCP_flux, 'GCP_FNAME', directory + 'data/GCP/budget.csv')
+        mp.setattr(GCP_flux, 'CO2_FNAME', directory + 'data/CO2/co2_year.csv')
+        mp.setattr(GCP_flux, 'CACHE_DIR', None)
+        GCP_flux.cached_csv.files.clear()
+
+        yield directory
+
+    GCP_flux.cached_csv.files.clear()
+    feedbacks.clear()
+
+@pytest.fixture(params=list(SIZES))
+def size(request):
+    return SIZES[request.param]
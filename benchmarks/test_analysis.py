@@ -0,0 +1,103 @@
+""" Benchmarks: trends, feedback fits and the airborne fraction.
+"""
+
+""" IMPORTS """
+from core import synthetic
+from core import inv_flux
+from core import gridded
+from core import FeedbackAnalysis
+from core import AirborneFraction
+from core import af_montecarlo
+from core import feedbacks
+
+import numpy as np
+
+import pytest
+
+
+""" SETUP """
+INVF_MODELS = ('Rayner', 'JENA_s76', 'JENA_s85', 'CTRACKER', 'CAMS',
+               'JAMSTEC')
+
+def inputs():
+    """ Returns the yearly co2 and temperature inputs of the fits.
+    """
+
+    co2 = synthetic.co2_series()
+    temp = synthetic.timeseries(('Earth', 'South', 'Tropical', 'North'),
+                                1957, 2018, co2, seed=1)
+
+    return co2, temp
+
+def invf_uptake():
+    return {model: synthetic.timeseries(seed=i)
+            for i, model in enumerate(INVF_MODELS)}
+
+def trendy_uptake(n_models):
+    return {
+        sim: {'year': {f"model{i}": synthetic.timeseries(seed=i + offset)
+                       for i in range(n_models)}}
+        for sim, offset in (('S1', 0), ('S3', n_models))
+    }
+
+
+""" BENCHMARKS """
+@pytest.mark.parametrize('window_size', [10, 25])
+def test_cascading_window_trend(benchmark, window_size):
+    df = inv_flux.Analysis(synthetic.timeseries())
+
+    benchmark(df.cascading_window_trend, 'Earth_Land', window_size)
+
+def test_gridded_cascading_window_trend(benchmark, size):
+    resolution, periods = size
+    cube = synthetic.trendy_cube(resolution, start='1959-01',
+                                 periods=periods // 12, freq='YS',
+                                 calendar='gregorian', nan=None)
+
+    df = gridded.SpatialTrend(cube['nbp'], co2=synthetic.co2_series())
+
+    benchmark(df.cascading_window_trend, 5)
+
+def test_invf_feedback(benchmark):
+    co2, temp = inputs()
+    uptake = invf_uptake()
+
+    benchmark(FeedbackAnalysis.INVF, co2, temp, uptake, 'Earth_Land')
+
+@pytest.mark.parametrize('n_models', [5, 20])
+def test_trendy_feedback(benchmark, n_models):
+    co2, temp = inputs()
+    uptake = trendy_uptake(n_models)
+
+    benchmark(FeedbackAnalysis.TRENDY, 'year', co2, temp, uptake,
+              'Earth_Land')
+
+def test_invf_window_af(benchmark):
+    co2, temp = inputs()
+    df = AirborneFraction.INVF(co2, temp, invf_uptake())
+
+    def setup():
+        feedbacks.clear()
+        df._window_params = None
+
+    benchmark.pedantic(df.window_af, setup=setup, rounds=5)
+
+@pytest.mark.parametrize('n_rates', [10, 1000])
+def test_af_surface(benchmark, n_rates):
+    co2, temp = inputs()
+    df = AirborneFraction.TRENDY(co2, temp, trendy_uptake(20))
+    df.window_params()
+
+    emission_rates = np.linspace(0.005, 0.05, n_rates)
+    rhos = np.linspace(1.5, 2.5, 11)
+
+    benchmark(df.af_surface, emission_rates, rho=rhos)
+
+@pytest.mark.parametrize('n_samples', [10**4, 10**5])
+def test_af_monte_carlo(benchmark, n_samples):
+    co2, temp = inputs()
+    df = AirborneFraction.TRENDY(co2, temp, trendy_uptake(5))
+    mc = af_montecarlo.AFMonteCarlo(df.window_params(),
+                                    emission_rate=(0.02, 0.002))
+
+    benchmark(mc.run, n_samples, processes=1)
@@ -0,0 +1,66 @@
+""" Benchmarks: spatial aggregation of the gridded inputs.
+"""
+
+""" IMPORTS """
+from core import synthetic
+from core import inv_flux
+from core import trendy_flux
+from core import TEMP
+from core import regions
+from core import kernels
+
+import pytest
+
+
+""" BENCHMARKS """
+def test_inv_latitudinal_splits(benchmark, size):
+    resolution, periods = size
+    df = inv_flux.SpatialAgg(synthetic.inversion_cube(resolution,
+                                                      periods=periods))
+
+    benchmark(df.latitudinal_splits)
+
+def test_inv_regional_masks(benchmark, size):
+    resolution, periods = size
+    cube = synthetic.inversion_cube(resolution, periods=periods)
+    df = inv_flux.SpatialAgg(cube)
+    masks = regions.latitudinal_masks(cube.latitude, cube.longitude)
+
+    benchmark(df.regional_masks, masks)
+
+def test_trendy_latitudinal_splits(benchmark, size):
+    resolution, periods = size
+    df = trendy_flux.SpatialAgg(
+        synthetic.trendy_cube(resolution, periods=periods),
+        time_resolution='M', model='CABLE-POP' # regridded
+    )
+
+    benchmark(df.latitudinal_splits)
+
+def test_inv_seasonal_uptake(benchmark, size):
+    resolution, periods = size
+    cube = synthetic.inversion_cube(resolution, periods=periods)
+    df = inv_flux.SpatialAgg(cube)
+    df.lat_split_ds = df.regional_masks(
+        regions.latitudinal_masks(cube.latitude, cube.longitude)
+    )
+
+    benchmark(df.seasonal_uptake)
+
+def test_temp_latitudinal_splits(benchmark, size):
+    resolution, periods = size
+    df = TEMP.SpatialAve(synthetic.hadcrut_cube(resolution, periods=periods))
+
+    benchmark(df.latitudinal_splits)
+
+@pytest.mark.parametrize('engine', ['numpy', 'numba'])
+def test_regional_sums(benchmark, size, engine):
+    if engine == 'numba' and not kernels.HAS_NUMBA:
+        pytest.skip("numba is not installed")
+    resolution, periods = size
+    cube = synthetic.inversion_cube(resolution, periods=periods)
+    masks = regions.latitudinal_masks(cube.latitude, cube.longitude)
+    weights = masks.weights(cube.latitude.values, cube.longitude.values)
+
+    benchmark(kernels.regional_sums, cube.Terrestrial_flux.values, weights,
+              engine=engine)
@@ -7,7 +7,7 @@ Run this script from the bash shell. """
 import sys
 import os
 from core import GCP_flux
-import pickle
+from core import storage
 import matplotlib.pyplot as plt
 import xarray as xr
 from tqdm import tqdm
@@ -34,24 +34,20 @@ def cascading_window_trend(indep, variable):
     roll_df, r_df = df.cascading_window_trend(indep, window_size, True, True, True)
 
     CASCADING_OUTPUT_DIR = f"{output_folder}/window_size{str(window_size)}/"
-    try:
-        plt.savefig(CASCADING_OUTPUT_DIR +
-                    f"cascading_window_{str(window_size)}_{variable}_{indep}.png")
-    except FileNotFoundError:
-        os.mkdir(CASCADING_OUTPUT_DIR)
-        plt.savefig(CASCADING_OUTPUT_DIR +
-                    f"cascading_window_{str(window_size)}_{variable}_{indep}.png")
-
-    pickle.dump(roll_df, open(CASCADING_OUTPUT_DIR +
-            f"cascading_window_{str(window_size)}_{variable}_{indep}.pik", "wb"))
-    pickle.dump(r_df, open(CASCADING_OUTPUT_DIR +
-        f"cascading_window_pearson_{str(window_size)}_{variable}_{indep}.pik", "wb"))
+    os.makedirs(CASCADING_OUTPUT_DIR, exist_ok=True)
+    plt.savefig(CASCADING_OUTPUT_DIR +
+                f"cascading_window_{str(window_size)}_{variable}_{indep}.png")
+
+    storage.save_result(roll_df, CASCADING_OUTPUT_DIR +
+            f"cascading_window_{str(window_size)}_{variable}_{indep}")
+    storage.save_result(r_df, CASCADING_OUTPUT_DIR +
+        f"cascading_window_pearson_{str(window_size)}_{variable}_{indep}")
 
 def psd(variable):
 
     psd = df.psd(plot=True)
     plt.savefig(f"{output_folder}/psd_{variable}.png")
-    pickle.dump(psd, open(f"{output_folder}/psd_{variable}.pik", "wb"))
+    storage.save_result(psd, f"{output_folder}/psd_{variable}")
 
 def bandpass(variable):
     bandpass = df.bandpass(fc, btype=btype)
@@ -59,13 +55,10 @@ def bandpass(variable):
     BANDPASS_OUTPUT_DIR = f"{output_folder}/period{period}/"
 
     bandpass_fname = (BANDPASS_OUTPUT_DIR +
-                      f"bandpass_{period}_{btype}_{variable}.pik")
+                      f"bandpass_{period}_{btype}_{variable}")
 
-    try:
-        pickle.dump(bandpass, open(bandpass_fname, "wb"))
-    except FileNotFoundError:
-        os.mkdir(BANDPASS_OUTPUT_DIR)
-        pickle.dump(bandpass, open(bandpass_fname, "wb"))
+    os.makedirs(BANDPASS_OUTPUT_DIR, exist_ok=True)
+    storage.save_result(bandpass, bandpass_fname)
 
 
 """ EXECUTION """
@@ -9,16 +9,18 @@ sys.path.append("./../../../core/")
 
 import os
 import inv_flux
-import pickle
+from core import storage
 import matplotlib.pyplot as plt
-import xarray as xr
 from tqdm import tqdm
 
 
 """ INPUTS """
+# <model output folder>/<timeres>.nc, which need not exist as a file (see
+# storage.open_output).
 input_file = sys.argv[1]
-model_name = input_file.split("/")[-2]
-timeres = input_file.split("/")[-1].split(".")[0]
+input_folder, fname = os.path.split(input_file)
+model_name = os.path.basename(input_folder)
+timeres = fname.split(".")[0]
 
 # Parameters
 window_size = int(sys.argv[2])
@@ -43,29 +45,25 @@ def cascading_window_trend(indep, variable):
                                               True, True, True)
 
     CASCADING_OUTPUT_DIR = f"{output_folder}{variable}/window_size{str(window_size)}/"
-    try:
-        plt.savefig(CASCADING_OUTPUT_DIR +
-                    f"cascading_window_{str(window_size)}_{variable}_{indep}.png")
-    except FileNotFoundError:
-        os.mkdir(CASCADING_OUTPUT_DIR)
-        plt.savefig(CASCADING_OUTPUT_DIR +
-                    f"cascading_window_{str(window_size)}_{variable}_{indep}.png")
-
-    pickle.dump(roll_df, open(CASCADING_OUTPUT_DIR +
-            f"cascading_window_{str(window_size)}_{variable}_{indep}.pik", "wb"))
-    pickle.dump(r_df, open(CASCADING_OUTPUT_DIR +
-        f"cascading_window_pearson_{str(window_size)}_{variable}_{indep}.pik", "wb"))
+    os.makedirs(CASCADING_OUTPUT_DIR, exist_ok=True)
+    plt.savefig(CASCADING_OUTPUT_DIR +
+                f"cascading_window_{str(window_size)}_{variable}_{indep}.png")
+
+    storage.save_result(roll_df, CASCADING_OUTPUT_DIR +
+            f"cascading_window_{str(window_size)}_{variable}_{indep}")
+    storage.save_result(r_df, CASCADING_OUTPUT_DIR +
+        f"cascading_window_pearson_{str(window_size)}_{variable}_{indep}")
 
 def psd(variable):
 
     psd = df.psd(variable, fs, plot=True)
     plt.savefig(f"{output_folder}{variable}/psd_{variable}.png")
-    pickle.dump(psd, open(f"{output_folder}{variable}/psd_{variable}.pik", "wb"))
+    storage.save_result(psd, f"{output_folder}{variable}/psd_{variable}")
 
 def deseasonalise(variable):
     deseason = df.deseasonalise(variable)
-    pickle.dump(deseason, open(f"{output_folder}{variable}/"
-                               f"deseasonalise_{variable}.pik", "wb"))
+    storage.save_result(deseason, f"{output_folder}{variable}/"
+                               f"deseasonalise_{variable}")
 
 def bandpass(variable):
     bandpass = df.bandpass(variable, fc, fs, btype=btype,
@@ -75,22 +73,19 @@ def bandpass(variable):
 
     if deseasonalise_first:
         bandpass_fname = (BANDPASS_OUTPUT_DIR +
-                          f"bandpass_{period}_{btype}_{variable}_deseasonal.pik")
+                          f"bandpass_{period}_{btype}_{variable}_deseasonal")
     else:
         bandpass_fname = (BANDPASS_OUTPUT_DIR +
-                          f"bandpass_{period}_{btype}_{variable}.pik")
+                          f"bandpass_{period}_{btype}_{variable}")
 
-    try:
-        pickle.dump(bandpass, open(bandpass_fname, "wb"))
-    except FileNotFoundError:
-        os.mkdir(BANDPASS_OUTPUT_DIR)
-        pickle.dump(bandpass, open(bandpass_fname, "wb"))
+    os.makedirs(BANDPASS_OUTPUT_DIR, exist_ok=True)
+    storage.save_result(bandpass, bandpass_fname)
 
 
 """ EXECUTION """
 if __name__ == "__main__":
 
-    ds = xr.open_dataset(input_file)
+    ds = storage.open_output(input_folder, timeres)
     df = inv_flux.Analysis(ds)
 
     if timeres == "year":
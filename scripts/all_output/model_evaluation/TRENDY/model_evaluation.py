@@ -5,22 +5,22 @@ Run this script from the bash shell. """
 import sys
 import os
 from core import TRENDY_flux
-import pickle
-import xarray as xr
+from core import storage
 import matplotlib.pyplot as plt
 
 
 def main():
-    input_file = sys.argv[1]
+    # Output folder of the model, or its year.nc file as before.
+    input_folder = sys.argv[1]
     window_size = int(sys.argv[2])
 
-    model_name = input_file.split("/")[-2]
+    if input_folder.endswith(".nc"):
+        input_folder = os.path.dirname(input_folder)
+    model_name = os.path.basename(os.path.normpath(input_folder))
     output_folder = ("./../../../../output/TRENDY/model_evaluation/"
                      f"{model_name}/")
 
-    assert input_file.endswith("year.nc")
-
-    ds = xr.open_dataset(input_file)
+    ds = storage.open_output(input_folder, "year")
     df = TRENDY_flux.ModelEvaluation(ds)
 
     """ Plots."""
@@ -37,17 +37,17 @@ def main():
     plt.clf()
     linreg = df.regress_cascading_window_trend_to_GCP(window_size, "time", "both")
     plt.savefig(REGRESS_OUTPUT + f"_time.png")
-    pickle.dump(linreg, open(REGRESS_OUTPUT + f"_time.pik", "wb"))
+    storage.save_result(linreg, REGRESS_OUTPUT + "_time")
 
     plt.clf()
     linreg = df.regress_cascading_window_trend_to_GCP(window_size, "CO2", "both")
     plt.savefig(REGRESS_OUTPUT + f"_CO2.png")
-    pickle.dump(linreg, open(REGRESS_OUTPUT + f"_CO2.pik", "wb"))
+    storage.save_result(linreg, REGRESS_OUTPUT + "_CO2")
 
     plt.clf()
     results = df.compare_trend_to_GCP()
     plt.savefig(TREND_OUTPUT + f".png")
-    pickle.dump(results, open(TREND_OUTPUT + f".pik", "wb"))
+    storage.save_result(results, TREND_OUTPUT)
 
 
 if __name__ == "__main__":
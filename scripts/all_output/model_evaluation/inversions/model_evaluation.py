@@ -5,21 +5,21 @@ Run this script from the bash shell. """
 import sys
 import os
 from core import inv_flux
-import pickle
-import xarray as xr
+from core import storage
 import matplotlib.pyplot as plt
 
 def main():
-    input_file = sys.argv[1]
+    # Output folder of the model, or its year.nc file as before.
+    input_folder = sys.argv[1]
     window_size = int(sys.argv[2])
 
-    model_name = input_file.split("/")[-2]
+    if input_folder.endswith(".nc"):
+        input_folder = os.path.dirname(input_folder)
+    model_name = os.path.basename(os.path.normpath(input_folder))
     output_folder = ("./../../../../output/inversions/model_evaluation/"
                      f"{model_name}/")
 
-    assert input_file.endswith("year.nc")
-
-    ds = xr.open_dataset(input_file)
+    ds = storage.open_output(input_folder, "year")
     df = inv_flux.ModelEvaluation(ds)
 
     """ Plots."""
@@ -36,17 +36,17 @@ def main():
         plt.clf()
         linreg = df.regress_cascading_window_trend_to_GCP(region, window_size, "time", "both")
         plt.savefig(REGRESS_OUTPUT + f"_{region}_time.png")
-        pickle.dump(linreg, open(REGRESS_OUTPUT + f"_{region}_time.pik", "wb"))
+        storage.save_result(linreg, REGRESS_OUTPUT + f"_{region}_time")
 
         plt.clf()
         linreg = df.regress_cascading_window_trend_to_GCP(region, window_size, "CO2", "both")
         plt.savefig(REGRESS_OUTPUT + f"_{region}_CO2.png")
-        pickle.dump(linreg, open(REGRESS_OUTPUT + f"_{region}_CO2.pik", "wb"))
+        storage.save_result(linreg, REGRESS_OUTPUT + f"_{region}_CO2")
 
         plt.clf()
         results = df.compare_trend_to_GCP(region)
         plt.savefig(TREND_OUTPUT + f"_{region}.png")
-        pickle.dump(results, open(TREND_OUTPUT + f"_{region}.pik", "wb"))
+        storage.save_result(results, TREND_OUTPUT + f"_{region}")
 
 
 if __name__ == "__main__":
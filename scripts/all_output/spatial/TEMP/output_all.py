@@ -1,6 +1,7 @@
 """ Outputs dataframes of monthly, yearly, decadal and whole time
 temperature averages (for all globe and regions) for each model.
-Output format is binary csv through the use of pickle.
+Output format is netCDF, encoded with one of the profiles in core.storage
+(optional third argument).
 
 Run this script from the bash shell.
 
@@ -9,15 +10,18 @@ Run this script from the bash shell.
 """ IMPORTS """
 import sys
 from core import TEMP
-import os
+from core import storage
+from core import temporal
+from core import instrument
 import xarray as xr
-import pickle
 import logging
 
 
 """ FUNCTIONS """
-def main(input_file, output_folder):
+def main(input_file, output_folder, profile=None):
     """ Main function: To be run when script is not run from bash shell.
+
+    profile is an EncodingProfile or the name of one of storage.PROFILES.
     """
 
     # Set up for logger to log success of results.
@@ -32,21 +36,12 @@ def main(input_file, output_folder):
             .latitudinal_splits()
          )
 
-    arrays = {
-        "month": df,
-        "year": df.resample({'time': 'Y'}).mean(),
-        "decade": df.resample({'time': '10Y'}).mean(),
-        "whole": df.mean()
-    }
-
-    if not os.path.isdir(output_folder):
-        os.mkdir(output_folder)
+    # Yearly, decadal and whole means from one pass over df.
+    arrays = temporal.TemporalAgg(df, how='mean').outputs(seasonal=False)
 
     # Output files after directory successfully created.
     try:
-        for freq in arrays:
-            destination = f"{output_folder}/{freq}.nc"
-            arrays[freq].to_netcdf(destination)
+        storage.write_output(arrays, output_folder, profile)
 
     except Exception as e:
         logger.error( '{} :: fail'.format(input_file.split('/')[-1]))
@@ -61,5 +56,8 @@ def main(input_file, output_folder):
 if __name__ == "__main__":
     input_file = sys.argv[1]
     output_folder = sys.argv[2]
+    profile = sys.argv[3] if len(sys.argv) > 3 else None
 
-    main(input_file, output_folder)
+    # Stages are traced to $PIPELINE_TRACE if set (see core.instrument).
+    with instrument.stage('run', input_file=input_file):
+        main(input_file, output_folder, profile)
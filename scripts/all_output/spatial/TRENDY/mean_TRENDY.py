@@ -11,6 +11,7 @@ import pandas as pd
 from itertools import *
 from tqdm import tqdm
 import os
+from core import storage
 
 import matplotlib.pyplot as plt
 
@@ -33,12 +34,12 @@ def open_dataframes(sim, timeres):
     """
 
     models = list(set([model.split('_')[0] for model in os.listdir(PATH_DIR)]))
-    fnames = {model:PATH_DIR + f'{model}_{sim}_nbp/{timeres}.nc' for model in models}
+    folders = {model:PATH_DIR + f'{model}_{sim}_nbp/' for model in models}
 
-    dataframes = {model : xr.open_dataset(fnames[model]).sel(time=slice("1701", "2017")) for
-            model in fnames if model != 'VISIT'}
+    dataframes = {model : storage.open_output(folders[model], timeres).sel(time=slice("1701", "2017")) for
+            model in folders if model != 'VISIT'}
 
-    dataframes['VISIT'] = xr.open_dataset(fnames['VISIT']).sel(time=slice("1860", "2017"))
+    dataframes['VISIT'] = storage.open_output(folders['VISIT'], timeres).sel(time=slice("1860", "2017"))
 
     return dataframes
 
@@ -1,6 +1,7 @@
 """ Outputs dataframes of yearly, decadal and whole time integrations for TRENDY
 fluxes (for all globe and regions) for each model.
-Output format is binary csv through the use of pickle.
+Output format is netCDF, encoded with one of the profiles in core.storage
+(optional third argument).
 
 Run this script from the bash shell.
 
@@ -12,14 +13,18 @@ CURRENT_DIR = os.path.dirname(__file__)
 
 import sys
 from core import trendy_flux as TRENDYf
+from core import storage
+from core import temporal
+from core import instrument
 
 import xarray as xr
-import pickle
 
 
 """ FUNCTIONS """
-def main(input_file, output_folder, ui=False):
+def main(input_file, output_folder, ui=False, profile=None):
     """ Main function: To be run when script is not run from bash shell.
+
+    profile is an EncodingProfile or the name of one of storage.PROFILES.
     """
 
     # Out to bash if user interface (ui) is requested by user.
@@ -34,34 +39,19 @@ def main(input_file, output_folder, ui=False):
     data = TRENDYf.SpatialAgg(data = input_file)
 
     df = data.latitudinal_splits()
-    seasonal = data.seasonal_uptake()
-
-    arrays = {
-                "month": df,
-                "year": df.resample({'time': 'Y'}).sum(),
-                "decade": df.resample({'time': '10Y'}).sum(),
-                "whole": df.sum(),
-                "summer": seasonal['summer'],
-                "winter": seasonal['winter']
-             }
-
-    if os.path.isdir(output_folder):
-        if ui:
-            print("Directory %s already exists" % output_folder)
-    else:
-        os.mkdir(output_folder)
-
-    # Output files after directory successfully created.
-    for freq in arrays:
-        destination = f"{output_folder}/{freq}.nc"
-        try:
-            arrays[freq].to_netcdf(destination)
-        except:
-            if ui:
-                print(f": {freq.upper()}:fail")
-        else:
-            if ui:
-                print(f": {freq.upper()}:pass")
+
+    # Yearly, decadal, whole and seasonal sums from one pass over df.
+    arrays = temporal.TemporalAgg(df).outputs()
+
+    if os.path.isdir(output_folder) and ui:
+        print("Directory %s already exists" % output_folder)
+
+    # Output files (the directory is created if needed).
+    failed = storage.write_output(arrays, output_folder, profile,
+                                  strict=False)
+    if ui:
+        for freq in arrays:
+            print(f": {freq.upper()}:{'fail' if freq in failed else 'pass'}")
 
     if ui:
         print("All files created!\n")
@@ -71,5 +61,8 @@ def main(input_file, output_folder, ui=False):
 if __name__ == "__main__":
     input_file = sys.argv[1]
     output_folder = sys.argv[2]
+    profile = sys.argv[3] if len(sys.argv) > 3 else None
 
-    main(input_file, output_folder, True)
+    # Stages are traced to $PIPELINE_TRACE if set (see core.instrument).
+    with instrument.stage('run', input_file=input_file):
+        main(input_file, output_folder, True, profile)
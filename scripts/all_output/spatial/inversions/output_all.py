@@ -1,6 +1,6 @@
 """ Outputs dataframes of spatial, yearly, decadal and whole time integrations
-(for all globe and regions) for each model. Output format is binary csv
-through the use of pickle.
+(for all globe and regions) for each model. Output format is netCDF, encoded
+with one of the profiles in core.storage (optional third argument).
 
 Run this script from the bash shell.
 """
@@ -9,19 +9,22 @@ Run this script from the bash shell.
 """ IMPORTS """
 import sys
 from core import inv_flux
+from core import storage
+from core import temporal
+from core import instrument
 
 from importlib import reload
 reload(inv_flux);
 
-import os
 import xarray as xr
-import pickle
 import logging
 
 
 """ FUNCTIONS """
-def main(input_file, output_folder):
+def main(input_file, output_folder, profile=None):
     """ Main function: to be used when script is not run from bash shell.
+
+    profile is an EncodingProfile or the name of one of storage.PROFILES.
     """
 
     # Set up for logger to log success of results.
@@ -35,25 +38,13 @@ def main(input_file, output_folder):
     invdf = inv_flux.SpatialAgg(data = ds)
 
     df = invdf.latitudinal_splits()
-    seasonal = invdf.seasonal_uptake()
-
-    arrays = {
-        "month": df,
-        "year": df.resample({'time': 'Y'}).sum(),
-        "decade": df.resample({'time': '10Y'}).sum(),
-        "whole": df.sum(),
-        "summer": seasonal['summer'],
-        "winter": seasonal['winter']
-    }
 
-    if not os.path.isdir(output_folder):
-        os.mkdir(output_folder)
+    # Yearly, decadal, whole and seasonal sums from one pass over df.
+    arrays = temporal.TemporalAgg(df).outputs()
 
     # Output files after directory successfully created.
     try:
-        for freq in arrays:
-            destination = f"{output_folder}/{freq}.nc"
-            arrays[freq].to_netcdf(destination)
+        storage.write_output(arrays, output_folder, profile)
 
     except Exception as e:
         logger.error( '{} :: fail'.format(input_file.split('/')[-1]))
@@ -67,5 +58,8 @@ def main(input_file, output_folder):
 if __name__ == "__main__":
     input_file = sys.argv[1]
     output_folder = sys.argv[2]
+    profile = sys.argv[3] if len(sys.argv) > 3 else None
 
-    main(input_file, output_folder)
+    # Stages are traced to $PIPELINE_TRACE if set (see core.instrument).
+    with instrument.stage('run', input_file=input_file):
+        main(input_file, output_folder, profile)
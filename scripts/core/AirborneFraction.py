@@ -10,7 +10,8 @@ import os
 CURRENT_PATH = os.path.dirname(__file__)
 MAIN_DIRECTORY = CURRENT_PATH + "./../../"
 
-from core import FeedbackAnalysis
+from core import GCP_flux
+from core import feedbacks
 
 
 class GCP:
@@ -33,8 +34,12 @@ class GCP:
         self.co2 = co2[2:]
         self.temp = temp.sel(time=slice('1959', '2018')).Earth
 
-        self.GCP = pd.read_csv(MAIN_DIRECTORY + 'data/GCP/budget.csv',
-                               index_col='Year')
+        self.GCP = GCP_flux.cached_csv(GCP_flux.GCP_FNAME, 'Year')
+
+        self.phi = 0.015 / 2.12
+        self.rho = 1.93
+
+        self._window_params = None
 
     def _feedback_parameters(self):
         """
@@ -78,46 +83,44 @@ class GCP:
         af = 1 / u
         return {'af': af, 'alpha': alpha}
 
-    def window_af(self, emission_rate=0.02):
-        """
+    def window_params(self):
+        """ Returns a xr.Dataset of beta (divided by 2.12) and gamma of the
+        total GCP sink over each decade and their (co)variances, with
+        dimensions (window, model). The regressions are fitted once, by
+        feedbacks.gcp_windows, and reused by later calls.
         """
 
-        times = (
-            ('1959', '1968'),
-            ('1969', '1978'),
-            ('1979', '1988'),
-            ('1989', '1998'),
-            ('1999', '2008'),
-            ('2009', '2018'),
-        )
-
-        models = {}
-        df = pd.DataFrame(data =
-            {
-                "sink": self.GCP['land sink'] + self.GCP['ocean sink'],
-                "CO2": self.co2,
-                "temp": self.temp
-            },
-            index= self.GCP.index)
-
-        for time in times:
-            X = sm.add_constant(df[['CO2', 'temp']].loc[time[0]:time[1]])
-            Y = df['sink'].loc[time[0]:time[1]]
-
-            model = sm.OLS(Y, X).fit()
+        if self._window_params is not None:
+            return self._window_params
 
-            models[time[0]] = model.params.loc[['CO2', 'temp']]
+        windows = (
+            (1959, 1968),
+            (1969, 1978),
+            (1979, 1988),
+            (1989, 1998),
+            (1999, 2008),
+            (2009, 2018),
+        )
 
-        params_df = pd.DataFrame(models).T
-        params_df.columns = ['beta', 'gamma']
+        total = feedbacks.gcp_windows(self.co2, self.temp, windows,
+                                      self.GCP).sel(sink='total')
 
-        phi = 0.015 / 2.12
-        rho = 1.93
+        self._window_params = _params_dataset(
+            total['beta'].values[:, np.newaxis] / 2.12,
+            total['gamma'].values[:, np.newaxis],
+            _scale_beta(_covariance(total))[:, np.newaxis],
+            total.window.values,
+            ['GCP']
+        )
+        return self._window_params
 
-        params_df['beta'] /= 2.12
-        params_df['u_gamma'] = params_df['gamma'] * phi / rho
+    def window_af(self, emission_rate=0.02):
+        """
+        """
 
-        alpha = params_df['beta'] + params_df['u_gamma']
+        params = self.window_params().sel(model='GCP')
+        alpha = (params['beta'] + params['gamma'] * self.phi / self.rho
+                 ).to_series()
 
         b = 1 / np.log(1 + emission_rate)
         u = 1 - b * alpha
@@ -125,6 +128,17 @@ class GCP:
         af = 1 / u
         return {'af': af, 'alpha': alpha}
 
+    def af_surface(self, emission_rate, phi=None, rho=None):
+        """ Returns the airborne fraction of each decade for every emission
+        rate (and phi and rho, if arrays are passed), as in af_surface.
+        Defaults of phi and rho are those of the instance.
+        """
+
+        params = self.window_params()
+        return af_surface(params['beta'], params['gamma'], emission_rate,
+                          self.phi if phi is None else phi,
+                          self.rho if rho is None else rho)
+
 
 class INVF:
     def __init__(self, co2, temp, uptake):
@@ -150,6 +164,8 @@ class INVF:
         self.phi = 0.015 / 2.12
         self.rho = 1.93
 
+        self._window_params = None
+
     def _feedback_parameters(self, variable):
         """
         """
@@ -203,23 +219,48 @@ class INVF:
         af = 1 / u
         return {'af': af, 'alpha_mean': alpha_mean, 'alpha_std': alpha_std}
 
+    def window_params(self):
+        """ Returns a xr.Dataset of the land plus ocean beta (divided by
+        2.12) and gamma of each model over each decade and their
+        (co)variances, with dimensions (window, model). Land and ocean
+        parameters are taken as independent. The regressions are fitted once,
+        by feedbacks.invf, and reused by later calls.
+        """
+
+        if self._window_params is not None:
+            return self._window_params
+
+        land_fa = feedbacks.invf(self.co2, self.temp, self.uptake,
+                                 'Earth_Land')
+        ocean_fa = feedbacks.invf(self.co2, self.temp, self.uptake,
+                                  'Earth_Ocean')
+        land = land_fa.params()
+        ocean = ocean_fa.params()
+
+        beta = land['beta'] + ocean['beta']
+        gamma = land['gamma'] + ocean['gamma']
+
+        cov = np.full(beta.shape + (2, 2), np.nan)
+        for fa in (land_fa, ocean_fa):
+            for j, model_name in enumerate(beta.columns):
+                for period, fit in fa.fb_models[model_name].items():
+                    i = beta.index.get_loc(fa.window_label(period))
+                    fa_cov = fit.cov_params().loc[['C', 'T'], ['C', 'T']]
+                    cov[i, j] = np.nan_to_num(cov[i, j]) + fa_cov.values
+
+        self._window_params = _params_dataset(beta.values, gamma.values,
+                                              _scale_beta(cov), beta.index,
+                                              beta.columns)
+        return self._window_params
+
     def window_af(self, emission_rate=0.02):
         """
         """
 
-        land_df = FeedbackAnalysis.INVF(self.co2, self.temp, self.uptake,
-                                        'Earth_Land'
-                                        )
-        ocean_df = FeedbackAnalysis.INVF(self.co2, self.temp, self.uptake,
-                                        'Earth_Ocean'
-                                        )
+        params = self.window_params()
+        alpha = (params['beta'] + params['gamma'] * self.phi / self.rho
+                 ).to_pandas()
 
-        land = land_df.params()
-        ocean = ocean_df.params()
-        beta = (land['beta'] + ocean['beta'])
-        u_gamma = (land['u_gamma'] + ocean['u_gamma'])
-
-        alpha = (beta + u_gamma)
         alpha_mean = alpha.mean(axis=1)
         alpha_std = alpha.std(axis=1)
 
@@ -229,6 +270,17 @@ class INVF:
         af = 1 / u
         return {'af': af, 'alpha_mean': alpha_mean, 'alpha_std': alpha_std}
 
+    def af_surface(self, emission_rate, phi=None, rho=None):
+        """ Returns the airborne fraction of each model and decade for every
+        emission rate (and phi and rho, if arrays are passed), as in
+        af_surface. Defaults of phi and rho are those of the instance.
+        """
+
+        params = self.window_params()
+        return af_surface(params['beta'], params['gamma'], emission_rate,
+                          self.phi if phi is None else phi,
+                          self.rho if rho is None else rho)
+
 
 class TRENDY:
     def __init__(self, co2, temp, uptake):
@@ -257,8 +309,9 @@ class TRENDY:
         self.phi = 0.015 / 2.12
         self.rho = 1.93
 
-        self.GCP = pd.read_csv(MAIN_DIRECTORY + 'data/GCP/budget.csv',
-                          index_col='Year')
+        self.GCP = GCP_flux.cached_csv(GCP_flux.GCP_FNAME, 'Year')
+
+        self._window_params = None
 
     def _feedback_parameters(self, variable):
         """
@@ -299,8 +352,10 @@ class TRENDY:
 
         land = self._feedback_parameters('Earth_Land')
 
-        ocean = GCP(self.co2, self.temp)._feedback_parameters()['ocean']
-        ocean.index = ['beta', 'gamma']
+        ocean = feedbacks.gcp_windows(self.co2, self.temp, ((1959, 2018),),
+                                      self.GCP).sel(sink='ocean', window=1959)
+        ocean = pd.Series([ocean['beta'].item(), ocean['gamma'].item()],
+                          index=['beta', 'gamma'])
         ocean['beta'] /= 2.12
         ocean['u_gamma'] = ocean['gamma'] * self.phi / self.rho
 
@@ -318,61 +373,67 @@ class TRENDY:
         af = 1 / u
         return {'af': af, 'alpha_mean': alpha_mean, 'alpha_std': alpha_std}
 
-    def window_af(self, emission_rate=0.02):
-        """
+    def window_params(self):
+        """ Returns a xr.Dataset of the land (TRENDY) plus ocean (GCP) beta
+        (divided by 2.12) and gamma of each model over each decade and their
+        (co)variances, with dimensions (window, model). Land beta is from the
+        S1 simulation and land gamma from S3 - S1, and all three regressions
+        are taken as independent. The regressions are fitted once, by
+        feedbacks.trendy and feedbacks.gcp_windows, and reused by later
+        calls.
         """
 
-        land = FeedbackAnalysis.TRENDY('year', self.co2, self.temp,
-                                       self.all_uptake, 'Earth_Land'
-                                        ).params()
+        if self._window_params is not None:
+            return self._window_params
+
+        land_fa = feedbacks.trendy('year', self.co2, self.temp,
+                                   self.all_uptake, 'Earth_Land')
+        land = land_fa.params()
 
         # Ocean
-        times = (
-            ('1960', '1969'),
-            ('1970', '1979'),
-            ('1980', '1989'),
-            ('1990', '1999'),
-            ('2000', '2009'),
-            ('2008', '2017'),
+        windows = (
+            (1960, 1969),
+            (1970, 1979),
+            (1980, 1989),
+            (1990, 1999),
+            (2000, 2009),
+            (2008, 2017),
         )
 
-        models = {}
-        start, end = int(times[0][0]), int(times[-1][-1])
-        df = pd.DataFrame(data =
-            {
-                "sink": self.GCP['ocean sink'].loc[start:end],
-                "CO2": self.co2.loc[start:end],
-                "temp": self.temp.sel(time=slice(str(start), str(end))).Earth
-            },
-            index= self.GCP.loc[start:end].index)
-
-        for time in times:
-            X = sm.add_constant(df[['CO2', 'temp']].loc[time[0]:time[1]])
-            Y = df['sink'].loc[time[0]:time[1]]
-
-            model = sm.OLS(Y, X).fit()
-
-            models[time[0]] = model.params.loc[['CO2', 'temp']]
-
-        ocean = pd.DataFrame(models).T
-        ocean.columns = ['beta', 'gamma']
-        ocean.index = [int(time[0]) for time in times]
-
-        phi = 0.015 / 2.12
-        rho = 1.93
-
-        ocean['beta'] /= 2.12
-        ocean['u_gamma'] = ocean['gamma'] * phi / rho
-
         land_beta = land['S1']['beta']
-        land_ugamma = land['S3']['u_gamma']
-        land_beta.index.name = None
-        land_ugamma.index.name = None
+        land_gamma = land['S3']['gamma']
+
+        # Select the ocean windows by the start years of the land rows.
+        ocean = feedbacks.gcp_windows(self.co2, self.temp, windows,
+                                      self.GCP).sel(sink='ocean',
+                                                    window=land_beta.index.values)
+
+        beta = land_beta.values + ocean['beta'].values[:, np.newaxis] / 2.12
+        gamma = land_gamma.values + ocean['gamma'].values[:, np.newaxis]
+
+        cov = np.repeat(_covariance(ocean)[:, np.newaxis],
+                        len(land_beta.columns), axis=1)
+        for j, model_name in enumerate(land_beta.columns):
+            for period in land_fa.time_periods:
+                i = land_beta.index.get_loc(period[0])
+                S1 = land_fa.fb_models['S1'][model_name][period]
+                S3 = land_fa.fb_models['S3'][model_name][period]
+                cov[i, j, 0, 0] += S1.bse.loc['C'] ** 2
+                cov[i, j, 1, 1] += S3.bse.loc['T'] ** 2
+
+        self._window_params = _params_dataset(beta, gamma, _scale_beta(cov),
+                                              land_beta.index,
+                                              land_beta.columns)
+        return self._window_params
+
+    def window_af(self, emission_rate=0.02):
+        """
+        """
 
-        beta = land_beta.add(ocean['beta'], axis=0)
-        u_gamma = land_ugamma.add(ocean['u_gamma'], axis=0)
+        params = self.window_params()
+        alpha = (params['beta'] + params['gamma'] * self.phi / self.rho
+                 ).to_pandas()
 
-        alpha = (beta + u_gamma)
         alpha_mean = alpha.mean(axis=1)
         alpha_std = alpha.std(axis=1)
 
@@ -381,3 +442,106 @@ class TRENDY:
 
         af = 1 / u
         return {'af': af, 'alpha_mean': alpha_mean, 'alpha_std': alpha_std}
+
+    def af_surface(self, emission_rate, phi=None, rho=None):
+        """ Returns the airborne fraction of each model and decade for every
+        emission rate (and phi and rho, if arrays are passed), as in
+        af_surface. Defaults of phi and rho are those of the instance.
+        """
+
+        params = self.window_params()
+        return af_surface(params['beta'], params['gamma'], emission_rate,
+                          self.phi if phi is None else phi,
+                          self.rho if rho is None else rho)
+
+
+""" FUNCTIONS """
+def af_surface(beta, gamma, emission_rate=0.02, phi=0.015 / 2.12, rho=1.93):
+    """ Returns the airborne fraction
+
+        AF = 1 / (1 - alpha / ln(1 + r)), where alpha = beta + gamma phi / rho,
+
+    for every combination of the feedback parameters and the emission rates
+    r (and phi and rho, if arrays are passed), evaluated by broadcasting
+    without refitting any regression. The result is a xr.DataArray with the
+    dimensions (emission_rate, phi, rho, ...) followed by those of beta,
+    where phi and rho are only dimensions if they are arrays.
+
+    Parameters
+    ==========
+
+    beta, gamma: xr.DataArray
+
+        feedback parameters, e.g. over (window, model) from window_params.
+        beta must already be divided by 2.12.
+
+    emission_rate: float or list-like, optional
+
+        exponential growth rate(s) of emissions.
+        Defaults to 0.02.
+
+    phi, rho: float or list-like, optional
+
+        parameters converting gamma to ppm units.
+        Default to 0.015 / 2.12 and 1.93.
+
+    """
+
+    def _dimension(value, name):
+        if np.ndim(value) == 0:
+            return value
+        return xr.DataArray(np.asarray(value, dtype=float), dims=name,
+                            coords={name: np.asarray(value, dtype=float)})
+
+    emission_rate = _dimension(np.atleast_1d(emission_rate), 'emission_rate')
+    phi = _dimension(phi, 'phi')
+    rho = _dimension(rho, 'rho')
+
+    alpha = beta + gamma * phi / rho
+    b = 1 / np.log(1 + emission_rate)
+
+    af = 1 / (1 - b * alpha)
+    dims = [dim for dim in ('emission_rate', 'phi', 'rho') if dim in af.dims]
+    return af.transpose(*dims, *beta.dims).rename('af')
+
+def _covariance(params):
+    """ Returns the (..., 2, 2) covariance matrices of (beta, gamma) from the
+    var_beta, var_gamma and cov_beta_gamma variables of params.
+    """
+
+    var_beta = params['var_beta'].values
+    var_gamma = params['var_gamma'].values
+    cov = params['cov_beta_gamma'].values
+
+    return np.stack([np.stack([var_beta, cov], axis=-1),
+                     np.stack([cov, var_gamma], axis=-1)], axis=-2)
+
+def _scale_beta(cov):
+    """ Returns the (..., 2, 2) covariance matrices of (beta, gamma) with
+    beta divided by 2.12.
+    """
+
+    scale = np.array([1 / 2.12, 1.])
+    return cov * scale[:, np.newaxis] * scale
+
+def _params_dataset(beta, gamma, cov, windows, models):
+    """ Returns a xr.Dataset of (window, model) arrays of beta and gamma and
+    their variances and covariance from the (window, model, 2, 2) array cov.
+    """
+
+    cov = np.asarray(cov, dtype=float)
+    dims = ('window', 'model')
+
+    return xr.Dataset(
+        {
+            'beta': (dims, np.asarray(beta, dtype=float)),
+            'gamma': (dims, np.asarray(gamma, dtype=float)),
+            'var_beta': (dims, cov[..., 0, 0]),
+            'var_gamma': (dims, cov[..., 1, 1]),
+            'cov_beta_gamma': (dims, cov[..., 0, 1])
+        },
+        coords={
+            'window': np.asarray(windows),
+            'model': np.asarray(models)
+        }
+    )
@@ -7,11 +7,10 @@ spatial output datasets. It also includes further analysis and visualisations.
 import xarray as xr
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from statsmodels import api as sm
-from scipy import stats
-from scipy import signal
 import os
+from core import instrument
+from core import regression
 
 
 """ INPUTS """
@@ -19,6 +18,41 @@ CURRENT_PATH = os.path.dirname(__file__)
 MAIN_DIR = CURRENT_PATH + "./../../"
 
 
+""" FUNCTIONS """
+def _window_diagnostics(fits):
+    """ Returns a dictionary of the lists of the collinearity diagnostics of
+    the statsmodels fits of each window (see core.regression.diagnostics),
+    computed in one batch from their stacked designs and residuals: the
+    largest 'vif', the 'condition_number', the correlation 'r_<x>_<y>' of
+    every pair of predictors, the lag-1 'autocorrelation' of the residuals
+    and the effective degrees of freedom 'dof_eff'.
+    """
+
+    fits = list(fits)
+    names = fits[0].model.exog_names
+    ntime = max(fit.model.exog.shape[0] for fit in fits)
+
+    X = np.full((len(fits), ntime, len(names)), np.nan)
+    resid = np.full((len(fits), ntime), np.nan)
+    for i, fit in enumerate(fits):
+        n = fit.model.exog.shape[0]
+        X[i, :n] = fit.model.exog
+        resid[i, :n] = fit.resid
+
+    result = regression.diagnostics(X, resid)
+
+    stats = {'vif': list(result.vif[:, 1:].max(axis=-1)),
+             'condition_number': list(result.condition_number)}
+    for i in range(1, len(names)):
+        for j in range(i + 1, len(names)):
+            stats[f'r_{names[i]}_{names[j]}'] = list(
+                result.correlation[:, i, j])
+    stats['autocorrelation'] = list(result.autocorrelation)
+    stats['dof_eff'] = list(result.dof_eff)
+
+    return stats
+
+
 class INVF:
     def __init__(self, co2, temp, uptake, variable):
         """ Initialise an instance of the INVF FeedbackAnalysis class.
@@ -53,6 +87,10 @@ class INVF:
         self.index = [(1980, 1989), (1992, 2001), (1990, 1999),
                       (2000, 2009), (2008, 2017)]
 
+        # Rows of params and regstats under which windows are stored when
+        # they differ from the window's start year.
+        self.window_labels = {(1992, 2001): 1990}
+
         self.time_periods = {
             "Rayner": ((1992, 2001), (2000, 2009)),
             "JENA_s76": ((1980, 1989), (1990, 1999), (2000, 2009), (2008, 2017)),
@@ -80,6 +118,7 @@ class INVF:
         self.input_models = input_models
         self.fb_models = self._feedback_model()
 
+    @instrument.timed('ols')
     def _feedback_model(self):
         """
         """
@@ -99,36 +138,49 @@ class INVF:
 
         return fb_models
 
+    def window_label(self, period):
+        """ Returns the row of params and regstats under which the fit of a
+        time period is stored, e.g. 1990 for the Rayner (1992, 2001) window.
+
+        Parameters
+        ==========
+
+        period: tuple
+
+            (start, end) years of the window.
+
+        """
+
+        return self.window_labels.get(tuple(period), period[0])
+
     def params(self):
         """
         """
 
         fb_models = self.fb_models
 
+        labels = []
+        for period in self.index:
+            label = self.window_label(period)
+            if label not in labels:
+                labels.append(label)
+
         params_dict = {'beta': {}, 'gamma': {}}
         for param in params_dict:
             if param == 'beta':
                 p = 'C'
             elif param == 'gamma':
                 p = 'T'
-            for period in self.index:
-                start, end = period
-                if period not in params_dict[param].keys():
-                    params_dict[param][start] = []
+            for label in labels:
+                params_dict[param][label] = []
                 for model_name in fb_models:
-                    if period in fb_models[model_name]:
-                        fb_model = fb_models[model_name][period]
-                        params_dict[param][start].append(fb_model.params.loc[p])
+                    periods = [period for period in fb_models[model_name]
+                               if self.window_label(period) == label]
+                    if periods:
+                        fb_model = fb_models[model_name][periods[0]]
+                        params_dict[param][label].append(fb_model.params.loc[p])
                     else:
-                        params_dict[param][start].append(np.nan)
-
-        # Move the (1992, 2001) values to (1990, 1999)
-        for param in params_dict:
-            rayner_pos = np.where(~np.isnan(params_dict[param][1992]))[0].squeeze()
-            rayner_val = params_dict[param][1992][rayner_pos]
-            params_dict[param].pop(1992, None)
-            params_dict[param][1990][5] = rayner_val
-
+                        params_dict[param][label].append(np.nan)
 
         params_df = {}
         for param in params_dict:
@@ -143,7 +195,11 @@ class INVF:
         return params_df
 
     def regstats(self):
-        """
+        """ Returns a dictionary of {model: pd.DataFrame} of the statistics of
+        the fit of each window: r-squared, t and p values, total mean squared
+        error, nobs and the collinearity diagnostics of
+        core.regression.diagnostics (vif, condition_number, r_C_T,
+        autocorrelation and dof_eff).
         """
 
         fb_models = self.fb_models
@@ -168,7 +224,7 @@ class INVF:
                 model = fb_model[time_period]
 
                 # Attributes
-                model_stats['Year'].append(time_period[0])
+                model_stats['Year'].append(self.window_label(time_period))
                 model_stats['r_squared'].append(model.rsquared)
                 model_stats['t_values_beta'].append(model.tvalues.loc['C'])
                 model_stats['t_values_gamma'].append(model.tvalues.loc['T'])
@@ -177,14 +233,13 @@ class INVF:
                 model_stats['mse_total'].append(model.mse_total)
                 model_stats['nobs'].append(model.nobs)
 
+            model_stats.update(_window_diagnostics(fb_model.values()))
+
             df = pd.DataFrame(model_stats).set_index('Year')
             indices = [1980, 1990, 2000, 2008]
             for year in indices:
                 if year not in df.index:
-                    df.loc[year] = np.array([np.nan] * 7)
-            if 1992 in df.index:
-                df.loc[1990] = df.loc[1992]
-                df.drop(1992, inplace=True)
+                    df.loc[year] = np.nan
 
             stats_dict[model_name] = df.sort_index()
 
@@ -254,6 +309,7 @@ class TRENDY:
         self.input_models = input_models
         self.fb_models = self._feedback_model()
 
+    @instrument.timed('ols')
     def _feedback_model(self):
         """
         """
@@ -318,7 +374,11 @@ class TRENDY:
         return params_dict
 
     def regstats(self):
-        """
+        """ Returns a dictionary of {sim: {model: pd.DataFrame}} of the
+        statistics of the fit of each window: r-squared, t and p values, total
+        mean squared error, nobs and the diagnostics of
+        core.regression.diagnostics (vif, condition_number, autocorrelation
+        and dof_eff).
         """
 
         fb_models = self.fb_models
@@ -360,6 +420,8 @@ class TRENDY:
                     model_stats['mse_total'].append(model.mse_total)
                     model_stats['nobs'].append(model.nobs)
 
+                model_stats.update(_window_diagnostics(fb_model.values()))
+
                 stats_dict[sim][model_name] = (pd
                                                 .DataFrame(model_stats)
                                                 .set_index('Year')
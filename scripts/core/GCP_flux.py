@@ -1,26 +1,108 @@
 import numpy as np
-import xarray as xr
-import sys
 import os
 import pandas as pd
-import pickle
-import matplotlib.pyplot as plt
-from datetime import datetime
-from scipy import stats, signal
+
+# matplotlib (through core.plotting) and the scipy submodules are imported
+# on first use so that batch runs only pay for the aggregation dependencies.
 
 
 CURRENT_PATH = os.path.dirname(__file__)
 MAIN_DIR = CURRENT_PATH + "./../../"
 
+GCP_FNAME = os.path.join(MAIN_DIR, "data/GCP/budget.csv")
+CO2_FNAME = os.path.join(MAIN_DIR, "data/CO2/co2_year.csv")
+
+# Reference cascading window trends shared by all ModelEvaluation instances,
+# keyed by (variable, window_size, indep) and the modification times of
+# budget.csv and co2_year.csv, so that they are recomputed if the data
+# change. They are also cached on disk in CACHE_DIR to be shared between
+# processes, if it is set (e.g. through the GCP_CACHE_DIR environment
+# variable).
+_CWT_CACHE = {}
+CACHE_DIR = os.environ.get("GCP_CACHE_DIR")
+
+
+def cached_csv(fname, index_col):
+    """ Returns a copy of a csv file read once per process, and read again
+    if the file changes.
+    """
+
+    key = (fname, index_col, os.stat(fname).st_mtime_ns)
+    if key not in cached_csv.files:
+        cached_csv.files[key] = pd.read_csv(fname, index_col=index_col)
+
+    return cached_csv.files[key].copy()
+
+cached_csv.files = {}
+
+def _inputs_key():
+    """ Returns a key that changes when the GCP or CO2 data change.
+    """
+
+    return "_".join(str(os.stat(fname).st_mtime_ns)
+                    for fname in (GCP_FNAME, CO2_FNAME))
+
+def reference_cwt(variable, window_size=10, indep="CO2"):
+    """ Returns the cascading window trend of a GCP variable as in
+    Analysis.cascading_window_trend, computed once per (variable,
+    window_size, indep) and cached in memory and on disk (if CACHE_DIR is
+    set).
+
+    Parameters
+    ----------
+
+    variable: str
+
+        variable to choose from columns in budget.csv.
+
+    window_size: int, optional
+
+        size of time window of trends. Defaults to 10.
+
+    indep: str, optional
+
+        Regress uptake over "CO2" or "time". Defaults to "CO2".
+
+    """
+
+    inputs_key = _inputs_key()
+    key = (variable, window_size, indep, inputs_key)
+    if key in _CWT_CACHE:
+        return _CWT_CACHE[key].copy()
+
+    fname = None
+    if CACHE_DIR is not None:
+        fname = os.path.join(
+            CACHE_DIR,
+            f"cwt_{variable.replace(' ', '_')}_{window_size}_{indep}_"
+            f"{inputs_key}.csv"
+        )
+
+    if fname is not None and os.path.isfile(fname):
+        cwt = pd.read_csv(fname, index_col=0)['CWT']
+    else:
+        cwt = Analysis(variable).cascading_window_trend(window_size, indep)
+
+        if fname is not None:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                # Write to a temporary file first so that other processes
+                # never read a partial file.
+                tmp_fname = f"{fname}.{os.getpid()}.tmp"
+                cwt.to_csv(tmp_fname)
+                os.replace(tmp_fname, fname)
+            except OSError:
+                pass
+
+    _CWT_CACHE[key] = cwt
+
+    return cwt.copy()
 
 def list_of_variables():
     """ Returns a list of all available variables in the GCP dataframe.
     """
 
-    GCPfname = os.path.join(os.path.dirname(__file__),
-                            './../../data/GCP/budget.csv')
-
-    return pd.read_csv(GCPfname, index_col=0).columns
+    return cached_csv(GCP_FNAME, 0).columns
 
 class Analysis:
     """ This class takes the budget.csv in the GCP data folder and provides
@@ -47,17 +129,14 @@ class Analysis:
 
         """
 
-        GCPfname = os.path.join(os.path.dirname(__file__),
-                                './../../data/GCP/budget.csv')
-        GCP = pd.read_csv(GCPfname, index_col=0)
+        GCP = cached_csv(GCP_FNAME, 0)
 
         self.variable = variable
 
         self.all_data = GCP
         self.data = GCP[variable]
 
-        CO2fname = MAIN_DIR + f"data/CO2/co2_year.csv"
-        self.CO2 = pd.read_csv(CO2fname, index_col='Year')['CO2']
+        self.CO2 = cached_csv(CO2_FNAME, 'Year')['CO2']
 
     def plot_timeseries(self, time=None):
         """ Plot a variable against time.
@@ -74,10 +153,11 @@ class Analysis:
         if time == None:
             time = (self.data.index[0], self.data.index[-1])
 
+        from core import plotting
+
         df = self.data.loc[time[0]:time[1]]
 
-        plt.figure(figsize=(20,10))
-        return plt.plot(df)
+        return plotting.timeseries(df.index, df.values)
 
     def _time_to_CO2(self, time):
         """ Converts any time series array to corresponding atmospheric CO2
@@ -94,8 +174,7 @@ class Analysis:
 
         """
 
-        CO2fname = os.path.join(MAIN_DIR, "data/CO2/co2_year.csv")
-        CO2 = pd.read_csv(CO2fname, index_col="Year")['CO2']
+        CO2 = self.CO2
 
         time = list(self.data.index)
         try:
@@ -103,11 +182,14 @@ class Analysis:
         except AttributeError:
             return CO2.loc[time[0]:time[-1]]
 
-    def cascading_window_trend(self, window_size=10):
+    def cascading_window_trend(self, window_size=10, indep="CO2"):
         """ Calculates the slope of the trend of an uptake variable for each
         time window and for a given window size.
         Units of alpha (CWT): 1/yr 
 
+        Use reference_cwt to share the result between ModelEvaluation
+        instances.
+
         Parameters
         ----------
 
@@ -115,6 +197,10 @@ class Analysis:
 
             size of time window of trends. Defaults to 10.
 
+        indep: str, optional
+
+            Regress uptake over "CO2" or "time". Defaults to "CO2".
+
         """
 
         df = self.data
@@ -127,10 +213,19 @@ class Analysis:
             index=df.index
         )
 
+        if indep == "CO2":
+            x = cwt_df.CO2.values
+        elif indep == "time":
+            x = cwt_df.index.values
+        else:
+            raise ValueError("indep must be 'CO2' or 'time'.")
+
+        from scipy import stats
+
         cwt = []
         for i in range(len(cwt_df) - window_size + 1):
-            sub_df = cwt_df.iloc[i:i+window_size]
-            slope = stats.linregress(sub_df.CO2.values, sub_df.U.values).slope
+            slope = stats.linregress(x[i:i+window_size],
+                                     cwt_df.U.values[i:i+window_size]).slope
             cwt.append(slope)
 
         return pd.DataFrame({'CWT': cwt}, index=cwt_df.index[:-window_size+1]).CWT
@@ -160,23 +255,15 @@ class Analysis:
         period = " (years)"
         unit = "((GtC/yr)$^2$.yr)"
 
+        from scipy import signal
+
         # All GCP timeseries are annual, therefore fs is set to 1.
         freqs, spec = signal.welch(df.values, fs=1)
 
         if plot:
-            plt.figure(figsize=(12,9))
-
-            plt.subplot(211)
-            plt.plot(df.index, df.values)
-
-            plt.subplot(212)
-            plt.semilogy(1/freqs, spec)
-            plt.gca().invert_xaxis()
-            plt.xlim(xlim)
-
-            plt.title(f"Power Spectrum of {self.variable}")
-            plt.xlabel(f"Period{period}")
-            plt.ylabel(f"Spectral Variance {unit}")
+            from core import plotting
+            plotting.psd(df.index, df.values, freqs, spec, self.variable,
+                         period, unit, xlim)
 
         return pd.DataFrame(
                                 {
@@ -215,6 +302,8 @@ class Analysis:
             assert type(fc) == list, "fc must be a list of two values."
             fc = np.array(fc)
 
+        from scipy import signal
+
         fs = 1 # All GCP timeseries are annual, hence fs is set to 1.
         w = fc / (fs / 2) # Normalize the frequency.
         b, a = signal.butter(order, w, btype)
@@ -228,7 +317,6 @@ class Analysis:
 
         """
 
-        ax = pd.plotting.autocorrelation_plot(self.data.values)
-        ax.set_xlabel("Lag (in years)")
+        from core import plotting
 
-        return ax
+        return plotting.autocorrelation(self.data.values, "Lag (in years)")
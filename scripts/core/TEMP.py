@@ -7,6 +7,7 @@ data.
 import xarray as xr
 import pandas as pd
 import numpy as np
+from core import instrument
 
 
 """ FUNCTIONS """
@@ -25,6 +26,7 @@ class SpatialAve:
 
     """
 
+    @instrument.timed('spatial_agg')
     def __init__(self, data):
         """ Initialise an instance of an SpatialAve. """
 
@@ -105,7 +107,8 @@ class SpatialAve:
 
         arg_time_range = (
         pd
-            .date_range(start=start_time, end=end_time, freq='M')
+            .date_range(start=start_time, end=end_time,
+                        freq=pd.offsets.MonthEnd())
             .strftime('%Y-%m')
         )
 
@@ -114,6 +117,7 @@ class SpatialAve:
         else:
             return arg_time_range
 
+    @instrument.timed('regional_cut')
     def regional_cut(self, lats, lons, start_time=None, end_time=None):
         """ Cuts the dataset into selected latitude and longitude values.
 
@@ -0,0 +1,313 @@
+""" Monte Carlo propagation of the uncertainty of the airborne fraction.
+
+AirborneFraction only reports the spread of alpha across models, with phi,
+rho and the emission rate fixed. AFMonteCarlo jointly samples
+
+    beta, gamma: multivariate normal from the OLS estimates and covariance of
+        each window and model (AirborneFraction window_params),
+    rho: F2x / TCR, with TCR resampled from the CMIP6 values,
+    phi and emission rate: fixed, normal or resampled values,
+
+and evaluates AF = 1 / (1 - alpha / ln(1 + r)) for every sample. Samples are
+drawn in vectorised batches, each from its own RNG stream spawned from one
+seed, so results are reproducible whatever the number of processes. Batches
+are reduced to histograms, which keeps the memory use independent of the
+number of samples.
+"""
+
+
+""" IMPORTS """
+import os
+import numpy as np
+import xarray as xr
+from concurrent.futures import ProcessPoolExecutor
+
+
+""" INPUTS """
+# CMIP6 transient climate response (K), as in devs/airborne_fraction/TCR_CMIP6.
+TCR_CMIP6 = np.array([2.1, 2.0, 2.0, 1.7, 1.8, 1.7, 2.0, 2.0, 2.1, 2.5,
+1.9, 2.7, 3.0, 2.6, 2.1, 2.1, 1.6, 1.8, 1.9, 1.7, 2.6, 2.6, 1.7, 1.3, 2.3,
+1.4, 1.9, 1.6, 1.6, 1.7, 1.8, 1.6, 2.7, 1.6, 1.5, 2.3, 2.8])
+
+# Radiative forcing of a doubling of CO2 (W m-2).
+F2X = 3.71
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+""" CLASSES """
+class AFMonteCarlo:
+    """ This class samples the airborne fraction of each window and model,
+    and of the ensemble (the AF of the mean alpha across models), from the
+    joint distribution of its inputs.
+
+    Each input distribution is given as:
+        a float: fixed value,
+        a tuple (mean, std): normal distribution,
+        a np.ndarray: values resampled with replacement.
+
+    Parameters
+    ==========
+
+    params: xr.Dataset
+
+        (window, model) beta (divided by 2.12), gamma, var_beta, var_gamma
+        and cov_beta_gamma, as returned by AirborneFraction window_params.
+
+    phi: float, tuple or np.ndarray, optional
+
+        distribution of phi.
+        Defaults to 0.015 / 2.12.
+
+    tcr: float, tuple or np.ndarray, optional
+
+        distribution of the TCR; rho = F2X / TCR.
+        Defaults to TCR_CMIP6.
+
+    emission_rate: float, tuple or np.ndarray, optional
+
+        distribution of the emission rate.
+        Defaults to 0.02.
+
+    seed: int, optional
+
+        seed of the RNG streams.
+        Defaults to 0.
+
+    """
+
+    def __init__(self, params, phi=0.015 / 2.12, tcr=TCR_CMIP6,
+                 emission_rate=0.02, seed=0):
+        """ Initialise an instance of an AFMonteCarlo. """
+
+        self.windows = params.window.values
+        self.models = params.model.values
+
+        self.mean = np.stack([params['beta'].values, params['gamma'].values],
+                             axis=-1)
+        cov = np.stack([
+            np.stack([params['var_beta'].values,
+                      params['cov_beta_gamma'].values], axis=-1),
+            np.stack([params['cov_beta_gamma'].values,
+                      params['var_gamma'].values], axis=-1)
+        ], axis=-2)
+
+        # Cholesky factors of the (window, model) covariance matrices; windows
+        # a model does not have are NaN and give NaN samples.
+        fitted = ~np.isnan(cov).any(axis=(-2, -1))
+        self.chol = np.full(cov.shape, np.nan)
+        self.chol[fitted] = _cholesky(cov[fitted])
+
+        self.phi = phi
+        self.tcr = tcr
+        self.emission_rate = emission_rate
+        self.seed = seed
+
+    def sample(self, n_samples, seed=None):
+        """ Returns a (sample, window, model + 1) array of n_samples AF
+        samples, where the last model is the ensemble.
+
+        Parameters
+        ==========
+
+        n_samples: int
+
+            number of samples.
+
+        seed: int or np.random.SeedSequence, optional
+
+            seed of the RNG.
+            Defaults to None, which uses the seed of the instance.
+
+        """
+
+        rng = np.random.default_rng(self.seed if seed is None else seed)
+        return _af_samples(rng, n_samples, self.mean, self.chol, self.phi,
+                           self.tcr, self.emission_rate)
+
+    def run(self, n_samples=10**6, batch_size=10**5, processes=None,
+            bins=np.linspace(-5, 5, 10001), quantiles=QUANTILES):
+        """ Returns a xr.Dataset of the AF distribution of each window and
+        model (including the 'ensemble' model):
+
+            density: histogram density over the bins, with dimensions (window,
+                model, af).
+            af_quantile: AF quantiles interpolated from the histogram (-inf
+                or inf if below or above the bins).
+            mean, std: mean and standard deviation of the finite samples.
+            outside: fraction of the samples outside the bins (e.g. negative
+                AFs where alpha >= ln(1 + r)).
+
+        Parameters
+        ==========
+
+        n_samples: int, optional
+
+            total number of samples.
+            Defaults to 10**6.
+
+        batch_size: int, optional
+
+            number of samples of each batch.
+            Defaults to 10**5.
+
+        processes: int, optional
+
+            number of worker processes. Results do not depend on it.
+            Defaults to None, which is the number of CPUs (up to the number
+            of batches).
+
+        bins: np.ndarray, optional
+
+            AF histogram bin edges.
+            Defaults to 10000 bins between -5 and 5.
+
+        quantiles: list-like, optional
+
+            quantiles to return.
+            Defaults to QUANTILES.
+
+        """
+
+        sizes = [batch_size] * (n_samples // batch_size)
+        if n_samples % batch_size:
+            sizes.append(n_samples % batch_size)
+
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        args = [(seed, size, self.mean, self.chol, self.phi, self.tcr,
+                 self.emission_rate, bins) for seed, size in zip(seeds, sizes)]
+
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(sizes))
+
+        if processes > 1:
+            with ProcessPoolExecutor(processes) as executor:
+                results = list(executor.map(_batch_summary, *zip(*args)))
+        else:
+            results = [_batch_summary(*arg) for arg in args]
+
+        counts, n, total, total_sq = [sum(result[i] for result in results)
+                                      for i in range(4)]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / n
+            std = np.sqrt(np.maximum(total_sq / n - mean ** 2, 0))
+            density = counts[..., 1:-1] / n[..., np.newaxis] / np.diff(bins)
+            outside = (counts[..., 0] + counts[..., -1]) / n
+
+        return xr.Dataset(
+            {
+                'density': (('window', 'model', 'af'), density),
+                'af_quantile': (('quantile', 'window', 'model'),
+                             _histogram_quantiles(counts, n, bins, quantiles)),
+                'mean': (('window', 'model'), mean),
+                'std': (('window', 'model'), std),
+                'outside': (('window', 'model'), outside)
+            },
+            coords={
+                'window': self.windows,
+                'model': np.append(self.models.astype(object), 'ensemble'),
+                'af': (bins[1:] + bins[:-1]) / 2,
+                'quantile': np.asarray(quantiles)
+            },
+            attrs={'n_samples': n_samples, 'seed': self.seed}
+        )
+
+
+""" FUNCTIONS """
+def _cholesky(cov):
+    """ Returns the lower Cholesky factors of a stack of 2 x 2 covariance
+    matrices, allowing singular (e.g. zero variance) matrices.
+    """
+
+    a = np.sqrt(np.maximum(cov[..., 0, 0], 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b = np.where(a > 0, cov[..., 1, 0] / a, 0.)
+    c = np.sqrt(np.maximum(cov[..., 1, 1] - b ** 2, 0))
+
+    chol = np.zeros(cov.shape)
+    chol[..., 0, 0] = a
+    chol[..., 1, 0] = b
+    chol[..., 1, 1] = c
+    return chol
+
+def _draw(rng, distribution, n_samples):
+    """ Returns n_samples draws of a fixed value (float), normal distribution
+    ((mean, std) tuple) or empirical distribution (np.ndarray).
+    """
+
+    if isinstance(distribution, tuple):
+        return rng.normal(distribution[0], distribution[1], n_samples)
+    if np.ndim(distribution) > 0:
+        return rng.choice(np.asarray(distribution, dtype=float), n_samples)
+    return np.full(n_samples, float(distribution))
+
+def _af_samples(rng, n_samples, mean, chol, phi, tcr, emission_rate):
+    """ Returns a (sample, window, model + 1) array of AF samples, where the
+    last model is the ensemble.
+    """
+
+    z = rng.standard_normal((2, n_samples) + mean.shape[:-1])
+    beta = mean[..., 0] + chol[..., 0, 0] * z[0]
+    gamma = mean[..., 1] + chol[..., 1, 0] * z[0] + chol[..., 1, 1] * z[1]
+
+    phi = _draw(rng, phi, n_samples)[:, np.newaxis, np.newaxis]
+    rho = F2X / _draw(rng, tcr, n_samples)[:, np.newaxis, np.newaxis]
+    rate = _draw(rng, emission_rate, n_samples)[:, np.newaxis, np.newaxis]
+
+    alpha = beta + gamma * phi / rho
+    with np.errstate(invalid='ignore'):
+        ensemble = np.nanmean(alpha, axis=-1, keepdims=True)
+    alpha = np.concatenate([alpha, ensemble], axis=-1)
+
+    return 1 / (1 - alpha / np.log(1 + rate))
+
+def _batch_summary(seed, n_samples, mean, chol, phi, tcr, emission_rate,
+                   bins):
+    """ Returns the (window, model, bin) histogram counts, with the samples
+    below and above the bins in the first and last bin, and the number, sum
+    and sum of squares of the finite AF samples of one batch.
+    """
+
+    af = _af_samples(np.random.default_rng(seed), n_samples, mean, chol, phi,
+                     tcr, emission_rate)
+    finite = np.isfinite(af)
+
+    # Histogram of every (window, model) at once. Bin indices of evenly
+    # spaced bins are computed directly, which is much faster than a search.
+    width = np.diff(bins)
+    if np.allclose(width, width[0]):
+        with np.errstate(invalid='ignore'):
+            position = np.where(finite, (af - bins[0]) / width[0], -1)
+        index = np.clip(np.floor(position), -1, len(bins) - 1).astype(int) + 1
+    else:
+        index = np.searchsorted(bins, af, side='right')
+    index = np.where(af == bins[-1], len(bins) - 1, index)
+    nbins = len(bins) + 1
+    offsets = np.arange(af[0].size).reshape(af.shape[1:]) * nbins
+    counts = np.bincount((index + offsets).ravel(), weights=finite.ravel(),
+                         minlength=af[0].size * nbins)
+    counts = counts.reshape(af.shape[1:] + (nbins,)).astype(int)
+
+    af = np.where(finite, af, 0.)
+    return counts, finite.sum(axis=0), af.sum(axis=0), (af ** 2).sum(axis=0)
+
+def _histogram_quantiles(counts, n, bins, quantiles):
+    """ Returns the (quantile, ...) quantiles of n samples counted in the
+    histograms counts (..., bin) of _batch_summary, interpolated linearly
+    within bins.
+    """
+
+    # Cumulative counts at each bin edge.
+    cdf = np.cumsum(counts[..., :-1], axis=-1)
+
+    result = np.full((len(quantiles),) + counts.shape[:-1], np.nan)
+    for idx in np.ndindex(counts.shape[:-1]):
+        if n[idx] == 0:
+            continue
+        targets = np.asarray(quantiles) * n[idx]
+        result[(slice(None),) + idx] = np.interp(targets, cdf[idx], bins,
+                                                 left=-np.inf, right=np.inf)
+
+    return result
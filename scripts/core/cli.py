@@ -0,0 +1,736 @@
+""" Command line entry point of the pipelines, installed as carbon-pipeline
+(or run with python -m core.cli):
+
+    carbon-pipeline [--jobs N] [--trace FILE] [--log FILE] <command> ...
+
+    spatial {inversions,TRENDY}: spatial and temporal aggregation of the
+        gridded uptake of every model (spatial/*/output_all.py), on --jobs
+        processes or, with --dask-workers, a dask LocalCluster.
+    temp: spatial and temporal averages of the HadCRUT, CRUTEM and HadSST
+        temperatures (spatial/TEMP/output_all.py).
+    mean: mean and standard deviation of the TRENDY models for each
+        simulation (spatial/TRENDY/mean_TRENDY.py).
+    feedbacks: beta, gamma and regression statistics of the inversions and
+        TRENDY models for each variable and time resolution, and with
+        --time-varying their continuous trajectories.
+    af: airborne fraction of GCP, the inversions and TRENDY models.
+    evaluate {inversions,TRENDY}: evaluation of the whole ensemble against
+        GCP (model_evaluation/*).
+    analysis {inversions,TRENDY}: cascading window trends, power spectra and
+        filtered timeseries of every model output (analysis/*/analysis.py).
+
+All commands run in one interpreter: the reference data (CO2, GCP budget,
+HadCRUT outputs and model uptake) are read once and shared between the
+commands and the feedback fits of core.feedbacks. The per-file commands
+(spatial, temp and analysis) run on --jobs worker processes; the others fit
+all models at once in the main process. The pass or fail of each task is
+logged to --log as in the output_all.py scripts, and the stages are traced to
+--trace (see core.instrument). Paths are those of the repository, relative to
+MAIN_DIR.
+"""
+
+
+""" IMPORTS """
+import os
+import sys
+import glob
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core import instrument
+from core import ledger
+from core import storage
+from core import units
+
+# xarray, the analysis modules and their scipy and statsmodels dependencies
+# are imported by the commands that use them.
+
+
+""" INPUTS """
+CURRENT_PATH = os.path.dirname(__file__)
+MAIN_DIR = CURRENT_PATH + "./../../"
+DATA_DIR = MAIN_DIR + "data/"
+OUTPUT_DIR = MAIN_DIR + "output/"
+
+INVERSIONS = {
+    "Rayner": "fco2_Rayner-C13-2018_June2018-ext3_1992-2012_monthlymean_XYT.nc",
+    "CAMS": "fco2_CAMS-V17-1-2018_June2018-ext3_1979-2017_monthlymean_XYT.nc",
+    "CTRACKER": "fco2_CTRACKER-EU-v2018_June2018-ext3_2000-2017_monthlymean_XYT.nc",
+    "JAMSTEC": "fco2_JAMSTEC-V1-2-2018_June2018-ext3_1996-2017_monthlymean_XYT.nc",
+    "JENA_s76": "fco2_JENA-s76-4-2-2018_June2018-ext3_1976-2017_monthlymean_XYT.nc",
+    "JENA_s85": "fco2_JENA-s85-4-2-2018_June2018-ext3_1985-2017_monthlymean_XYT.nc"
+}
+
+TEMPS = {
+    "CRUTEM": "CRUTEM.4.6.0.0.anomalies.nc",
+    "HadCRUT": "HadCRUT.4.6.0.0.median.nc",
+    "HadSST": "HadSST.3.1.1.0.median.nc"
+}
+
+# TRENDY models of the feedback analysis and airborne fraction, and of the
+# model evaluation.
+TRENDY_MODELS = ('VISIT', 'OCN', 'JSBACH', 'CLASS-CTEM', 'CABLE-POP')
+TRENDY_EVALUATION = ('CABLE-POP', 'CLASS-CTEM', 'JSBACH', 'OCN', 'LPJ-GUESS')
+TRENDY_SIMS = ('S1', 'S3')
+
+REGIONS = ('Earth', 'South', 'Tropical', 'North')
+
+
+""" CLASSES """
+class Inputs:
+    """ This class reads the reference data and spatial outputs used by the
+    feedback, airborne fraction and evaluation commands once, so that every
+    command run in the same interpreter shares the same objects (and the fits
+    cached by core.feedbacks).
+    """
+
+    def __init__(self):
+        """ Initialise an instance of an Inputs. """
+
+        self._cache = {}
+
+    def _get(self, key, load):
+        if key not in self._cache:
+            self._cache[key] = load()
+        return self._cache[key]
+
+    def co2(self, timeres='year'):
+        """ Returns the CO2 record of timeres ('year' or 'month').
+        """
+
+        def load():
+            from core import GCP_flux
+
+            if timeres == 'year':
+                return GCP_flux.cached_csv(GCP_flux.CO2_FNAME, 'Year')['CO2']
+
+            fname = DATA_DIR + "CO2/co2_month.csv"
+            return GCP_flux.cached_csv(fname, ('Year', 'Month'))['CO2']
+
+        return self._get(('co2', timeres), load)
+
+    def temp(self, timeres='year'):
+        """ Returns the HadCRUT output of timeres.
+        """
+
+        folder = OUTPUT_DIR + "TEMP/spatial/output_all/HadCRUT/"
+        return self._get(('temp', timeres),
+                         lambda: storage.open_output(folder, timeres))
+
+    def invf_uptake(self, timeres='year'):
+        """ Returns {model: output of timeres} of the inversions.
+        """
+
+        return self._get(('invf', timeres), lambda: {
+            model: storage.open_output(folder, timeres)
+            for model, folder in output_folders('inversions').items()
+        })
+
+    def trendy_uptake(self, timeres='year'):
+        """ Returns {sim: {timeres: {model: output of timeres}}} of
+        TRENDY_MODELS, as expected by FeedbackAnalysis.TRENDY.
+        """
+
+        folder = OUTPUT_DIR + "TRENDY/spatial/output_all/{}_{}_nbp/"
+        return self._get(('trendy', timeres), lambda: {
+            sim: {timeres: {
+                model: storage.open_output(folder.format(model, sim), timeres)
+                for model in TRENDY_MODELS
+            }}
+            for sim in TRENDY_SIMS
+        })
+
+
+""" FUNCTIONS """
+def output_folders(kind):
+    """ Returns {name: folder} of the spatial outputs of kind ('inversions',
+    'TRENDY' or 'TEMP') that exist.
+    """
+
+    folders = sorted(glob.glob(OUTPUT_DIR + f"{kind}/spatial/output_all/*/"))
+    return {folder.rstrip('/').split('/')[-1]: folder for folder in folders}
+
+def _has_output(folder, freq):
+    return (os.path.isfile(os.path.join(folder, f"{freq}.nc")) or
+            os.path.isfile(os.path.join(folder, storage.SINGLE_FILE)))
+
+def run_tasks(tasks, jobs=1, ledger=None, only_failed=False):
+    """ Runs the tasks, a list of (label, function, args) or (label,
+    function, args, sources), serially if jobs is 1 or else on jobs worker
+    processes, logs the pass or fail of each task and returns the number of
+    failed tasks.
+
+    If ledger (a core.ledger.Ledger) is passed, tasks that are done with the
+    same fingerprint of sources (args if not given) are skipped (or all but
+    the failed tasks if only_failed), and every task run is recorded with the
+    outputs returned by its function.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def log(label, error):
+        if error is None:
+            logger.info(f"{label} :: pass")
+        else:
+            logger.error(f"{label} :: fail")
+            logger.error(error)
+
+    def finish(label, outputs, error):
+        log(label, error)
+        if ledger is not None:
+            ledger.finish(label, outputs, error)
+
+    pending = []
+    for label, function, args, *sources in tasks:
+        fingerprint = None
+        if ledger is not None:
+            fingerprint = ledger.fingerprint(*(sources[0] if sources else args))
+            if not ledger.should_run(label, fingerprint, only_failed):
+                logger.info(f"{label} :: skip")
+                continue
+        pending.append((label, function, args, fingerprint))
+
+    failed = 0
+    if jobs == 1:
+        for label, function, args, fingerprint in pending:
+            if ledger is not None:
+                ledger.start(label, fingerprint)
+            try:
+                outputs = function(*args)
+            except Exception as e:
+                failed += 1
+                finish(label, None, e)
+            else:
+                finish(label, outputs, None)
+        return failed
+
+    # Workers are started by a fork server instead of being forked from this
+    # process, whose threads (numba, dask) may hold locks that would deadlock
+    # the children. They trace to the same file as this process.
+    trace = instrument.trace_file()
+    with ProcessPoolExecutor(max_workers=jobs,
+                             mp_context=multiprocessing.get_context(
+                                 'forkserver'),
+                             initializer=instrument.enable if trace else None,
+                             initargs=(trace,) if trace else ()) as executor:
+        futures = {}
+        for label, function, args, fingerprint in pending:
+            if ledger is not None:
+                ledger.start(label, fingerprint)
+            futures[executor.submit(function, *args)] = label
+
+        for future in as_completed(futures):
+            error = future.exception()
+            failed += error is not None
+            finish(futures[future], None if error else future.result(), error)
+
+    return failed
+
+def spatial_output(kind, input_file, output_folder, profile=None,
+                   month_length=None):
+    """ Writes the spatial and temporal aggregates of input_file, as in the
+    output_all.py scripts of kind ('inversions', 'TRENDY' or 'TEMP'), and
+    returns output_folder. month_length is that of the SpatialAgg of the
+    fluxes.
+    """
+
+    from core import temporal
+
+    with instrument.stage('run', input_file=input_file):
+        if kind == 'inversions':
+            import xarray as xr
+            from core import inv_flux
+
+            df = inv_flux.SpatialAgg(data=xr.open_dataset(input_file),
+                                     month_length=month_length)
+            arrays = temporal.TemporalAgg(df.latitudinal_splits()).outputs()
+
+        elif kind == 'TRENDY':
+            from core import trendy_flux
+
+            df = trendy_flux.SpatialAgg(data=input_file,
+                                        month_length=month_length)
+            arrays = temporal.TemporalAgg(df.latitudinal_splits()).outputs()
+
+        else:
+            from core import TEMP
+
+            df = TEMP.SpatialAve(data=input_file).latitudinal_splits()
+            arrays = temporal.TemporalAgg(df, how='mean').outputs(
+                                                                seasonal=False)
+
+        storage.write_output(arrays, output_folder, profile)
+
+    return output_folder
+
+def analysis_output(kind, folder, timeres, window_size, period,
+                    output_folder):
+    """ Writes the cascading window trends (against time and CO2) and their
+    Pearson r-values, power spectrum and, for monthly outputs, the
+    deseasonalised and the deseasonalised low-pass filtered timeseries of
+    every variable of an output, with the file names of the analysis.py
+    scripts of kind ('inversions' or 'TRENDY'), and returns output_folder.
+    """
+
+    if kind == 'inversions':
+        from core.inv_flux import Analysis
+    else:
+        from core.trendy_flux import Analysis
+
+    df = Analysis(storage.open_output(folder, timeres))
+    fs = 12 if timeres == 'month' else 1
+
+    for variable in df.data.data_vars:
+        variable_folder = os.path.join(output_folder, variable)
+        window_folder = os.path.join(variable_folder,
+                                     f"window_size{window_size}")
+        os.makedirs(window_folder, exist_ok=True)
+
+        for indep in ('time', 'CO2'):
+            cwt, rvalues = df.cascading_window_trend(variable, window_size,
+                                                     indep, pearson=True)
+            storage.save_result(
+                cwt, os.path.join(window_folder,
+                                  f"cascading_window_{window_size}_"
+                                  f"{variable}_{indep}")
+            )
+            storage.save_result(
+                rvalues, os.path.join(window_folder,
+                                      f"cascading_window_pearson_"
+                                      f"{window_size}_{variable}_{indep}")
+            )
+
+        storage.save_result(df.psd(variable, fs),
+                            os.path.join(variable_folder, f"psd_{variable}"))
+
+        if timeres == 'month':
+            period_folder = os.path.join(variable_folder, f"period{period}")
+            os.makedirs(period_folder, exist_ok=True)
+
+            storage.save_result(df.deseasonalise(variable),
+                                os.path.join(variable_folder,
+                                             f"deseasonalise_{variable}"))
+            storage.save_result(df.bandpass(variable, 1 / period, fs,
+                                            deseasonalise_first=True),
+                                os.path.join(period_folder,
+                                             f"bandpass_{period}_low_"
+                                             f"{variable}_deseasonal"))
+
+    return output_folder
+
+def spatial(args, inputs):
+    """ spatial command.
+    """
+
+    output_dir = OUTPUT_DIR + f"{args.kind}/spatial/output_all/"
+
+    if args.kind == 'inversions':
+        files = {model: DATA_DIR + "inversions/" + fname
+                 for model, fname in INVERSIONS.items()}
+    else:
+        # data/TRENDY/models/<model>/<sim>/<model>_<sim>_nbp.nc
+        pattern = DATA_DIR + "TRENDY/models/*/*/*_nbp.nc"
+        files = {os.path.splitext(os.path.basename(fname))[0]: fname
+                 for fname in sorted(glob.glob(pattern))}
+
+    files = {name: fname for name, fname in files.items()
+             if args.models is None or name in args.models}
+
+    # Resolved here so that the ledger reruns the files if it changes.
+    args.month_length = args.month_length or units.MONTH_LENGTH
+
+    if args.dask_workers:
+        return spatial_dask(args, files, output_dir)
+
+    tasks = [(name, spatial_output,
+              (args.kind, fname, output_dir + name + '/', args.profile,
+               args.month_length),
+              (args.kind, fname, args.profile, args.month_length))
+             for name, fname in files.items()]
+
+    return run_tasks(tasks, args.jobs, args.ledger, args.retry_failed)
+
+def spatial_dask(args, files, output_dir):
+    """ spatial command on a dask LocalCluster (see core.cluster).
+    """
+
+    from core import cluster
+
+    if args.ledger is not None:
+        files = {name: fname for name, fname in files.items()
+                 if args.ledger.should_run(
+                     name, args.ledger.fingerprint(args.kind, fname,
+                                                   args.profile,
+                                                   args.month_length),
+                     args.retry_failed)}
+
+    backend = cluster.LocalBackend(n_workers=args.dask_workers,
+                                   threads_per_worker=args.threads_per_worker,
+                                   memory_limit=args.memory_limit,
+                                   time_chunk=args.time_chunk)
+    with backend:
+        return cluster.spatial_outputs(files, args.kind, output_dir, backend,
+                                       args.profile, args.ledger,
+                                       args.month_length)
+
+def temp(args, inputs):
+    """ temp command.
+    """
+
+    output_dir = OUTPUT_DIR + "TEMP/spatial/output_all/"
+    tasks = [(name, spatial_output,
+              ('TEMP', DATA_DIR + "temp/crudata/" + fname,
+               output_dir + name + '/', args.profile),
+              ('TEMP', DATA_DIR + "temp/crudata/" + fname, args.profile))
+             for name, fname in TEMPS.items()]
+
+    return run_tasks(tasks, args.jobs, args.ledger, args.retry_failed)
+
+def mean(args, inputs):
+    """ mean command: writes the mean and standard deviation over the TRENDY
+    models of each land variable to spatial/mean_all/<sim>/<timeres>.nc.
+    """
+
+    import xarray as xr
+
+    variables = [region + '_Land' for region in REGIONS]
+    output_dir = OUTPUT_DIR + "TRENDY/spatial/mean_all/"
+
+    for sim in TRENDY_SIMS:
+        folders = {name: folder for name, folder
+                   in output_folders('TRENDY').items()
+                   if name.endswith(f"_{sim}_nbp")}
+
+        for timeres in ('month', 'year'):
+            # Models are aligned on time, with NaN before the start of
+            # shorter runs (VISIT starts in 1860).
+            ds = xr.concat(
+                [storage.open_output(folder, timeres)[variables]
+                 .sel(time=slice("1701", "2017"))
+                 for folder in folders.values()],
+                dim='model', join='outer'
+            )
+
+            values = {}
+            for variable in variables:
+                values[variable] = ds[variable].mean('model')
+                values[variable + '_STD'] = ds[variable].std('model')
+
+            os.makedirs(output_dir + sim, exist_ok=True)
+            with instrument.stage('write_netcdf', sim=sim, group=timeres):
+                xr.Dataset(values).to_netcdf(output_dir + f"{sim}/{timeres}.nc")
+
+    return 0
+
+def feedback_output(inputs, kind, timeres, variable):
+    """ Writes the parameters (beta, gamma, u_gamma) of each model and
+    window, and the regression statistics, of kind ('inversions' or 'TRENDY')
+    and variable to feedbacks/<kind>/<timeres>/<variable>/ and returns the
+    folder. TRENDY files are suffixed with the simulation.
+    """
+
+    import pandas as pd
+    from core import feedbacks
+
+    co2, temp = inputs.co2('year'), inputs.temp('year')
+
+    if kind == 'inversions':
+        df = feedbacks.invf(co2, temp, inputs.invf_uptake(timeres), variable)
+        results = {'': (df.params(), df.regstats())}
+    else:
+        df = feedbacks.trendy(timeres, co2, temp,
+                              inputs.trendy_uptake(timeres), variable)
+        params, stats = df.params(), df.regstats()
+        results = {f"_{sim}": (params[sim], stats[sim])
+                   for sim in TRENDY_SIMS}
+
+    folder = OUTPUT_DIR + f"feedbacks/{kind}/{timeres}/{variable}/"
+    os.makedirs(folder, exist_ok=True)
+
+    for suffix, (params, stats) in results.items():
+        for param, values in params.items():
+            storage.save_result(values, folder + param + suffix)
+        storage.save_result(pd.concat(stats, names=['model']),
+                            folder + "regstats" + suffix)
+
+    return folder
+
+def time_varying_output(inputs, kind, timeres):
+    """ Writes the time-varying beta and gamma of every model and variable of
+    kind ('inversions' or 'TRENDY'), smoothed as one batch (see
+    core.feedbacks.time_varying), to feedbacks/<kind>/<timeres>/ and returns
+    the folder. As in FeedbackAnalysis.TRENDY, beta is fitted on S1 and gamma
+    on S3 - S1.
+    """
+
+    from core import feedbacks
+
+    co2, temp = inputs.co2('year'), inputs.temp('year')
+
+    if kind == 'inversions':
+        variables = [f"{region}_{sink}" for region in REGIONS
+                     for sink in ('Land', 'Ocean')]
+        results = {'': feedbacks.time_varying(co2, temp,
+                                              inputs.invf_uptake(timeres),
+                                              variables)}
+    else:
+        variables = [f"{region}_Land" for region in REGIONS]
+        uptake = inputs.trendy_uptake(timeres)
+        S3m1 = {model: uptake['S3'][timeres][model] -
+                       uptake['S1'][timeres][model]
+                for model in uptake['S1'][timeres]}
+        results = {
+            '_S1': feedbacks.time_varying(co2, temp, uptake['S1'][timeres],
+                                          variables, predictors=('C',)),
+            '_S3': feedbacks.time_varying(co2, temp, S3m1, variables,
+                                          predictors=('T',))
+        }
+
+    folder = OUTPUT_DIR + f"feedbacks/{kind}/{timeres}/"
+    os.makedirs(folder, exist_ok=True)
+
+    for suffix, ds in results.items():
+        storage.save_result(ds, folder + "time_varying" + suffix)
+
+    return folder
+
+def feedback(args, inputs):
+    """ feedbacks command: feedback_output of each kind, time resolution and
+    variable, run in this process to share the inputs and fits, and
+    time_varying_output of each kind and time resolution with
+    --time-varying.
+    """
+
+    from core import GCP_flux
+
+    trendy_folder = OUTPUT_DIR + "TRENDY/spatial/output_all/{}_{}_nbp/"
+    sources = {
+        'inversions': tuple(output_folders('inversions').values()),
+        'TRENDY': tuple(trendy_folder.format(model, sim)
+                        for model in TRENDY_MODELS for sim in TRENDY_SIMS)
+    }
+    common = (GCP_flux.CO2_FNAME, OUTPUT_DIR + "TEMP/spatial/output_all/HadCRUT/")
+
+    tasks = []
+    for timeres in args.timeres:
+        for kind in ('inversions', 'TRENDY'):
+            sinks = ('Land', 'Ocean') if kind == 'inversions' else ('Land',)
+
+            for region, sink in ((r, s) for r in REGIONS for s in sinks):
+                variable = f"{region}_{sink}"
+                tasks.append((f"feedbacks {kind} {timeres} {variable}",
+                              feedback_output,
+                              (inputs, kind, timeres, variable),
+                              (kind, timeres, variable, common,
+                               sources[kind])))
+
+            if args.time_varying:
+                tasks.append((f"feedbacks {kind} {timeres} time_varying",
+                              time_varying_output, (inputs, kind, timeres),
+                              (kind, timeres, common, sources[kind])))
+
+    return run_tasks(tasks, 1, args.ledger, args.retry_failed)
+
+def af(args, inputs):
+    """ af command: writes the airborne fraction of each decade of GCP, the
+    inversions and TRENDY to airborne_fraction/<source>.csv.
+    """
+
+    import pandas as pd
+    from core import AirborneFraction
+
+    co2, temp = inputs.co2('year'), inputs.temp('year')
+    sources = {
+        'GCP': AirborneFraction.GCP(co2, temp),
+        'inversions': AirborneFraction.INVF(co2, temp, inputs.invf_uptake()),
+        'TRENDY': AirborneFraction.TRENDY(co2, temp, inputs.trendy_uptake())
+    }
+
+    folder = OUTPUT_DIR + "airborne_fraction/"
+    os.makedirs(folder, exist_ok=True)
+
+    for source, df in sources.items():
+        result = df.window_af(args.emission_rate)
+        storage.save_result(pd.DataFrame(result), folder + source)
+
+    return 0
+
+def evaluate(args, inputs):
+    """ evaluate command: writes the evaluation of every model of kind
+    against GCP to model_evaluation/ensemble_evaluation.csv.
+    """
+
+    from core import GCP_flux
+    from core import ensemble_evaluation
+
+    if args.kind == 'inversions':
+        folders = output_folders('inversions')
+    else:
+        folders = {name: folder for name, folder
+                   in output_folders('TRENDY').items()
+                   if name.split('_')[0] in TRENDY_EVALUATION}
+
+    models = {name: storage.open_output(folder, 'year')
+              for name, folder in folders.items()}
+
+    df = ensemble_evaluation.EnsembleEvaluation(
+        models,
+        GCP=GCP_flux.cached_csv(GCP_flux.GCP_FNAME, 'Year'),
+        co2=inputs.co2('year')
+    ).evaluate(tuple(args.window_size), args.indep)
+
+    folder = OUTPUT_DIR + f"{args.kind}/model_evaluation/"
+    os.makedirs(folder, exist_ok=True)
+    storage.save_result(df, folder + "ensemble_evaluation")
+
+    return 0
+
+def analysis(args, inputs):
+    """ analysis command.
+    """
+
+    folders = output_folders(args.kind)
+    if args.kind == 'TRENDY':
+        folders.update({f"mean_{sim}": OUTPUT_DIR + f"TRENDY/spatial/mean_all/{sim}/"
+                        for sim in TRENDY_SIMS})
+
+    tasks = []
+    for name, folder in folders.items():
+        for timeres in ('year', 'month'):
+            if not _has_output(folder, timeres):
+                continue
+
+            output_folder = OUTPUT_DIR + f"{args.kind}/analysis/{timeres}/{name}/"
+            sources = (args.kind, folder, timeres, args.window_size,
+                       args.period)
+            tasks.append((f"{name} {timeres}", analysis_output,
+                          sources + (output_folder,), sources))
+
+    return run_tasks(tasks, args.jobs, args.ledger, args.retry_failed)
+
+def parser():
+    """ Returns the argparse.ArgumentParser of the command line.
+    """
+
+    parser = argparse.ArgumentParser(prog='carbon-pipeline',
+                                     description="Run the spatial, feedback,"
+                                     " evaluation and analysis pipelines.")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="worker processes of the per-file commands")
+    parser.add_argument('--trace', default=os.environ.get(
+                            instrument.TRACE_ENV),
+                        help="JSON lines file to trace the stages to")
+    parser.add_argument('--log', default='result.log',
+                        help="file to log the pass or fail of each task to")
+    parser.add_argument('--ledger',
+                        help="SQLite file recording the completed tasks of "
+                             "spatial, temp, feedbacks and analysis, to "
+                             "resume them (see core.ledger)")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="only rerun the tasks that failed in --ledger")
+
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('spatial', help="aggregate model uptake")
+    command.add_argument('kind', choices=('inversions', 'TRENDY'))
+    command.add_argument('--models', nargs='+',
+                         help="only these inversions or TRENDY files "
+                              "(e.g. CABLE-POP_S1_nbp)")
+    command.add_argument('--profile', help="one of core.storage.PROFILES")
+    command.add_argument('--month-length', choices=('fixed', 'calendar'),
+                         help="convert fluxes with 30-day months or the "
+                              "calendar of the data (see core.units)")
+    command.add_argument('--dask-workers', type=int,
+                         help="compute all files together on a dask "
+                              "LocalCluster of this many workers instead of "
+                              "--jobs processes")
+    command.add_argument('--threads-per-worker', type=int, default=1)
+    command.add_argument('--memory-limit', default='auto',
+                         help="memory limit of each dask worker, e.g. 4GB")
+    command.add_argument('--time-chunk', type=int, default=120,
+                         help="time steps of each dask chunk")
+    command.set_defaults(run=spatial)
+
+    command = commands.add_parser('temp', help="average temperatures")
+    command.add_argument('--profile', help="one of core.storage.PROFILES")
+    command.set_defaults(run=temp)
+
+    command = commands.add_parser('mean', help="TRENDY ensemble mean")
+    command.set_defaults(run=mean)
+
+    command = commands.add_parser('feedbacks', help="feedback parameters")
+    command.add_argument('--timeres', nargs='+', default=['year'],
+                         choices=('year', 'summer', 'winter'))
+    command.add_argument('--time-varying', action='store_true',
+                         help="also smooth time-varying beta and gamma with "
+                              "a Kalman filter (see core.statespace)")
+    command.set_defaults(run=feedback)
+
+    command = commands.add_parser('af', help="airborne fraction")
+    command.add_argument('--emission-rate', type=float, default=0.02)
+    command.set_defaults(run=af)
+
+    command = commands.add_parser('evaluate', help="evaluate against GCP")
+    command.add_argument('kind', choices=('inversions', 'TRENDY'))
+    command.add_argument('--window-size', type=int, nargs='+', default=[10])
+    command.add_argument('--indep', default='CO2', choices=('CO2', 'time'))
+    command.set_defaults(run=evaluate)
+
+    command = commands.add_parser('analysis', help="timeseries analysis")
+    command.add_argument('kind', choices=('inversions', 'TRENDY'))
+    command.add_argument('--window-size', type=int, default=10)
+    command.add_argument('--period', type=int, default=10)
+    command.set_defaults(run=analysis)
+
+    return parser
+
+def main(argv=None, inputs=None):
+    """ Runs the command line argv (sys.argv[1:] if None) and returns the
+    exit status: the number of failed tasks (capped at 1).
+
+    inputs is an Inputs instance to share between several calls of main in
+    one interpreter. Defaults to None, which creates one.
+    """
+
+    args = parser().parse_args(argv)
+
+    # A handler per call (rather than logging.basicConfig) so that each call
+    # logs to its own --log file. It is set on the core logger to also
+    # receive the logs of core.cluster.
+    logger = logging.getLogger('core')
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(args.log)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s: %(levelname)s:%(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M'
+    ))
+    logger.addHandler(handler)
+
+    if args.trace and not instrument.enabled():
+        instrument.enable(args.trace)
+
+    if inputs is None:
+        inputs = Inputs()
+
+    if args.ledger is not None:
+        args.ledger = ledger.Ledger(args.ledger)
+
+    try:
+        with instrument.stage(args.command):
+            failed = args.run(args, inputs)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+        if args.ledger is not None:
+            args.ledger.close()
+
+    if failed:
+        print(f"{failed} task(s) failed, see {args.log}.", file=sys.stderr)
+
+    return int(failed > 0)
+
+
+""" EXECUTION """
+if __name__ == "__main__":
+    sys.exit(main())
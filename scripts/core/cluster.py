@@ -0,0 +1,223 @@
+""" Optional dask.distributed backend of the spatial aggregations.
+
+By default SpatialAgg integrates one model at a time with numpy arrays, and
+the batch runners process one file per process. With LocalBackend, the
+gridded cubes of every model are opened as dask arrays chunked along time,
+and the latitudinal splits (including the TRENDY regridding) of all models
+are built into one task graph that a dask.distributed.LocalCluster computes
+concurrently within its memory limits. Only the integrated timeseries come
+back to this process, where the yearly, decadal, whole and seasonal
+aggregates are derived and written as in the output_all.py scripts.
+
+    with cluster.LocalBackend(n_workers=4, memory_limit='8GB') as backend:
+        failed = cluster.spatial_outputs(files, 'TRENDY', output_dir,
+                                         backend)
+
+dask and distributed are optional dependencies, only needed for this module.
+The cluster has no dashboard; progress is reported as a text bar.
+"""
+
+
+""" IMPORTS """
+import logging
+from core import instrument
+from core import storage
+from core import temporal
+
+
+""" CLASSES """
+class LocalBackend:
+    """ This class runs dask computations on a local cluster of worker
+    processes, created on entering a with block and closed on leaving it.
+
+    Parameters
+    ==========
+
+    n_workers: int, optional
+
+        number of worker processes.
+        Defaults to None, which lets dask choose from the number of cores.
+
+    threads_per_worker: int, optional
+
+        threads of each worker.
+        Defaults to 1.
+
+    memory_limit: string or int, optional
+
+        memory limit of each worker, e.g. '4GB'. Workers spill to disk and
+        pause above fractions of it.
+        Defaults to 'auto', which shares the memory of the node between the
+        workers.
+
+    time_chunk: int, optional
+
+        number of time steps of each chunk of the gridded cubes.
+        Defaults to 120.
+
+    progress: bool, optional
+
+        If True, print a text progress bar of each computation.
+        Defaults to True.
+
+    """
+
+    def __init__(self, n_workers=None, threads_per_worker=1,
+                 memory_limit='auto', time_chunk=120, progress=True):
+        """ Initialise an instance of a LocalBackend. """
+
+        self.n_workers = n_workers
+        self.threads_per_worker = threads_per_worker
+        self.memory_limit = memory_limit
+        self.time_chunk = time_chunk
+        self.progress = progress
+
+        self.cluster = None
+        self.client = None
+
+    @property
+    def chunks(self):
+        return {'time': self.time_chunk}
+
+    def __enter__(self):
+        try:
+            from dask import distributed
+        except ImportError as e:
+            raise ImportError("LocalBackend needs dask and distributed: "
+                              "pip install 'dask[distributed]'.") from e
+
+        self.cluster = distributed.LocalCluster(
+            n_workers=self.n_workers,
+            threads_per_worker=self.threads_per_worker,
+            memory_limit=self.memory_limit,
+            dashboard_address=None
+        )
+        self.client = distributed.Client(self.cluster)
+
+        return self
+
+    def __exit__(self, *exc):
+        self.client.close()
+        self.cluster.close()
+        self.client, self.cluster = None, None
+
+    def compute(self, collections):
+        """ Computes a dictionary of dask collections (e.g. lazy xr.Dataset)
+        in one task graph and returns a dictionary of {key: result or
+        exception}, so that one failed collection does not lose the others.
+        """
+
+        from dask import distributed
+
+        keys = list(collections)
+        futures = self.client.compute([collections[key] for key in keys])
+
+        if self.progress:
+            distributed.progress(futures, notebook=False)
+        distributed.wait(futures)
+
+        results = {}
+        for key, future in zip(keys, futures):
+            error = future.exception()
+            results[key] = error if error is not None else future.result()
+
+        return results
+
+
+""" FUNCTIONS """
+def latitudinal_splits(kind, fname, chunks, month_length=None):
+    """ Returns the lazy latitudinal splits of a gridded file of kind
+    ('inversions' or 'TRENDY').
+    """
+
+    if kind == 'inversions':
+        from core.inv_flux import SpatialAgg
+    else:
+        from core.trendy_flux import SpatialAgg
+
+    return SpatialAgg(fname, chunks=chunks,
+                      month_length=month_length).latitudinal_splits()
+
+def spatial_outputs(files, kind, output_dir, backend, profile=None,
+                    ledger=None, month_length=None):
+    """ Writes the spatial and temporal aggregates of every file, as in the
+    output_all.py scripts, computing the latitudinal splits of all files
+    together on backend. Logs the pass or fail of each file and returns the
+    number of failed files.
+
+    Parameters
+    ==========
+
+    files: dict
+
+        {name: gridded file}, written to output_dir/<name>/.
+
+    kind: string
+
+        'inversions' or 'TRENDY'.
+
+    output_dir: string
+
+        directory of the outputs.
+
+    backend: LocalBackend
+
+        entered backend to compute on.
+
+    profile: EncodingProfile or string, optional
+
+        encoding profile of core.storage.
+        Defaults to None.
+
+    ledger: core.ledger.Ledger, optional
+
+        ledger to record the files in. Files are filtered by the caller.
+        Defaults to None.
+
+    month_length: string, optional
+
+        'fixed' or 'calendar' month lengths of SpatialAgg.
+        Defaults to None.
+
+    """
+
+    logger = logging.getLogger(__name__)
+    errors = {}
+
+    lazy = {}
+    for name, fname in files.items():
+        if ledger is not None:
+            ledger.start(name, ledger.fingerprint(kind, fname, profile,
+                                                  month_length))
+        try:
+            lazy[name] = latitudinal_splits(kind, fname, backend.chunks,
+                                            month_length)
+        except Exception as e:
+            errors[name] = e
+
+    with instrument.stage('compute', n_files=len(lazy)):
+        results = backend.compute(lazy)
+
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            errors[name] = result
+            continue
+
+        output_folder = output_dir + name + '/'
+        try:
+            arrays = temporal.TemporalAgg(result).outputs()
+            storage.write_output(arrays, output_folder, profile)
+        except Exception as e:
+            errors[name] = e
+        else:
+            logger.info(f"{name} :: pass")
+            if ledger is not None:
+                ledger.finish(name, output_folder)
+
+    for name, error in errors.items():
+        logger.error(f"{name} :: fail")
+        logger.error(error)
+        if ledger is not None:
+            ledger.finish(name, error=error)
+
+    return len(errors)
@@ -0,0 +1,172 @@
+""" Curve-fit deseasonalisation of many timeseries at once, as in the CCGCRV
+method of Thoning et al. (1989).
+
+Each series is fitted with a polynomial and annual harmonics. The residuals
+from the fit are low-pass filtered in the frequency domain with a short-term
+cut-off (80 days) and a long-term cut-off (667 days), which give the smoothed
+curve and the deseasonalised trend respectively:
+
+    function = polynomial + harmonics
+    smooth = function + short-term filtered residuals
+    trend = polynomial + long-term filtered residuals
+    seasonal = smooth - trend
+    growth_rate = d(trend)/dt (per year)
+
+All series share one design matrix, so the fits of every variable of every
+model are one batched least squares solve (core.regression.ols) and the
+filters one FFT along time.
+"""
+
+
+""" IMPORTS """
+import numpy as np
+import xarray as xr
+
+from core import regression
+from core import spectral
+
+
+""" INPUTS """
+COMPONENTS = ('function', 'polynomial', 'smooth', 'trend', 'seasonal',
+              'growth_rate')
+
+
+""" FUNCTIONS """
+def decimal_year(time):
+    """ Returns the decimal years of the time points of a DataArray (numpy or
+    cftime dates), using the length of each month of its calendar.
+    """
+
+    return (time.dt.year + (time.dt.month - 1 +
+            (time.dt.day - 1) / time.dt.days_in_month) / 12).values
+
+def design_matrix(t, npoly=3, nharm=4, t0=0):
+    """ Returns the (time, parameter) design matrix of a polynomial of t - t0
+    with npoly terms (starting with the constant) and nharm annual harmonics
+    of t.
+    """
+
+    t = np.asarray(t, dtype=float)
+    columns = [(t - t0) ** i for i in range(npoly)]
+    for k in range(1, nharm + 1):
+        columns += [np.sin(2 * np.pi * k * t), np.cos(2 * np.pi * k * t)]
+
+    return np.stack(columns, axis=-1)
+
+def _lowpass(resid, dt, cutoff):
+    """ Returns resid low-pass filtered along its last axis with the filter
+    exp(-ln2 (f / fc)^6) of Thoning et al. (1989), where fc = 1 / cutoff and
+    cutoff is in days.
+    """
+
+    from scipy import fft
+
+    n = resid.shape[-1]
+    nfft = fft.next_fast_len(2 * n)
+
+    freqs = fft.rfftfreq(nfft, d=dt)
+    fc = 365 / cutoff
+    response = np.exp(-np.log(2) * (freqs / fc) ** 6)
+
+    coefs = fft.rfft(resid, n=nfft, axis=-1)
+    return fft.irfft(coefs * response, n=nfft, axis=-1)[..., :n]
+
+def fit(values, t, npoly=3, nharm=4, short_cutoff=80, long_cutoff=667):
+    """ Returns a dictionary of the COMPONENTS of each series of values, as
+    arrays with the shape of values.
+
+    Parameters
+    ==========
+
+    values: np.ndarray
+
+        (series, time) array of evenly sampled series. Missing values are
+        excluded from the fit and filled by the fitted function before
+        filtering.
+
+    t: np.ndarray
+
+        time of each time point in decimal years.
+
+    npoly: int, optional
+
+        number of polynomial terms (3 is a quadratic).
+        Defaults to 3.
+
+    nharm: int, optional
+
+        number of annual harmonics.
+        Defaults to 4.
+
+    short_cutoff, long_cutoff: float, optional
+
+        cut-off periods (in days) of the smoothing and trend filters.
+        Default to 80 and 667.
+
+    """
+
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    t = np.asarray(t, dtype=float)
+    dt = np.mean(np.diff(t))
+
+    # Centre time for a well-conditioned polynomial fit.
+    X = design_matrix(t, npoly, nharm, t0=t.mean())
+
+    params = regression.ols(np.broadcast_to(X, values.shape + X.shape[-1:]),
+                            values).params
+    polynomial = params[:, :npoly] @ X[:, :npoly].T
+    function = params @ X.T
+
+    resid = np.where(np.isnan(values), 0., values - function)
+
+    smooth = function + _lowpass(resid, dt, short_cutoff)
+    trend = polynomial + _lowpass(resid, dt, long_cutoff)
+
+    return {
+        'function': function,
+        'polynomial': polynomial,
+        'smooth': smooth,
+        'trend': trend,
+        'seasonal': smooth - trend,
+        'growth_rate': np.gradient(trend, t, axis=-1)
+    }
+
+def deseasonalise(data, variables=None, npoly=3, nharm=4, short_cutoff=80,
+                  long_cutoff=667):
+    """ Returns a xr.Dataset of the COMPONENTS of every variable of every
+    model, each with dimensions (model, variable, time).
+
+    Parameters
+    ==========
+
+    data: dict or xr.Dataset
+
+        dictionary of {model name: xr.Dataset} or a single xr.Dataset of
+        evenly sampled (e.g. monthly) series, as in spectral.stack.
+
+    variables: list-like, optional
+
+        variables to use. Passed to spectral.stack.
+        Defaults to None.
+
+    npoly, nharm, short_cutoff, long_cutoff: optional
+
+        passed to fit.
+
+    """
+
+    da = spectral.stack(data, variables)
+    nmodels, nvariables, ntime = da.shape
+
+    components = fit(da.values.reshape(-1, ntime), decimal_year(da.time),
+                     npoly, nharm, short_cutoff, long_cutoff)
+
+    return xr.Dataset(
+        {name: (('model', 'variable', 'time'), value.reshape(da.shape))
+         for name, value in components.items()},
+        coords={
+            'model': da['model'].values,
+            'variable': da['variable'].values,
+            'time': da.time.values
+        }
+    )
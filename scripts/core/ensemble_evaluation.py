@@ -0,0 +1,218 @@
+""" Evaluation of a whole ensemble of models against the Global Carbon Project
+(GCP) uptake timeseries.
+
+inv_flux.ModelEvaluation and trendy_flux.ModelEvaluation evaluate one model at
+a time and read the GCP budget and CO2 record for each model.
+EnsembleEvaluation aligns all models to the GCP years once in a (model, sink,
+year) array and computes the statistics of every model, sink and window size
+as masked array operations, returning one table.
+"""
+
+
+""" IMPORTS """
+import os
+import numpy as np
+import pandas as pd
+
+
+""" INPUTS """
+CURRENT_PATH = os.path.dirname(__file__)
+MAIN_DIR = CURRENT_PATH + "./../../"
+
+# Model variable of each GCP sink.
+SINKS = {'land': 'Earth_Land', 'ocean': 'Earth_Ocean'}
+
+
+""" CLASSES """
+class EnsembleEvaluation:
+    """ This class takes the yearly uptake datasets of an ensemble of models
+    and evaluates all of them against the GCP uptake timeseries at once.
+
+    Parameters
+    ==========
+
+    models: dict
+
+        dictionary of {model name: xr.Dataset} of yearly uptake with the
+        variables Earth_Land and/or Earth_Ocean (e.g. the year.nc outputs).
+
+    GCP: pd.DataFrame, optional
+
+        GCP budget indexed by year with 'land sink' and 'ocean sink' columns.
+        Defaults to None, which reads data/GCP/budget.csv.
+
+    co2: pd.Series, optional
+
+        yearly CO2 indexed by year.
+        Defaults to None, which reads data/CO2/co2_year.csv.
+
+    """
+
+    def __init__(self, models, GCP=None, co2=None):
+        """ Initialise an instance of an EnsembleEvaluation. """
+
+        if GCP is None:
+            GCP = pd.read_csv(MAIN_DIR + "data/GCP/budget.csv",
+                              index_col='Year')
+        if co2 is None:
+            co2 = pd.read_csv(MAIN_DIR + "data/CO2/co2_year.csv",
+                              index_col='Year')['CO2']
+
+        self.models = list(models)
+        self.sinks = list(SINKS)
+        self.years = GCP.index.values
+
+        # (sink, year) GCP uptake and (model, sink, year) model uptake, with
+        # NaN where a model has no data.
+        self.GCP = np.stack([GCP[f"{sink} sink"].values.astype(float)
+                             for sink in self.sinks])
+        self.uptake = np.full((len(self.models),) + self.GCP.shape, np.nan)
+
+        for i, model in enumerate(self.models):
+            ds = models[model]
+            index = pd.Index(self.years).get_indexer(ds.time.dt.year.values)
+            in_GCP = index >= 0
+            for j, sink in enumerate(self.sinks):
+                if SINKS[sink] in ds:
+                    values = ds[SINKS[sink]].values
+                    self.uptake[i, j, index[in_GCP]] = values[in_GCP]
+
+        self.co2 = co2.reindex(self.years).values * 2.12
+
+    def _cascading_window_trend(self, values, window_size, indep):
+        """ Returns the slopes of values (..., year) over every window of
+        window_size years, as in ModelEvaluation.cascading_window_trend.
+        Windows with missing values are NaN.
+
+        As in ModelEvaluation, a window is only used if the year after it is
+        also available, so a series of n years has n - window_size windows.
+        """
+
+        x = self.co2 if indep == "CO2" else self.years.astype(float)
+        x = np.broadcast_to(x, values.shape)
+
+        # The window and the year after it, which only masks the last window.
+        x_windows = np.lib.stride_tricks.sliding_window_view(
+            x, window_size + 1, axis=-1)
+        y_windows = np.lib.stride_tricks.sliding_window_view(
+            values, window_size + 1, axis=-1)
+        x_windows = np.where(np.isnan(y_windows[..., -1:]), np.nan,
+                             x_windows[..., :-1])
+        y_windows = y_windows[..., :-1]
+
+        x_anom = x_windows - x_windows.mean(axis=-1, keepdims=True)
+        y_anom = y_windows - y_windows.mean(axis=-1, keepdims=True)
+
+        return (x_anom * y_anom).sum(axis=-1) / (x_anom ** 2).sum(axis=-1)
+
+    def evaluate(self, window_sizes=(10,), indep="CO2"):
+        """ Returns a pd.DataFrame indexed by (model, sink) with the
+        statistics of each model and sink against GCP:
+
+            slope, intercept, rvalue, pvalue: linear regression of the model
+                uptake on the GCP uptake (regress_timeseries_to_GCP).
+            bias, rmse: mean and root mean square of model - GCP.
+            nobs: number of years compared.
+            GCP_slope, model_slope, diff: long-term trends (MtC/yr) and their
+                percentage difference (compare_trend_to_GCP).
+            CWT<window_size>_slope, _intercept, _rvalue, _pvalue, _bias,
+            _rmse: the same statistics for the cascading window trends
+                (regress_cascading_window_trend_to_GCP).
+
+        Sinks that a model does not have are not included.
+
+        Parameters
+        ==========
+
+        window_sizes: list-like, optional
+
+            window sizes (in years) of the cascading window trends.
+            Defaults to (10,).
+
+        indep: string, optional
+
+            Regress cascading window trends over "time" or "CO2".
+            Defaults to "CO2".
+
+        """
+
+        GCP = np.broadcast_to(self.GCP, self.uptake.shape)
+        years = np.broadcast_to(self.years.astype(float), self.uptake.shape)
+
+        table = _compare(GCP, self.uptake)
+
+        GCP_trend = _linregress(years, GCP, ~np.isnan(self.uptake))
+        model_trend = _linregress(years, self.uptake)
+        table['GCP_slope'] = GCP_trend['slope'] * 1e3
+        table['model_slope'] = model_trend['slope'] * 1e3
+        table['diff'] = GCP_trend['slope'] * 100 / model_trend['slope'] - 100
+
+        for window_size in window_sizes:
+            GCP_cwt = self._cascading_window_trend(GCP, window_size, indep)
+            model_cwt = self._cascading_window_trend(self.uptake,
+                                                     window_size, indep)
+            cwt = _compare(GCP_cwt, model_cwt)
+            for stat in ('slope', 'intercept', 'rvalue', 'pvalue', 'bias',
+                         'rmse'):
+                table[f"CWT{window_size}_{stat}"] = cwt[stat]
+
+        index = pd.MultiIndex.from_product([self.models, self.sinks],
+                                           names=['model', 'sink'])
+        df = pd.DataFrame({stat: value.ravel()
+                           for stat, value in table.items()}, index=index)
+
+        return df[df['nobs'] > 0]
+
+
+""" FUNCTIONS """
+def _linregress(x, y, valid=None):
+    """ Returns a dictionary of the slope, intercept, rvalue, pvalue and nobs
+    of scipy.stats.linregress(x, y) along the last axis, using only the
+    points where x and y (and valid, if passed) are not missing.
+    """
+
+    from scipy import stats
+
+    mask = ~(np.isnan(x) | np.isnan(y))
+    if valid is not None:
+        mask &= valid
+
+    n = mask.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(mask, x, 0).sum(axis=-1) / n
+        y_mean = np.where(mask, y, 0).sum(axis=-1) / n
+        x_anom = np.where(mask, x - x_mean[..., np.newaxis], 0)
+        y_anom = np.where(mask, y - y_mean[..., np.newaxis], 0)
+
+        sxx = (x_anom ** 2).sum(axis=-1)
+        syy = (y_anom ** 2).sum(axis=-1)
+        sxy = (x_anom * y_anom).sum(axis=-1)
+
+        slope = sxy / sxx
+        rvalue = np.clip(sxy / np.sqrt(sxx * syy), -1, 1)
+
+        dof = n - 2
+        tvalue = rvalue * np.sqrt(dof / ((1 - rvalue) * (1 + rvalue)))
+        pvalue = 2 * stats.t.sf(np.abs(tvalue), dof)
+
+    return {
+        'slope': slope,
+        'intercept': y_mean - slope * x_mean,
+        'rvalue': rvalue,
+        'pvalue': pvalue,
+        'nobs': n
+    }
+
+def _compare(GCP, model):
+    """ Returns the regression statistics of model on GCP along the last axis
+    and the bias and root mean square error of model - GCP.
+    """
+
+    stats = _linregress(GCP, model)
+
+    diff = model - GCP
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['bias'] = np.nansum(diff, axis=-1) / stats['nobs']
+        stats['rmse'] = np.sqrt(np.nansum(diff ** 2, axis=-1) / stats['nobs'])
+
+    return stats
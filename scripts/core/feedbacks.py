@@ -0,0 +1,468 @@
+""" Feedback fits shared between the airborne fraction and the feedback
+analysis.
+
+AirborneFraction and the feedback figures used to build their own
+FeedbackAnalysis objects (and read the GCP budget) for every result, so the
+same regressions were refitted several times per run. The functions here
+return the fits of a dataset, variable, window set and time resolution,
+computing them on the first call only:
+
+    invf, trendy: FeedbackAnalysis.INVF and FeedbackAnalysis.TRENDY objects.
+    gcp_windows: the land, ocean and total GCP sink regressions of a set of
+        windows, fitted as one batch.
+    time_varying: the continuous beta(t) and gamma(t) of every model and
+        variable, from the Kalman smoother of core.statespace.
+    lag_scan: the regressions of every model and variable on CO2 and every
+        lag of temperature (and CO2 growth), fitted as one batch.
+
+Inputs are identified by a digest of their contents, so equal copies of a
+dataset (e.g. a new slice of the same CO2 record) share their fits. Only the
+MAX_FITS most recently used fits are kept.
+"""
+
+
+""" IMPORTS """
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from core import FeedbackAnalysis
+from core import GCP_flux
+from core import regression
+from core import statespace
+
+
+""" INPUTS """
+GCP_SINKS = ('land', 'ocean', 'total')
+
+MAX_FITS = 32
+
+# Fits keyed by (kind, digest of the inputs, options), least recently used
+# first.
+_FITS = OrderedDict()
+
+
+""" FUNCTIONS """
+def _update(digest, obj):
+    """ Feeds the contents of obj (a pandas or xarray object, a dict or tuple
+    of them, or a scalar) to a hashlib digest.
+    """
+
+    if isinstance(obj, (tuple, list)):
+        for item in obj:
+            _update(digest, item)
+    elif isinstance(obj, dict):
+        for name in obj:
+            _update(digest, (name, obj[name]))
+    elif isinstance(obj, pd.Series):
+        _update(digest, (obj.name, obj.to_frame()))
+    elif isinstance(obj, pd.DataFrame):
+        _update(digest, tuple(obj.columns))
+        digest.update(pd.util.hash_pandas_object(obj).values.tobytes())
+    elif isinstance(obj, xr.DataArray):
+        _update(digest, obj.to_dataset(name='__data__'))
+    elif isinstance(obj, xr.Dataset):
+        for name in sorted(obj.variables, key=str):
+            variable = obj.variables[name]
+            _update(digest, (name, variable.dims))
+            digest.update(pd.util.hash_array(
+                np.ravel(variable.values)).tobytes())
+    else:
+        digest.update(repr(obj).encode())
+        digest.update(type(obj).__name__.encode())
+
+def _digest(inputs):
+    """ Returns a digest of the contents of a tuple of inputs.
+    """
+
+    digest = hashlib.sha1()
+    _update(digest, inputs)
+
+    return digest.hexdigest()
+
+def _cached(key, inputs, fit):
+    """ Returns the cached result of key, or computes it with fit(),
+    discarding the least recently used fit beyond MAX_FITS.
+    """
+
+    key = (key[0], _digest(inputs)) + key[1:]
+    if key in _FITS:
+        _FITS.move_to_end(key)
+    else:
+        _FITS[key] = fit()
+        while len(_FITS) > MAX_FITS:
+            _FITS.popitem(last=False)
+
+    return _FITS[key]
+
+def clear():
+    """ Empties the cache of fits.
+    """
+
+    _FITS.clear()
+
+def invf(co2, temp, uptake, variable):
+    """ Returns the FeedbackAnalysis.INVF object of the arguments, created
+    once.
+    """
+
+    return _cached(('INVF', variable), (co2, temp, uptake),
+                   lambda: FeedbackAnalysis.INVF(co2, temp, uptake, variable))
+
+def trendy(timeres, co2, temp, uptake, variable):
+    """ Returns the FeedbackAnalysis.TRENDY object of the arguments, created
+    once.
+    """
+
+    return _cached(('TRENDY', timeres, variable), (co2, temp, uptake),
+                   lambda: FeedbackAnalysis.TRENDY(timeres, co2, temp, uptake,
+                                                   variable))
+
+def gcp_windows(co2, temp, windows, GCP=None):
+    """ Returns a xr.Dataset of the regressions of the GCP land, ocean and
+    total (land + ocean) sinks on CO2 and temperature over each window,
+    fitted once as a single batch. The variables beta and gamma (not divided
+    by 2.12) and var_beta, var_gamma and cov_beta_gamma have dimensions
+    (sink, window).
+
+    Parameters
+    ==========
+
+    co2: pd.Series
+
+        yearly co2 indexed by year.
+
+    temp: xr.Dataset or xr.DataArray
+
+        yearly HadCRUT dataset, or its Earth variable.
+
+    windows: tuple
+
+        (start, end) years of each window. All windows must have the same
+        length.
+
+    GCP: pd.DataFrame, optional
+
+        GCP budget indexed by year.
+        Defaults to None, which reads data/GCP/budget.csv.
+
+    """
+
+    if GCP is None:
+        GCP = _cached(('budget',), (), lambda: GCP_flux.cached_csv(
+            GCP_flux.GCP_FNAME, 'Year'))
+
+    T_all = temp['Earth'] if isinstance(temp, xr.Dataset) else temp
+
+    def fit():
+        X, Y = [], []
+        for start, end in windows:
+            budget = GCP.loc[start:end]
+            C = co2.loc[start:end].values
+            T = T_all.sel(time=slice(str(start), str(end))).values
+
+            X.append(np.stack([C, T], axis=-1))
+            Y.append(np.stack([budget['land sink'].values,
+                               budget['ocean sink'].values,
+                               (budget['land sink'] +
+                                budget['ocean sink']).values]))
+
+        # (window, sink) regressions.
+        X = np.repeat(np.stack(X)[:, np.newaxis], len(GCP_SINKS), axis=1)
+        Y = np.stack(Y)
+        shape = Y.shape[:2]
+
+        result = regression.ols(
+            regression.add_constant(X.reshape((-1,) + X.shape[2:])),
+            Y.reshape((-1, Y.shape[-1]))
+        )
+        params = result.params[:, 1:].reshape(shape + (2,))
+        cov = result.cov_params[:, 1:, 1:].reshape(shape + (2, 2))
+
+        dims = ('window', 'sink')
+        return xr.Dataset(
+            {
+                'beta': (dims, params[..., 0]),
+                'gamma': (dims, params[..., 1]),
+                'var_beta': (dims, cov[..., 0, 0]),
+                'var_gamma': (dims, cov[..., 1, 1]),
+                'cov_beta_gamma': (dims, cov[..., 0, 1])
+            },
+            coords={
+                'window': [start for start, end in windows],
+                'sink': list(GCP_SINKS)
+            }
+        ).transpose('sink', 'window')
+
+    return _cached(('GCP', tuple(windows)), (co2, temp, GCP), fit)
+
+def time_varying(co2, temp, uptake, variables, predictors=('C', 'T'),
+                 state_ratio=None, constant=False, start=None, end=None):
+    """ Returns a xr.Dataset of the time-varying regressions of the uptake of
+    every model and variable on CO2 and/or temperature, smoothed once as a
+    single batch by statespace.smooth. The variables beta and gamma (not
+    divided by 2.12), var_beta, var_gamma and cov_beta_gamma have dimensions
+    (model, variable, time), for the predictors that are regressed on. The
+    variances of the yearly changes of the coefficients (state_var_beta,
+    state_var_gamma), the observation variance (obs_var) and the
+    log-likelihood (loglike) have dimensions (model, variable).
+
+    Parameters
+    ==========
+
+    co2: pd.Series
+
+        yearly co2 indexed by year.
+
+    temp: xr.Dataset or xr.DataArray
+
+        yearly HadCRUT dataset, or its Earth variable.
+
+    uptake: dict
+
+        {model: yearly uptake xr.Dataset}, e.g. of the inversions or of one
+        TRENDY simulation. Years without uptake are NaN, through which the
+        coefficients are interpolated. The coefficients are NaN outside the
+        first and last years of each model and variable with uptake, CO2
+        and temperature (e.g. Rayner before 1992 and after 2009, or TRENDY
+        before the CO2 record).
+
+    variables: list-like
+
+        variables of the uptake to regress, e.g. 'Earth_Land'.
+
+    predictors: tuple, optional
+
+        'C' (beta) and/or 'T' (gamma), e.g. ('C',) for TRENDY S1 and ('T',)
+        for S3 - S1.
+        Defaults to ('C', 'T').
+
+    state_ratio: float or np.ndarray, optional
+
+        state ratios of the constant and predictors (see statespace.smooth).
+        Defaults to None, which tunes them for each model and variable.
+
+    constant: bool, optional
+
+        If True, the intercept is not tuned but kept constant, so that it
+        cannot absorb the drift of beta along the CO2 trend.
+        Defaults to False.
+
+    start, end: int, optional
+
+        first and last years.
+        Default to None, which use the years of the uptake.
+
+    """
+
+    T_all = temp['Earth'] if isinstance(temp, xr.Dataset) else temp
+    variables, predictors = tuple(variables), tuple(predictors)
+
+    def yearly(values, time):
+        return pd.Series(values, index=time.dt.year.values)
+
+    def fit():
+        uptake_years = np.concatenate([ds.time.dt.year.values
+                                       for ds in uptake.values()])
+        years = np.arange(uptake_years.min() if start is None else start,
+                          (uptake_years.max() if end is None else end) + 1)
+
+        inputs = {
+            'C': co2.reindex(years).values,
+            'T': yearly(T_all.values, T_all.time).reindex(years).values
+        }
+        x = np.stack([inputs[predictor] for predictor in predictors],
+                     axis=-1)
+
+        models = list(uptake)
+        Y = np.stack([
+            yearly(uptake[model][var].values, uptake[model].time)
+            .reindex(years).values
+            for model in models for var in variables
+        ])
+        X = regression.add_constant(np.broadcast_to(x, Y.shape + x.shape[-1:]))
+
+        vary = [not constant] + [True] * len(predictors)
+        result = statespace.smooth(X, Y, state_ratio, vary=vary)
+
+        # The smoother extrapolates the coefficients outside the years of
+        # each series, which are masked. As in statespace.smooth, a year is
+        # observed if the uptake and every predictor are available.
+        observed = ~(np.isnan(Y) | np.isnan(X).any(axis=-1))
+        steps = np.arange(years.size)
+        first = observed.argmax(axis=-1)[:, np.newaxis]
+        last = (years.size - 1 -
+                observed[:, ::-1].argmax(axis=-1))[:, np.newaxis]
+        span = (steps >= first) & (steps <= last) & observed.any(axis=-1,
+                                                                 keepdims=True)
+
+        names = {'C': 'beta', 'T': 'gamma'}
+        shape = (len(models), len(variables))
+        dims, time_dims = ('model', 'variable'), ('model', 'variable', 'time')
+
+        def masked(values):
+            return np.where(span, values, np.nan).reshape(shape + years.shape)
+
+        data = {}
+        for i, predictor in enumerate(predictors, start=1):
+            name = names[predictor]
+            data[name] = (time_dims, masked(result.params[..., i]))
+            data['var_' + name] = (time_dims,
+                                   masked(result.cov_params[..., i, i]))
+            data['state_var_' + name] = (dims, result.state_var[
+                :, i].reshape(shape))
+        if len(predictors) == 2:
+            data['cov_beta_gamma'] = (time_dims, masked(result.cov_params[
+                ..., 1 + predictors.index('C'), 1 + predictors.index('T')]))
+        data['obs_var'] = (dims, result.obs_var.reshape(shape))
+        data['loglike'] = (dims, result.loglike.reshape(shape))
+
+        return xr.Dataset(data, coords={'model': models,
+                                        'variable': list(variables),
+                                        'time': years})
+
+    ratio_key = (None if state_ratio is None
+                 else tuple(np.ravel(state_ratio).tolist()))
+
+    return _cached(('kalman', variables, predictors, ratio_key, constant,
+                    start, end),
+                   (co2, temp, uptake), fit)
+
+def _steps(index, freq):
+    """ Returns the time steps (years, or months since year 0) of a time
+    coordinate or of a co2 index (by year, or by year and month).
+    """
+
+    if isinstance(index, pd.MultiIndex):
+        years, months = (index.get_level_values(i) for i in (0, 1))
+    elif isinstance(index, pd.Index):
+        years, months = index, None
+    else:
+        years, months = index.dt.year.values, index.dt.month.values
+
+    years = np.asarray(years)
+    return years if freq == 'year' else years * 12 + np.asarray(months) - 1
+
+def lag_scan(co2, temp, uptake, variables, max_lag, co2_growth=False,
+             freq='year', start=None, end=None):
+    """ Returns a xr.Dataset of the regressions of the uptake of every model
+    and variable on CO2 and on temperature lagged by 0 to max_lag time steps
+    (and, if co2_growth, on the CO2 growth lagged by 0 to max_lag), with
+    every combination of lags fitted once as a single batch by
+    regression.lag_scan. The variables beta (not divided by 2.12), gamma,
+    their standard errors (bse_beta, bse_gamma), the p-values of gamma
+    (pvalues_gamma), the skill (rsquared) and nobs have dimensions (model,
+    variable, lag_T) and, with co2_growth, lag_dC, with delta, bse_delta and
+    pvalues_delta of the CO2 growth. The skills of all lags are computed over
+    the same time points, so that the best lags are e.g.
+    ds.rsquared.argmax(['lag_T', 'lag_dC']).
+
+    Parameters
+    ==========
+
+    co2: pd.Series
+
+        co2 indexed by year, or by year and month if freq is 'month'.
+
+    temp: xr.Dataset or xr.DataArray
+
+        HadCRUT dataset of freq, or its Earth variable.
+
+    uptake: dict
+
+        {model: uptake xr.Dataset of freq}. Time steps without uptake are
+        dropped from the regressions of the model only.
+
+    variables: list-like
+
+        variables of the uptake to regress, e.g. 'Earth_Land'.
+
+    max_lag: int
+
+        largest lag in time steps of freq.
+
+    co2_growth: bool, optional
+
+        If True, also regress on the lagged growth of CO2 per time step.
+        Defaults to False.
+
+    freq: string, optional
+
+        'year' or 'month'.
+        Defaults to 'year'.
+
+    start, end: int, optional
+
+        first and last years of the uptake to regress. Earlier inputs are
+        still used for the lags.
+        Default to None, which use the years of the uptake.
+
+    """
+
+    if freq not in ('year', 'month'):
+        raise ValueError(f"freq must be 'year' or 'month', not '{freq}'.")
+
+    T_all = temp['Earth'] if isinstance(temp, xr.Dataset) else temp
+    variables = tuple(variables)
+
+    def fit():
+        steps = np.concatenate([_steps(ds.time, freq)
+                                for ds in uptake.values()])
+        per_year = 1 if freq == 'year' else 12
+        first = steps.min() if start is None else start * per_year
+        last = steps.max() if end is None else (end + 1) * per_year - 1
+
+        # max_lag more steps before the first step, for the lags.
+        axis = np.arange(first - max_lag, last + 1)
+
+        C = pd.Series(co2.values, index=_steps(co2.index, freq))
+        T = pd.Series(T_all.values, index=_steps(T_all.time, freq))
+        lagged = [T.reindex(axis).values]
+        if co2_growth:
+            # The growth of the first step needs the co2 of the step before.
+            lagged.append(C.diff().reindex(axis).values)
+        C = C.reindex(axis)
+
+        models = list(uptake)
+        Y = np.stack([
+            pd.Series(uptake[model][var].values,
+                      index=_steps(uptake[model].time, freq))
+            .reindex(axis).values
+            for model in models for var in variables
+        ])
+        batch = (Y.shape[0],)
+
+        result = regression.lag_scan(
+            Y,
+            np.broadcast_to(C.values[:, np.newaxis], batch + (axis.size, 1)),
+            np.broadcast_to(np.stack(lagged, axis=-1),
+                            batch + (axis.size, len(lagged))),
+            max_lag
+        )
+
+        lag_dims = ('lag_T', 'lag_dC')[:len(lagged)]
+        shape = (len(models), len(variables)) + (max_lag + 1,) * len(lagged)
+        dims = ('model', 'variable') + lag_dims
+
+        def unstack(values):
+            return (dims, values.reshape(shape))
+
+        data = {'beta': unstack(result.params[..., 1]),
+                'bse_beta': unstack(result.bse[..., 1])}
+        for i, name in enumerate(('gamma', 'delta')[:len(lagged)], start=2):
+            data[name] = unstack(result.params[..., i])
+            data['bse_' + name] = unstack(result.bse[..., i])
+            data['pvalues_' + name] = unstack(result.pvalues[..., i])
+        data['rsquared'] = unstack(result.rsquared)
+        data['nobs'] = unstack(result.nobs)
+
+        coords = {'model': models, 'variable': list(variables)}
+        coords.update({dim: np.arange(max_lag + 1) for dim in lag_dims})
+
+        return xr.Dataset(data, coords=coords)
+
+    return _cached(('lag_scan', variables, max_lag, co2_growth, freq, start,
+                    end), (co2, temp, uptake), fit)
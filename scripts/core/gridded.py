@@ -0,0 +1,456 @@
+""" Analysis of gridded (time, latitude, longitude) fluxes, cell by cell.
+
+Where FeedbackAnalysis and Analysis work on the regionally integrated uptake
+of latitudinal_splits, the classes here analyse the flux of every grid cell of
+a SpatialAgg cube, producing maps of feedback parameters (SpatialFeedback),
+cascading window trends (SpatialTrend) and band power (SpatialSpectrum). All
+cells of a chunk of latitude rows are processed at once, so memory is bounded
+by chunk_size and lazily opened cubes (see core.storage.open_cube) are only
+read one chunk at a time.
+"""
+
+
+""" IMPORTS """
+import numpy as np
+import xarray as xr
+
+from core import regression
+from core import storage
+from core import spectral
+
+
+""" INPUTS """
+# Feedback parameter names of the regression predictors.
+PARAMETERS = {'C': 'beta', 'T': 'gamma'}
+
+
+""" FUNCTIONS """
+def _row_chunks(da, chunk_size):
+    """ Returns slices of the latitude rows of da with about chunk_size cells
+    each.
+    """
+
+    nlat = da.latitude.size
+    rows = max(1, chunk_size // da.longitude.size)
+
+    return [slice(i, min(i + rows, nlat)) for i in range(0, nlat, rows)]
+
+
+""" CLASSES """
+class SpatialFeedback:
+    """ This class regresses the gridded flux of each grid cell against CO2
+    and the temperature of the cell, for each time period, to produce maps of
+    the feedback parameters.
+
+    Parameters
+    ==========
+
+    co2: pd.Series
+
+        co2 series. Must follow time resolution from 'uptake' and be indexed
+        by year as in FeedbackAnalysis.
+
+    temp: xr.DataArray
+
+        gridded temperature (e.g. HadCRUT) with dimensions (time, latitude,
+        longitude). Must follow time resolution from 'uptake'. If its grid
+        differs from that of uptake, the nearest cell is used.
+
+    uptake: xr.DataArray
+
+        gridded flux with dimensions (time, latitude, longitude), e.g. a
+        variable of SpatialAgg.data resampled to the time resolution of co2.
+
+    time_periods: tuple, optional
+
+        (start, end) years of each regression window.
+        Defaults to the decadal windows of FeedbackAnalysis.TRENDY.
+
+    predictors: tuple, optional
+
+        predictors of the regression: 'C' (CO2) and/or 'T' (temperature).
+        Use ('C',) for TRENDY S1 uptake and ('T',) for S3 - S1 uptake.
+        Defaults to ('C', 'T').
+
+    chunk_size: int, optional
+
+        approximate number of grid cells fitted at once. Chunks are whole
+        latitude rows.
+        Defaults to 16200 (a quarter of a 1-degree grid).
+
+    """
+
+    def __init__(self, co2, temp, uptake, time_periods=None,
+                 predictors=('C', 'T'), chunk_size=16200):
+        """ Initialise an instance of a SpatialFeedback. """
+
+        if not set(predictors) <= set(PARAMETERS):
+            raise ValueError(f"predictors must be in {tuple(PARAMETERS)}.")
+
+        self.co2 = co2
+        self.uptake = uptake.transpose('time', 'latitude', 'longitude')
+
+        temp = temp.transpose('time', 'latitude', 'longitude')
+        if not (np.array_equal(temp.latitude, self.uptake.latitude) and
+                np.array_equal(temp.longitude, self.uptake.longitude)):
+            temp = temp.sel(latitude=self.uptake.latitude.values,
+                            longitude=self.uptake.longitude.values,
+                            method='nearest')
+            temp = temp.assign_coords(latitude=self.uptake.latitude.values,
+                                      longitude=self.uptake.longitude.values)
+        self.temp = temp
+
+        if time_periods is None:
+            time_periods = ((1960, 1969), (1970, 1979), (1980, 1989),
+                            (1990, 1999), (2000, 2009), (2008, 2017))
+        self.time_periods = tuple(time_periods)
+
+        self.predictors = tuple(predictors)
+        self.chunk_size = chunk_size
+
+    def _window(self, start, end):
+        """ Returns the CO2 values and the gridded temperature and uptake of a
+        time period.
+        """
+
+        time_slice = slice(str(start), str(end))
+        C = np.asarray(self.co2.loc[start:end], dtype=float)
+        T = self.temp.sel(time=time_slice)
+        U = self.uptake.sel(time=time_slice)
+
+        if not C.size == T.time.size == U.time.size:
+            raise ValueError(f"co2, temp and uptake have different numbers "
+                             f"of time points in {start}-{end}.")
+
+        return C, T, U
+
+    def _fit_chunk(self, C, T, U):
+        """ Returns the batched OLS fit of every cell of a chunk.
+        """
+
+        ntime = U.shape[0]
+        Y = U.reshape(ntime, -1).T
+
+        columns = {'C': np.broadcast_to(C, Y.shape),
+                   'T': T.reshape(ntime, -1).T}
+        X = np.stack([columns[p] for p in self.predictors], axis=-1)
+
+        return regression.ols(regression.add_constant(X), Y)
+
+    def regression_maps(self):
+        """ Returns a xr.Dataset with dimensions (period, latitude, longitude)
+        of the regression coefficient, t-value and p-value of each predictor
+        (named by its feedback parameter, e.g. 'beta', 't_beta', 'p_beta'),
+        the r-squared and the number of observations of each cell. The
+        period coordinate is the start year of each time period.
+        """
+
+        nlat = self.uptake.latitude.size
+        nlon = self.uptake.longitude.size
+        shape = (len(self.time_periods), nlat, nlon)
+
+        names = [PARAMETERS[p] for p in self.predictors]
+        maps = {}
+        for name in names:
+            for prefix in ('', 't_', 'p_'):
+                maps[prefix + name] = np.full(shape, np.nan)
+        maps['r_squared'] = np.full(shape, np.nan)
+        maps['nobs'] = np.zeros(shape, dtype=int)
+
+        for i, (start, end) in enumerate(self.time_periods):
+            C, T, U = self._window(start, end)
+
+            for rows in _row_chunks(self.uptake, self.chunk_size):
+                fit = self._fit_chunk(C, T.isel(latitude=rows).values,
+                                      U.isel(latitude=rows).values)
+                chunk_shape = (rows.stop - rows.start, nlon)
+
+                for j, name in enumerate(names):
+                    # Column 0 is the constant.
+                    maps[name][i, rows] = fit.params[:, j+1].reshape(chunk_shape)
+                    maps['t_' + name][i, rows] = fit.tvalues[:, j+1].reshape(chunk_shape)
+                    maps['p_' + name][i, rows] = fit.pvalues[:, j+1].reshape(chunk_shape)
+                maps['r_squared'][i, rows] = fit.rsquared.reshape(chunk_shape)
+                maps['nobs'][i, rows] = fit.nobs.reshape(chunk_shape)
+
+        return xr.Dataset(
+            {key: (('period', 'latitude', 'longitude'), value)
+             for key, value in maps.items()},
+            coords={
+                'period': [start for start, end in self.time_periods],
+                'latitude': self.uptake.latitude.values,
+                'longitude': self.uptake.longitude.values
+            }
+        )
+
+    def params(self):
+        """ Returns the maps of regression_maps with beta divided by 2.12 and
+        the temperature feedback u_gamma, as in FeedbackAnalysis.TRENDY.params.
+        """
+
+        phi, rho = 0.015 / 2.12, 1.93
+
+        ds = self.regression_maps()
+
+        if 'beta' in ds:
+            ds['beta'] = ds['beta'] / 2.12
+        if 'gamma' in ds:
+            ds['u_gamma'] = ds['gamma'] * phi / rho
+
+        return ds
+
+
+class SpatialTrend:
+    """ This class computes the cascading window trend of
+    inv_flux.Analysis.cascading_window_trend for every grid cell of a yearly
+    gridded flux in one vectorised sweep. Windowed regression sums are taken
+    as differences of prefix (cumulative) sums along time, which are streamed
+    over time chunks and latitude stripes so that only one chunk of the cube
+    is in memory at a time.
+
+    Parameters
+    ==========
+
+    uptake: xr.DataArray
+
+        yearly gridded flux with dimensions (time, latitude, longitude).
+
+    co2: pd.Series, optional
+
+        yearly co2 series indexed by year (e.g. data/CO2/co2_year.csv). If
+        passed, slopes are against CO2 (converted to PgC by 2.12 as in
+        Analysis.cascading_window_trend); otherwise slopes are against time
+        in years.
+        Defaults to None.
+
+    chunk_size: int, optional
+
+        approximate number of grid cells per latitude stripe.
+        Defaults to 16200 (a quarter of a 1-degree grid).
+
+    time_chunk: int, optional
+
+        number of time points read at once. If None, the whole time series of
+        a stripe is read at once.
+        Defaults to None.
+
+    """
+
+    def __init__(self, uptake, co2=None, chunk_size=16200, time_chunk=None):
+        """ Initialise an instance of a SpatialTrend. """
+
+        self.uptake = uptake.transpose('time', 'latitude', 'longitude')
+        self.years = self.uptake.time.dt.year.values
+
+        if co2 is None:
+            x = self.years.astype(float)
+        else:
+            x = co2.loc[self.years].values * 2.12
+
+        # Slopes do not depend on the mean of x; removing it keeps the prefix
+        # sums small.
+        self.x = x - x.mean()
+
+        self.chunk_size = chunk_size
+        self.time_chunk = time_chunk or self.years.size
+
+    def _stripe_trend(self, rows, window_size):
+        """ Returns the (window, cell) slopes of a latitude stripe.
+        """
+
+        ntime = self.years.size
+        nwindows = ntime - window_size
+
+        # Prefix sums of n, x, y, xx and xy, with a leading zero row. Only
+        # the last window_size rows are kept between time chunks.
+        carry = None
+        slopes = []
+        for t0 in range(0, ntime, self.time_chunk):
+            t1 = min(t0 + self.time_chunk, ntime)
+            y = self.uptake.isel(time=slice(t0, t1), latitude=rows).values
+            y = y.reshape(t1 - t0, -1)
+
+            valid = ~np.isnan(y)
+            x = np.where(valid, self.x[t0:t1, np.newaxis], 0.)
+            y = np.where(valid, y, 0.)
+            terms = np.stack([valid.astype(float), x, y, x * x, x * y])
+
+            if carry is None:
+                carry = np.zeros((5, 1, y.shape[1]))
+            prefix = np.concatenate(
+                [carry, carry[:, -1:] + terms.cumsum(axis=1)], axis=1
+            )
+
+            # Windows starting at i use prefix rows i and i + window_size,
+            # where row 0 of prefix is time point t0 - (len(carry) - 1).
+            offset = t0 - (carry.shape[1] - 1)
+            first = max(0, t0 + 1 - window_size)
+            last = min(nwindows, t1 + 1 - window_size)
+            if last > first:
+                start = prefix[:, first - offset:last - offset]
+                end = prefix[:, first - offset + window_size:
+                             last - offset + window_size]
+                n, sx, sy, sxx, sxy = end - start
+
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    slopes.append((n * sxy - sx * sy) / (n * sxx - sx * sx))
+
+            carry = prefix[:, -window_size:]
+
+        return np.concatenate(slopes, axis=0)
+
+    def cascading_window_trend(self, window_size=10, destination=None):
+        """ Returns a xr.Dataset of the slope of the trend of each grid cell
+        for each time window, with dimensions (start_year, latitude,
+        longitude). Windows follow Analysis.cascading_window_trend.
+
+        Parameters
+        ==========
+
+        window_size: integer, optional
+
+            size of time window of trends (in years).
+            Defaults to 10.
+
+        destination: string, optional
+
+            if passed, the slopes are also written to this .nc file or .zarr
+            store.
+            Defaults to None.
+
+        """
+
+        nlat = self.uptake.latitude.size
+        nlon = self.uptake.longitude.size
+        nwindows = self.years.size - window_size
+
+        if nwindows < 1:
+            raise ValueError("window_size must be less than the number of "
+                             "time points.")
+
+        cwt = np.full((nwindows, nlat, nlon), np.nan)
+        for rows in _row_chunks(self.uptake, self.chunk_size):
+            slopes = self._stripe_trend(rows, window_size)
+            cwt[:, rows] = slopes.reshape(nwindows, -1, nlon)
+
+        ds = xr.Dataset(
+            {'CWT': (('start_year', 'latitude', 'longitude'), cwt)},
+            coords={
+                'start_year': self.years[:nwindows],
+                'latitude': self.uptake.latitude.values,
+                'longitude': self.uptake.longitude.values
+            },
+            attrs={'window_size': window_size}
+        )
+
+        if destination is not None:
+            storage.write_cube(ds, destination)
+
+        return ds
+
+
+class SpatialSpectrum:
+    """ This class computes the power spectrum of the flux of every grid cell
+    of a monthly gridded flux (the spatial counterpart of Analysis.psd) and
+    integrates it over bands of periods to produce band power maps. Spectra
+    are computed for chunks of latitude rows at once, so memory is bounded by
+    chunk_size times the length of the time series.
+
+    Parameters
+    ==========
+
+    uptake: xr.DataArray
+
+        gridded flux with dimensions (time, latitude, longitude).
+
+    fs: integer, optional
+
+        sampling frequency. With the default of 12 for monthly data, periods
+        are in years.
+        Defaults to 12.
+
+    method: string, optional
+
+        one of spectral.METHODS.
+        Defaults to 'welch'.
+
+    nperseg: integer, optional
+
+        segment length of the welch and bartlett methods.
+        Defaults to None.
+
+    chunk_size: int, optional
+
+        approximate number of grid cells per chunk.
+        Defaults to 3600 (ten rows of a 1-degree grid).
+
+    """
+
+    def __init__(self, uptake, fs=12, method='welch', nperseg=None,
+                 chunk_size=3600):
+        """ Initialise an instance of a SpatialSpectrum. """
+
+        if method not in spectral.METHODS:
+            raise ValueError(f"method must be one of {spectral.METHODS}.")
+
+        self.uptake = uptake.transpose('time', 'latitude', 'longitude')
+        self.fs = fs
+        self.method = method
+        self.nperseg = nperseg
+        self.chunk_size = chunk_size
+
+    def band_power(self, bands=None, destination=None):
+        """ Returns a xr.Dataset of maps of the power in each band of periods,
+        with one variable per band and dimensions (latitude, longitude).
+        Cells with missing values are NaN.
+
+        Parameters
+        ==========
+
+        bands: dict, optional
+
+            {band name: (minimum period, maximum period)} in the time unit of
+            fs.
+            Defaults to spectral.BANDS (seasonal, ENSO and decadal).
+
+        destination: string, optional
+
+            if passed, the maps are also written to this .nc file or .zarr
+            store.
+            Defaults to None.
+
+        """
+
+        if bands is None:
+            bands = spectral.BANDS
+
+        nlat = self.uptake.latitude.size
+        nlon = self.uptake.longitude.size
+
+        maps = {band: np.full((nlat, nlon), np.nan) for band in bands}
+        for rows in _row_chunks(self.uptake, self.chunk_size):
+            values = self.uptake.isel(latitude=rows).values
+            values = np.moveaxis(values, 0, -1)
+
+            freqs, spec = spectral.spectrum(values, self.fs, self.method,
+                                            self.nperseg)
+            power = spectral.band_power(freqs, spec, bands)
+
+            for band in bands:
+                maps[band][rows] = power[band]
+
+        ds = xr.Dataset(
+            {band: (('latitude', 'longitude'), value)
+             for band, value in maps.items()},
+            coords={
+                'latitude': self.uptake.latitude.values,
+                'longitude': self.uptake.longitude.values
+            },
+            attrs={f"{band}_periods": list(periods)
+                   for band, periods in bands.items()}
+        )
+
+        if destination is not None:
+            storage.write_cube(ds, destination)
+
+        return ds
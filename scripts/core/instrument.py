@@ -0,0 +1,341 @@
+""" Stage-level timing and memory instrumentation of the pipelines.
+
+The stages of the spatial and feedback pipelines (SpatialAgg construction,
+regridding, regional cuts, temporal resampling, netCDF writes and OLS fits)
+are wrapped with the timed decorator or the stage context manager. While
+tracing is disabled (the default) they reduce to a single check of a module
+global, so the pipelines run as before. Once enabled, with enable() or by
+setting the PIPELINE_TRACE environment variable to a file name before
+core.instrument is first imported, every stage appends one JSON line to the
+trace file with:
+
+    name: stage name, e.g. 'regional_cut'.
+    function: qualified name of the decorated function (or None).
+    start: start time (s since the epoch).
+    wall, cpu: wall and CPU (user + system) time of the stage (s).
+    peak_rss: peak resident set size of the process at the end of the stage
+        (bytes), and rss_growth: increase of the peak during the stage.
+    read_bytes, write_bytes: bytes read and written by the process during
+        the stage (Linux only, else None).
+    pid, tid, depth, parent: to rebuild the nesting of the stages.
+
+plus the keyword arguments passed to stage. Processes inherit the
+environment variable, so the workers of a batch append to the same file.
+
+The trace is summarised per stage with summary, or converted to the Chrome
+trace event format (chrome://tracing, https://ui.perfetto.dev) with
+chrome_trace:
+
+    python -m core.instrument trace.jsonl [chrome_trace.json]
+
+Note that xarray operations on lazily opened cubes are computed where their
+values are first needed, which is the stage that the time is recorded in.
+"""
+
+
+""" IMPORTS """
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
+import pandas as pd
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+
+""" INPUTS """
+TRACE_ENV = "PIPELINE_TRACE"
+
+# Active Tracer, or None if tracing is disabled.
+_TRACER = None
+_NULL = contextlib.nullcontext()
+
+
+""" CLASSES """
+class Tracer:
+    """ This class records the stages of a run and appends them to a JSON
+    lines trace file.
+
+    Parameters
+    ==========
+
+    fname: string, optional
+
+        trace file. Records are appended, so that several processes can share
+        one file, and are not kept in memory. If None, records are only kept
+        in memory (in records).
+        Defaults to None.
+
+    """
+
+    def __init__(self, fname=None):
+        """ Initialise an instance of a Tracer. """
+
+        self.fname = fname
+        self.records = []
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def stage(self, name, function=None, **attrs):
+        """ Context manager that records the stage name.
+        """
+
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        stack.append(name)
+
+        start = time.time()
+        before = _usage()
+        try:
+            yield
+        finally:
+            after = _usage()
+            stack.pop()
+
+            record = {
+                'name': name,
+                'function': function,
+                'start': start,
+                'wall': after['wall'] - before['wall'],
+                'cpu': after['cpu'] - before['cpu'],
+                'peak_rss': after['peak_rss'],
+                'rss_growth': _diff(after['peak_rss'], before['peak_rss']),
+                'read_bytes': _diff(after['read_bytes'], before['read_bytes']),
+                'write_bytes': _diff(after['write_bytes'],
+                                     before['write_bytes']),
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'depth': len(stack),
+                'parent': parent
+            }
+            record.update(attrs)
+            self.write(record)
+
+    def write(self, record):
+        """ Append record to the trace file, or keep it if there is none.
+        """
+
+        if self.fname is None:
+            self.records.append(record)
+            return
+
+        # One write per record in append mode, so that lines from
+        # concurrent processes are not interleaved.
+        with open(self.fname, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+
+""" FUNCTIONS """
+def _diff(after, before):
+    if after is None or before is None:
+        return None
+    return after - before
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+def _peak_rss():
+    """ Returns the peak resident set size of the process in bytes.
+    """
+
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS.
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def _io_bytes():
+    """ Returns the bytes read and written by the process so far, including
+    reads served from the page cache.
+    """
+
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+    except (OSError, ValueError):
+        return None, None
+
+    return int(counters['rchar']), int(counters['wchar'])
+
+def _usage():
+    read_bytes, write_bytes = _io_bytes()
+
+    return {
+        'wall': time.perf_counter(),
+        'cpu': time.process_time(),
+        'peak_rss': _peak_rss(),
+        'read_bytes': read_bytes,
+        'write_bytes': write_bytes
+    }
+
+def enable(fname=None):
+    """ Start tracing the stages to the JSON lines file fname (or only in
+    memory if None) and returns the Tracer.
+    """
+
+    global _TRACER
+    _TRACER = Tracer(fname)
+
+    return _TRACER
+
+def disable():
+    """ Stop tracing and returns the records kept in memory by the Tracer,
+    if any (see core.instrument.read_trace for a trace file).
+    """
+
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+
+    return tracer.records if tracer is not None else []
+
+def enabled():
+    return _TRACER is not None
+
+def trace_file():
+    """ Returns the trace file of the active Tracer, or None.
+    """
+
+    return _TRACER.fname if _TRACER is not None else None
+
+def stage(name, **attrs):
+    """ Context manager that records the block it wraps as the stage name,
+    with the extra fields attrs, if tracing is enabled:
+
+        with instrument.stage('write_netcdf', destination=destination):
+            ds.to_netcdf(destination)
+
+    """
+
+    if _TRACER is None:
+        return _NULL
+
+    return _TRACER.stage(name, **attrs)
+
+def timed(name):
+    """ Decorator that records every call of a function as the stage name if
+    tracing is enabled.
+    """
+
+    def decorator(func):
+        function = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _TRACER is None:
+                return func(*args, **kwargs)
+
+            with _TRACER.stage(name, function=function):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def read_trace(fname):
+    """ Returns a pd.DataFrame of the records of a trace file.
+    """
+
+    with open(fname) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    return pd.DataFrame.from_records(records)
+
+def summary(records, by='name'):
+    """ Returns a pd.DataFrame with the number of calls, total and mean wall
+    and CPU time, maximum peak RSS and total bytes read and written of each
+    stage, sorted by total wall time.
+
+    Time and bytes of nested stages are also counted in the stages that
+    contain them.
+
+    Parameters
+    ==========
+
+    records: list, pd.DataFrame or string
+
+        records of a Tracer, from read_trace, or a trace file.
+
+    by: string or list, optional
+
+        record field(s) to group by, e.g. 'function' or ['name', 'pid'].
+        Defaults to 'name'.
+
+    """
+
+    if isinstance(records, str):
+        df = read_trace(records)
+    else:
+        df = pd.DataFrame(records)
+
+    return (df
+            .groupby(by)
+            .agg(calls=('wall', 'size'),
+                 wall=('wall', 'sum'),
+                 wall_mean=('wall', 'mean'),
+                 cpu=('cpu', 'sum'),
+                 cpu_mean=('cpu', 'mean'),
+                 peak_rss=('peak_rss', 'max'),
+                 read_bytes=('read_bytes', 'sum'),
+                 write_bytes=('write_bytes', 'sum'))
+            .sort_values('wall', ascending=False)
+           )
+
+def chrome_trace(records, fname):
+    """ Write the records (see summary) as complete events of the Chrome
+    trace event format to fname and returns fname.
+    """
+
+    if isinstance(records, str):
+        df = read_trace(records)
+    else:
+        df = pd.DataFrame(records)
+
+    fields = ('name', 'start', 'wall', 'pid', 'tid')
+    events = []
+    for record in df.to_dict('records'):
+        events.append({
+            'name': record['name'],
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': record['start'] * 1e6,
+            'dur': record['wall'] * 1e6,
+            'pid': record['pid'],
+            'tid': record['tid'],
+            'args': {key: value for key, value in record.items()
+                     if key not in fields and not _missing(value)}
+        })
+
+    with open(fname, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f,
+                  default=str)
+
+    return fname
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
+
+
+""" EXECUTION """
+if __name__ == "__main__":
+    # Summarise a trace: python -m core.instrument trace.jsonl [chrome.json]
+    records = read_trace(sys.argv[1])
+
+    with pd.option_context('display.width', 200,
+                           'display.max_columns', None):
+        print(summary(records))
+
+    if len(sys.argv) > 2:
+        print(chrome_trace(records, sys.argv[2]))
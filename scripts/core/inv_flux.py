@@ -4,17 +4,21 @@
 """ IMPORTS"""
 import numpy as np
 import xarray as xr
-import sys
 import os
 import pandas as pd
-import pickle
-import matplotlib.pyplot as plt
 from datetime import datetime
-from scipy import stats, signal
 from core import GCP_flux as GCPf
-from itertools import *
+from core import storage
+from core import temporal
+from core import instrument
+from core import kernels
+from core.regions import latitudinal_masks
+from core import units
 from collections import namedtuple
 
+# matplotlib (through core.plotting) and the scipy submodules are imported
+# on first use so that batch runs only pay for the aggregation dependencies.
+
 
 """ INPUTS """
 CURRENT_PATH = os.path.dirname(__file__)
@@ -35,25 +39,37 @@ class SpatialAgg:
 
     data: one of xarray.Dataset, xarray.DataArray and nc.file.
 
+    chunks: dict, optional
+
+        dask chunks of the data (e.g. {'time': 120}). The spatial integrations
+        then return lazy datasets, which can be computed together on a
+        cluster (see core.cluster).
+        Defaults to None, which uses numpy arrays.
+
+    month_length: string, optional
+
+        'fixed' to convert the integrated fluxes with 30-day months, or
+        'calendar' for the exact length of each time step in the calendar of
+        the data (see core.units).
+        Defaults to None, which uses core.units.MONTH_LENGTH ('fixed' unless
+        set by the PIPELINE_MONTH_LENGTH environment variable).
+
     """
 
-    def __init__(self, data):
+    @instrument.timed('spatial_agg')
+    def __init__(self, data, chunks=None, month_length=None):
         """ Initialise an instance of an SpatialAgg. """
         if isinstance(data, xr.Dataset):
-            _data = data
-
-        elif type(data) == str and data.endswith('.pickle'):
-            read_file = open(data, 'rb')
-            _data = pickle.load(read_file)
-            if not (isinstance(_data, xr.Dataset)):
-                raise TypeError("Pickle object must be of\
-                 type xr.Dataset or xr.DataArray.")
+            _data = data if chunks is None else data.chunk(chunks)
 
         else:
-            _data = xr.open_dataset(data)
+            # Zarr stores and netCDF files are opened lazily; pickles are
+            # still read but should be converted with storage.convert_pickle.
+            _data = storage.open_cube(data, chunks)
 
         self.data = _data
         self.earth_radius = 6.371e6 # Radius of Earth
+        self.month_length = month_length
 
 
     """The following three functions obtain the area of specific grid boxes of
@@ -155,7 +171,8 @@ class SpatialAgg:
 
         arg_time_range = (
         pd
-            .date_range(start=start_time, end=end_time, freq='M')
+            .date_range(start=start_time, end=end_time,
+                        freq=pd.offsets.MonthEnd())
             .strftime('%Y-%m')
         )
 
@@ -164,6 +181,7 @@ class SpatialAgg:
         else:
             return arg_time_range
 
+    @instrument.timed('regional_cut')
     def regional_cut(self, lats, lons, start_time=None, end_time=None):
         """ Cuts the dataset into selected latitude and longitude values.
 
@@ -203,9 +221,11 @@ class SpatialAgg:
 
         df = df.sel(latitude=slice(*lats), longitude=slice(*lons),
                     time=slice_time_range)
-        df = df * (self.earth_area_grid(df.latitude, df.longitude) * 1e-15)
-        df = df.sum(axis=(1,2))
-        df = df * (np.ones(len(df.time)) * 30/365)
+        # PgC/yr to PgC per month, applied to the sums.
+        df = kernels.area_sum(df, self.earth_area_grid(df.latitude,
+                                                       df.longitude) * 1e-15,
+                              scale=units.year_fractions(df.time, 'M',
+                                                         self.month_length))
 
         df['time'] = arg_time_range
 
@@ -228,8 +248,8 @@ class SpatialAgg:
 
         The regions are split into land and ocean and are latitudinally split
         according to passed argument for lat_split.
-        This function uses the regional_cut function to cut the gridded carbon
-        sinks to the latitudes required for the latitudinal splits.
+        The bands are regions.latitudinal_masks, integrated together by
+        regional_masks.
 
         Globally integrated fluxes are also included for each of land and
         ocean.
@@ -263,45 +283,82 @@ class SpatialAgg:
 
         """
 
-        df = self.data
+        # The bands are integrated together in one pass over the data.
+        masks = latitudinal_masks(self.data.latitude.values,
+                                  self.data.longitude.values, lat_split)
+        ds = self.regional_masks(masks, start_time, end_time)
 
-        vars = {
-                "Earth": (-90, 90),
-                "South": (-90, -lat_split),
-                "Tropical": (-lat_split, lat_split),
-                "North": (lat_split, 90)
-                }
+        self.lat_split_ds = ds
 
-        values = {}
-        for var in vars:
-            region_df = self.regional_cut(vars[var], (-180,180),
-                                    start_time=start_time, end_time=end_time)
+        return ds
 
-            land_var = var + "_Land"
-            land_region_vals = region_df["Terrestrial_flux"].values
-            values[land_var] = land_region_vals
+    @instrument.timed('regional_masks')
+    def regional_masks(self, regions, start_time=None, end_time=None):
+        """ Returns a xr.Dataset of the total land and ocean carbon sink of
+        every region of a RegionMask at each time point within a range of time
+        points, with variables named '<region>_Land' and '<region>_Ocean'.
 
-            ocean_var = var + "_Ocean"
-            # Rayner has ocean variable as 'ocean' instead of 'Ocean_flux'.
-            try:
-                ocean_region_vals = region_df['Ocean_flux'].values
-            except KeyError:
-                ocean_region_vals = region_df['ocean'].values
-            values[ocean_var] = ocean_region_vals
+        Unlike regional_cut, the regions can have any shape and all regions
+        are integrated in a single pass over the data.
+
+        Parameters
+        ==========
+
+        regions: core.regions.RegionMask
+
+            regions to integrate over, e.g. from regions.latitudinal_masks,
+            regions.land_ocean_masks or regions.open_region_file. Masks on a
+            different grid are regridded by nearest neighbour.
+
+        start_time: string, optional
+
+            The month and year of the time to start the integration in the
+            format '%Y-%M'.
+            Default is None.
+
+        end_time: string, optional
+
+            The month and year of the time to end the integration in the
+            format '%Y-%M'. Note that the integration will stop the month
+            before argument.
+            Default is None.
+
+        """
+
+        df = self.data
 
         slice_time_range = self.time_range(start_time, end_time, slice_obj=True)
-        ds_time = df.sel(time=slice_time_range).time.values
-        ds_time = [datetime.strptime(time.strftime('%Y-%m'), '%Y-%m')
-                     for time in ds_time]
+        df = df.sel(time=slice_time_range)
+
+        area = self.earth_area_grid(df.latitude.values,
+                                    df.longitude.values) * 1e-15
+
+        scale = units.year_fractions(df.time, 'M', self.month_length)
+
+        # Rayner has ocean variable as 'ocean' instead of 'Ocean_flux'.
+        ocean_var = 'Ocean_flux' if 'Ocean_flux' in df else 'ocean'
 
-        ds = xr.Dataset(
+        values = {}
+        for var, sink in (('Terrestrial_flux', 'Land'), (ocean_var, 'Ocean')):
+            totals = regions.integrate(df[var], area, scale=scale)
+            for region in regions.names:
+                # .data keeps dask arrays lazy.
+                values[f"{region}_{sink}"] = totals.sel(region=region).data
+
+        return xr.Dataset(
             {key: (('time'), value) for (key, value) in values.items()},
-            coords={'time': (('time'), ds_time)}
+            coords={'time': (('time'), self._output_time(start_time, end_time))}
         )
 
-        self.lat_split_ds = ds
+    def _output_time(self, start_time, end_time):
+        """ Returns the time points of the integrated outputs as datetimes.
+        """
 
-        return ds
+        slice_time_range = self.time_range(start_time, end_time, slice_obj=True)
+        ds_time = self.data.sel(time=slice_time_range).time.values
+
+        return [datetime.strptime(time.strftime('%Y-%m'), '%Y-%m')
+                for time in ds_time]
 
     def seasonal_uptake(self):
         """If data is monthly resolved, split the dataset into negative values
@@ -328,30 +385,12 @@ class SpatialAgg:
 
         ds = self.lat_split_ds
 
-        index = pd.to_datetime(ds.time.values).year.unique()
         variables = [
             'Earth_Land', 'South_Land', 'Tropical_Land', 'North_Land',
             'Earth_Ocean', 'South_Ocean', 'Tropical_Ocean', 'North_Ocean'
             ]
 
-        summer, winter = {}, {}
-        for variable in variables:
-            winter[variable], summer[variable] = [], []
-            for time in index:
-                year = ds[variable].sel(time=str(time)).values
-                winter[variable].append(year[year >= 0].sum())
-                summer[variable].append(year[year < 0].sum())
-
-        summer_ds = xr.Dataset(
-            {key: (('time'), value) for (key, value) in summer.items()},
-            coords={'time': (('time'), pd.to_datetime(index, format='%Y'))}
-        )
-        winter_ds = xr.Dataset(
-            {key: (('time'), value) for (key, value) in winter.items()},
-            coords={'time': (('time'), pd.to_datetime(index, format='%Y'))}
-        )
-
-        return {'summer': summer_ds, 'winter': winter_ds}
+        return temporal.TemporalAgg(ds[variables]).seasonal()
 
 
 class Analysis:
@@ -406,10 +445,11 @@ class Analysis:
         if time == None:
             time = slice(self.data.time.values[0], self.data.time.values[-1])
 
+        from core import plotting
+
         df = self.data[variable].sel(time=time)
 
-        plt.figure(figsize=(20,10))
-        return plt.plot(df.time.values, df.values)
+        return plotting.timeseries(df.time.values, df.values)
 
     def _time_to_CO2(self, time):
         """ Converts any time series array to corresponding atmospheric CO2
@@ -450,7 +490,8 @@ class Analysis:
         except AttributeError:
             return CO2.loc[index_to_pass]
 
-    def cascading_window_trend(self, variable='Earth_Land', window_size=10, plot=False):
+    def cascading_window_trend(self, variable='Earth_Land', window_size=10,
+                               indep="CO2", plot=False, pearson=False):
         """ Calculates the slope of the trend of an uptake variable for each
         time window and for a given window size. The function also plots the
         slopes as a timeseries and, if prompted, the r-value of each slope as
@@ -469,10 +510,20 @@ class Analysis:
             size of time window of trends (in years).
             Defaults to 25.
 
+        indep: string, optional
+
+            Regress uptake variable over "CO2" or "time".
+            Defaults to "CO2".
+
         plot: bool, optional
 
             Option to show plots of the slopes.
             Defaults to False.
+
+        pearson: bool, optional
+
+            If True, also return the Pearson r-value of each window.
+            Defaults to False.
         """
 
         df = self.data
@@ -487,13 +538,29 @@ class Analysis:
             index=index
         )
 
-        cwt = []
+        if indep == "CO2":
+            x = cwt_df.CO2.values
+        elif indep == "time":
+            x = cwt_df.index.values
+        else:
+            raise ValueError("indep must be 'CO2' or 'time'.")
+
+        from scipy import stats
+
+        cwt, rvalues = [], []
         for i in range(len(cwt_df) - window_size):
-            sub_df = cwt_df.iloc[i:i+window_size]
-            slope = stats.linregress(sub_df.CO2.values, sub_df.U.values).slope
-            cwt.append(slope)
+            linreg = stats.linregress(x[i:i+window_size],
+                                      cwt_df.U.values[i:i+window_size])
+            cwt.append(linreg.slope)
+            rvalues.append(linreg.rvalue)
+
+        cwt_df = pd.DataFrame({'CWT': cwt, 'r': rvalues},
+                              index=cwt_df.index[:-window_size])
+
+        if pearson:
+            return cwt_df.CWT, cwt_df.r
 
-        return pd.DataFrame({'CWT': cwt}, index=cwt_df.index[:-window_size]).CWT
+        return cwt_df.CWT
 
     def psd(self, variable, fs, xlim=None, plot=False):
         """ Calculates the power spectral density (psd) of a timeseries of a
@@ -543,22 +610,14 @@ class Analysis:
                 period = ""
                 unit = ""
 
+        from scipy import signal
+
         freqs, spec = signal.welch(df[variable].values, fs=fs)
 
         if plot:
-            plt.figure(figsize=(12,9))
-
-            plt.subplot(211)
-            plt.plot(df.time, df[variable].values)
-
-            plt.subplot(212)
-            plt.semilogy(1/freqs, spec)
-            plt.gca().invert_xaxis()
-            plt.xlim(xlim)
-
-            plt.title(f"Power Spectrum of {variable}")
-            plt.xlabel(f"Period{period}")
-            plt.ylabel(f"Spectral Variance {unit}")
+            from core import plotting
+            plotting.psd(df.time, df[variable].values, freqs, spec, variable,
+                         period, unit, xlim)
 
         return pd.DataFrame({f"Period{period}": 1/freqs,
         f"Spectral Variance {unit}": spec}, index=freqs)
@@ -576,6 +635,8 @@ class Analysis:
 
         """
 
+        from scipy import signal
+
         x = self.data[variable].values
 
         fs = 12
@@ -586,7 +647,8 @@ class Analysis:
 
         return signal.filtfilt(b, a, x)
 
-    def bandpass(self, variable, fc, fs=1, order=5, btype="low"):
+    def bandpass(self, variable, fc, fs=1, order=5, btype="low",
+                 deseasonalise_first=False):
         """ Applies a bandpass filter to a dataset (either lowpass, highpass
         or bandpass) using the scipy.signal.butter function.
 
@@ -615,14 +677,25 @@ class Analysis:
             options are low, high and band.
             Defaults to low.
 
+        deseasonalise_first: bool, optional
+
+            If True, filter the deseasonalised timeseries (see deseasonalise)
+            instead.
+            Defaults to False.
+
         """
 
-        x = self.data[variable].values
+        if deseasonalise_first:
+            x = self.deseasonalise(variable)
+        else:
+            x = self.data[variable].values
 
         if btype == "band":
             assert type(fc) == list, "fc must be a list of two values."
             fc = np.array(fc)
 
+        from scipy import signal
+
         w = fc / (fs / 2) # Normalize the frequency.
         b, a = signal.butter(order, w, btype)
 
@@ -654,16 +727,17 @@ class ModelEvaluation(Analysis):
         start_year = _time.year[0]
         end_year = _time.year[-1]
 
-        GCP = (pd
-               .read_csv(MAIN_DIR + "data/GCP/budget.csv",
-                         index_col=0,
-                         usecols=[0,4,5,6]
-                        )
+        # The csv files are read once per process and shared between
+        # instances.
+        GCP = (GCPf
+               .cached_csv(GCPf.GCP_FNAME, 0)
+               .iloc[:, [3,4,5]]
                .loc[start_year:end_year]
               )
 
-        GCP['CO2'] = pd.read_csv(MAIN_DIR + "data/CO2/co2_year.csv",
-        index_col=0, header=0)[2:]
+        CO2 = GCPf.cached_csv(GCPf.CO2_FNAME, 'Year')['CO2']
+        self.CO2 = CO2
+        GCP['CO2'] = CO2.iloc[2:]
         GCP['land sink'] = GCP['land sink']
         GCP['ocean sink'] = GCP['ocean sink']
         GCP.rename(columns={"ocean sink": "ocean",
@@ -706,42 +780,17 @@ class ModelEvaluation(Analysis):
         df = self.data
         GCP = self.GCP
 
-        linreg = stats.linregress(GCP[sink].values, df[model_sink].values)
+        from scipy import stats
 
-        def timeseries_plot():
-            plt.subplot(211).plot(GCP.index, GCP[sink])
-            plt.subplot(211).plot(GCP.index, df[model_sink].values)
-            plt.legend(["GCP", "Model"], fontsize=16)
-            plt.xlabel("Year", fontsize=16)
-            plt.ylabel("C flux to the atmosphere (GtC/yr)", fontsize=16)
-
-        def scatter_plot():
-            x = GCP[sink].values
-            y = df[model_sink].values
-            yy = linreg.slope * GCP[sink].values + linreg.intercept
-            plt.subplot(212).scatter(x, y)
-            plt.subplot(212).plot(x, yy, color='r')
-            plt.xlabel("GCP (GtC/yr)", fontsize=16)
-            plt.ylabel("Model (GtC/yr)", fontsize=16)
-
-            xloc = 0.05 * (x.max() - x.min()) + x.min()
-            yloc = 0.85 * (y.max() - y.min()) + y.min()
-            text = (
-                f'slope = {linreg.slope:.2f}\n'
-                f'r = {linreg.rvalue:.2f}'
-            )
-            plt.text(xloc, yloc, text, fontsize=16)
+        linreg = stats.linregress(GCP[sink].values, df[model_sink].values)
 
         if plot:
-            plt.figure(figsize=(20,12))
-
-            if plot == "timeseries":
-                timeseries_plot()
-            elif plot == "scatter":
-                scatter_plot()
-            elif plot == "both":
-                timeseries_plot()
-                scatter_plot()
+            from core import plotting
+            plotting.regression_to_GCP(plot, GCP.index, GCP[sink].values,
+                                       df[model_sink].values, linreg,
+                                       "Year",
+                                       "C flux to the atmosphere (GtC/yr)",
+                                       "(GtC/yr)")
 
         return linreg
 
@@ -785,6 +834,8 @@ class ModelEvaluation(Analysis):
             model_sink = "Earth_Ocean"
             GCP_sink = "ocean sink"
 
+        from scipy import stats
+
         df = self.data
 
         model_roll = (
@@ -794,59 +845,31 @@ class ModelEvaluation(Analysis):
             .squeeze()
         )
 
-        GCP_roll_df = (
-        GCPf
-            .Analysis(GCP_sink)
-            .cascading_window_trend(indep, window_size=window_size)
-        )
+        # The GCP trends are computed once per (sink, window_size, indep).
+        GCP_roll_df = GCPf.reference_cwt(GCP_sink, window_size, indep)
+
+        # Windows are labelled by their start year.
+        start_years = self.GCP.index[:-window_size]
+        GCP_roll = GCP_roll_df.loc[start_years.year].values.squeeze()
 
         if indep == "CO2":
-            index = self._time_to_CO2(self.GCP.index[:-window_size])
-            GCP_roll = GCP_roll_df.loc[index].values.squeeze()
+            index = self._time_to_CO2(start_years)
             xlabel = "CO2 (ppm)"
             cascading_yunit = "(GtC/ppm/yr)"
         elif indep == "time":
-            index = self.GCP.index[:-window_size]
-            GCP_roll = GCP_roll_df.loc[index.year].values.squeeze()
+            index = start_years
             xlabel = "Year"
             cascading_yunit = "(GtC/ppm$^2$)"
 
         linreg = stats.linregress(GCP_roll, model_roll)
 
-        def timeseries_plot():
-            plt.subplot(211).plot(index, GCP_roll)
-            plt.subplot(211).plot(index, model_roll)
-            plt.legend(["GCP", "model"], fontsize=16)
-            plt.xlabel(xlabel, fontsize=16)
-            plt.ylabel(f"Slope of C flux trend {cascading_yunit}", fontsize=16)
-
-        def scatter_plot():
-            x = GCP_roll
-            y = model_roll
-            yy = GCP_roll * linreg.slope + linreg.intercept
-            plt.subplot(212).scatter(x, y)
-            plt.subplot(212).plot(x, yy, color='r')
-            plt.xlabel(f"GCP {cascading_yunit}", fontsize=16)
-            plt.ylabel(f"Model {cascading_yunit}", fontsize=16)
-
-            xloc = 0.05 * (x.max() - x.min()) + x.min()
-            yloc = 0.85 * (y.max() - y.min()) + y.min()
-            text = (
-                f'slope = {linreg.slope:.2f}\n'
-                f'r = {linreg.rvalue:.2f}'
-            )
-            plt.text(xloc, yloc, text, fontsize=16)
-
         if plot:
-            plt.figure(figsize=(20,12))
-
-            if plot == "timeseries":
-                timeseries_plot()
-            elif plot == "scatter":
-                scatter_plot()
-            elif plot == "both":
-                timeseries_plot()
-                scatter_plot()
+            from core import plotting
+            plotting.regression_to_GCP(plot, index, GCP_roll, model_roll,
+                                       linreg, xlabel,
+                                       f"Slope of C flux trend {cascading_yunit}",
+                                       cascading_yunit,
+                                       legend=("GCP", "model"))
 
         return linreg
 
@@ -881,12 +904,14 @@ class ModelEvaluation(Analysis):
         df = self.data
         GCP = self.GCP
 
+        from scipy import stats
+
         GCP_stats = stats.linregress(GCP.index.year, GCP[sink].values)
         model_stats = stats.linregress(GCP.index.year, df[model_sink].values)
 
         if plot:
-            plt.bar(["GCP", "Model"], [GCP_stats[0], model_stats[0]])
-            plt.ylabel("Trend (GtC/yr)", fontsize=14)
+            from core import plotting
+            plotting.trend_bar(GCP_stats[0], model_stats[0])
 
         trend_stats = namedtuple('Trend', ['GCP_slope', 'model_slope', 'diff'])
 
@@ -907,4 +932,6 @@ class ModelEvaluation(Analysis):
 
         """
 
-        return pd.plotting.autocorrelation_plot(self.data[variable].values)
+        from core import plotting
+
+        return plotting.autocorrelation(self.data[variable].values)
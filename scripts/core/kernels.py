@@ -0,0 +1,190 @@
+""" Compiled kernels of the area-weighted regional sums.
+
+The spatial integrations reduce a (time, latitude, longitude) cube to one
+timeseries per region. Done with xarray, every region costs a full-size
+product of the cube with the cell areas, a sum and another product for the
+units. The kernels here fuse the NaN masking, area weighting, unit scaling
+and the sum of all regions into one pass over the cube: the weights of the
+regions are a sparse (region x cell) matrix, so each cell is read once per
+region it belongs to, and no temporary cube is allocated.
+
+With numba installed, the kernel is compiled and parallelised over time.
+Without it, a NumPy fallback computes the same sums block by block over time,
+so that its temporaries stay small. The engine is chosen on the first sums
+and can be forced with the PIPELINE_KERNELS environment variable ('numba' or
+'numpy'):
+
+    PIPELINE_KERNELS=numpy python output_all.py
+
+numba is an optional dependency, only needed for the compiled kernels. It
+and scipy.sparse are imported on the first sums, so that importing the
+SpatialAgg modules stays cheap for the processes that do not integrate.
+"""
+
+
+""" IMPORTS """
+import os
+import importlib.util
+import numpy as np
+import xarray as xr
+
+
+""" INPUTS """
+ENGINE_ENV = "PIPELINE_KERNELS"
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+# Chosen on the first sums, from ENGINE_ENV or the availability of numba.
+ENGINE = None
+
+# Number of time steps of each block of the NumPy fallback.
+BLOCK_SIZE = 64
+
+# Compiled _sparse_sums, once numba is imported.
+_COMPILED = None
+
+# numba.prange once numba is imported; range for the pure Python kernel.
+prange = range
+
+
+""" FUNCTIONS """
+def default_engine():
+    """ Returns the default engine, choosing it on the first call.
+    """
+
+    global ENGINE
+    if ENGINE is None:
+        ENGINE = os.environ.get(ENGINE_ENV) or ('numba' if HAS_NUMBA
+                                                else 'numpy')
+    return ENGINE
+
+def _sparse_sums(values, data, indices, indptr, scale, out):
+    """ Writes the weighted sums of values (time x cell) of each region of the
+    CSR matrix (data, indices, indptr) to out (region x time).
+    """
+
+    for t in prange(values.shape[0]):
+        for r in range(indptr.size - 1):
+            total = 0.
+            for k in range(indptr[r], indptr[r + 1]):
+                value = values[t, indices[k]]
+                if value == value: # Skip NaN as xarray's sum.
+                    total += data[k] * value
+            out[r, t] = total * scale
+
+def _compiled():
+    """ Returns _sparse_sums compiled by numba, compiling it on first use.
+    """
+
+    global _COMPILED, prange
+    if _COMPILED is None:
+        import numba
+        prange = numba.prange
+        _COMPILED = numba.njit(parallel=True, cache=True)(_sparse_sums)
+    return _COMPILED
+
+def _numpy_sums(values, weights, scale, out):
+    """ NumPy fallback of _sparse_sums, blocked over time.
+    """
+
+    for start in range(0, values.shape[0], BLOCK_SIZE):
+        block = values[start:start + BLOCK_SIZE]
+        block = np.where(np.isnan(block), 0., block)
+        out[:, start:start + BLOCK_SIZE] = (weights @ block.T) * scale
+
+def regional_sums(values, weights, scale=1., engine=None):
+    """ Returns the (region x time) array of the weighted sums over the cells
+    of values, treating NaN as zero.
+
+    Parameters
+    ==========
+
+    values: np.ndarray
+
+        (time, ...) array, whose trailing dimensions are flattened into
+        cells.
+
+    weights: np.ndarray or scipy.sparse matrix
+
+        (region x cell) weights of each cell in each region, or (cell,)
+        weights of a single region.
+
+    scale: float or np.ndarray, optional
+
+        factor of the sums, e.g. to convert units. A scalar is fused into the
+        sums; a (time,) array (see core.units) multiplies them in place.
+        Defaults to 1.
+
+    engine: string, optional
+
+        'numba' or 'numpy'.
+        Defaults to None, which uses default_engine().
+
+    """
+
+    from scipy import sparse
+
+    engine = engine or default_engine()
+    if engine not in ('numba', 'numpy'):
+        raise ValueError(f"engine must be 'numba' or 'numpy', not {engine!r}.")
+    if engine == 'numba' and not HAS_NUMBA:
+        raise ImportError("The numba engine needs numba: pip install numba.")
+
+    values = np.ascontiguousarray(values)
+    values = values.reshape(values.shape[0], -1)
+
+    if not sparse.issparse(weights):
+        weights = np.atleast_2d(weights).reshape(-1, values.shape[1])
+    weights = sparse.csr_matrix(weights, dtype=np.float64)
+
+    if weights.shape[1] != values.shape[1]:
+        raise ValueError(f"weights have {weights.shape[1]} cells, values "
+                         f"have {values.shape[1]}.")
+
+    out = np.empty((weights.shape[0], values.shape[0]))
+    fused = float(scale) if np.ndim(scale) == 0 else 1.
+
+    if engine == 'numba':
+        _compiled()(values, weights.data, weights.indices, weights.indptr,
+                    fused, out)
+    else:
+        _numpy_sums(values, weights, fused, out)
+
+    if np.ndim(scale) != 0:
+        out *= scale
+
+    return out
+
+def area_sum(data, area, scale=1.):
+    """ Returns the sum of data * area * scale over latitude and longitude, as
+    xarray would, for a DataArray or every variable of a Dataset. Dask-backed
+    data stays lazy and is summed by xarray.
+
+    Parameters
+    ==========
+
+    data: xr.DataArray or xr.Dataset
+
+        data with dimensions (time, latitude, longitude).
+
+    area: np.ndarray
+
+        (latitude, longitude) array of cell areas.
+
+    scale: float or np.ndarray, optional
+
+        factor of the sums, or (time,) array of factors of each time step.
+        Defaults to 1.
+
+    """
+
+    if isinstance(data, xr.Dataset):
+        return data.map(area_sum, args=(area, scale))
+
+    if data.chunks is not None:
+        return (data * area).sum(('latitude', 'longitude')) * scale
+
+    data = data.transpose('time', 'latitude', 'longitude')
+    totals = regional_sums(data.values, np.asarray(area), scale)[0]
+
+    return xr.DataArray(totals, dims=('time',),
+                        coords={'time': data.time.values})
@@ -0,0 +1,243 @@
+""" Durable ledger of the tasks of long-running batches, so that a batch can
+be resumed after a crash instead of being restarted.
+
+Each task (e.g. one model, region, time resolution and window of the feedback
+grid, or one file of the spatial outputs) is recorded in a SQLite file with
+its status, a fingerprint of its inputs, the paths of its outputs, the error
+of the last failure and the number of attempts. A rerun skips the tasks that
+are done, unless their inputs changed (the fingerprint differs) or their
+outputs were removed, and can be restricted to the tasks that failed:
+
+    ledger = Ledger('ledger.sqlite')
+    for key, inputs in tasks:
+        fingerprint = ledger.fingerprint(*inputs)
+        if ledger.should_run(key, fingerprint):
+            with ledger.task(key, fingerprint) as task:
+                task.outputs = run(*inputs)
+
+SQLite commits every record, so the ledger survives crashes of the batch.
+"""
+
+
+""" IMPORTS """
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import contextlib
+
+
+""" INPUTS """
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    fingerprint TEXT,
+    outputs TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL
+)
+"""
+
+
+""" CLASSES """
+class Task:
+    """ Outputs of a running task, to be set by the caller of Ledger.task.
+    """
+
+    def __init__(self, key):
+        """ Initialise an instance of a Task. """
+
+        self.key = key
+        self.outputs = ()
+
+
+class Ledger:
+    """ This class records the status of the tasks of a batch in a SQLite
+    file.
+
+    Parameters
+    ==========
+
+    fname: string
+
+        SQLite file of the ledger, created if it does not exist. ':memory:'
+        keeps the ledger in memory only.
+
+    """
+
+    def __init__(self, fname):
+        """ Initialise an instance of a Ledger. """
+
+        self.fname = fname
+        self.connection = sqlite3.connect(fname, timeout=60)
+        with self.connection:
+            self.connection.execute(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def fingerprint(*inputs):
+        """ Returns a hash of the inputs of a task. Strings that are paths of
+        existing files or directories are hashed by the size and modification
+        time of their files, tuples and lists by their items and other inputs
+        by their repr, so they must have a stable one (strings, numbers,
+        etc.). Outputs of the task must not be part of the inputs.
+        """
+
+        digest = hashlib.sha1()
+        for item in _flatten(inputs):
+            if isinstance(item, str) and os.path.exists(item):
+                for fname in _files(item):
+                    stat = os.stat(fname)
+                    digest.update(f"{fname}:{stat.st_size}:"
+                                  f"{stat.st_mtime_ns};".encode())
+            else:
+                digest.update(f"{item!r};".encode())
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ Returns the record of a task as a dictionary, or None if it was
+        never recorded.
+        """
+
+        row = self.connection.execute(
+            "SELECT key, status, fingerprint, outputs, error, attempts, "
+            "started, finished FROM tasks WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        record = dict(zip(('key', 'status', 'fingerprint', 'outputs', 'error',
+                           'attempts', 'started', 'finished'), row))
+        record['outputs'] = json.loads(record['outputs'] or '[]')
+        return record
+
+    def status(self, key):
+        """ Returns the status of a task: 'done', 'failed', 'running' (if the
+        batch was interrupted while running it) or 'pending'.
+        """
+
+        record = self.get(key)
+        return PENDING if record is None else record['status']
+
+    def should_run(self, key, fingerprint=None, only_failed=False):
+        """ Returns True unless the task is done with the same fingerprint and
+        all of its outputs still exist. If only_failed, only tasks that
+        failed are run.
+        """
+
+        record = self.get(key)
+
+        if only_failed:
+            return record is not None and record['status'] == FAILED
+
+        if record is None or record['status'] != DONE:
+            return True
+        if fingerprint is not None and record['fingerprint'] != fingerprint:
+            return True
+
+        return not all(os.path.exists(fname) for fname in record['outputs'])
+
+    def start(self, key, fingerprint=None):
+        """ Record that a task started.
+        """
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO tasks (key, status, fingerprint, attempts, "
+                "started) VALUES (?, ?, ?, 1, ?) ON CONFLICT(key) DO UPDATE "
+                "SET status = excluded.status, "
+                "fingerprint = excluded.fingerprint, error = NULL, "
+                "attempts = attempts + 1, started = excluded.started, "
+                "finished = NULL",
+                (key, RUNNING, fingerprint, time.time())
+            )
+
+    def finish(self, key, outputs=(), error=None):
+        """ Record that a task is done with outputs, or failed with error if
+        it is not None.
+        """
+
+        if isinstance(outputs, str):
+            outputs = (outputs,)
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE tasks SET status = ?, outputs = ?, error = ?, "
+                "finished = ? WHERE key = ?",
+                (DONE if error is None else FAILED,
+                 json.dumps([str(fname) for fname in outputs or ()]),
+                 None if error is None else repr(error), time.time(), key)
+            )
+
+    @contextlib.contextmanager
+    def task(self, key, fingerprint=None):
+        """ Context manager that records a task as running, then as done with
+        the outputs set on the yielded Task, or as failed if an exception is
+        raised (which is re-raised).
+        """
+
+        task = Task(key)
+        self.start(key, fingerprint)
+        try:
+            yield task
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        else:
+            self.finish(key, task.outputs)
+
+    def summary(self):
+        """ Returns a dictionary of the number of tasks of each status.
+        """
+
+        return dict(self.connection.execute(
+            "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+        ).fetchall())
+
+    def failed(self):
+        """ Returns a dictionary of {key: error} of the failed tasks.
+        """
+
+        return dict(self.connection.execute(
+            "SELECT key, error FROM tasks WHERE status = ? ORDER BY key",
+            (FAILED,)
+        ).fetchall())
+
+
+""" FUNCTIONS """
+def _flatten(items):
+    for item in items:
+        if isinstance(item, (tuple, list)):
+            yield from _flatten(item)
+        else:
+            yield item
+
+def _files(path):
+    """ Returns the sorted files of path (itself if it is a file).
+    """
+
+    if os.path.isfile(path):
+        return [path]
+
+    files = []
+    for root, dirs, fnames in os.walk(path):
+        dirs.sort()
+        files.extend(os.path.join(root, fname) for fname in sorted(fnames))
+
+    return files
@@ -0,0 +1,183 @@
+""" Plotting layer for the core analysis classes.
+
+This module is only imported when a plot is requested (through the
+plot_timeseries and autocorrelation_plot methods or a 'plot' argument), so
+that batch runs of the spatial and feedback pipelines never import matplotlib.
+"""
+
+
+""" IMPORTS """
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+""" FUNCTIONS """
+def timeseries(x, y):
+    """ Plot a timeseries on a new figure.
+
+    Parameters
+    ==========
+
+    x: array-like
+
+        time values.
+
+    y: array-like
+
+        values to plot against x.
+
+    """
+
+    plt.figure(figsize=(20,10))
+    return plt.plot(x, y)
+
+def psd(time, values, freqs, spec, variable, period, unit, xlim=None):
+    """ Plot a timeseries above its power spectral density.
+
+    Parameters
+    ==========
+
+    time: array-like
+
+        time values of the timeseries.
+
+    values: array-like
+
+        values of the timeseries.
+
+    freqs, spec: np.ndarray
+
+        frequencies and spectral variance returned by scipy.signal.welch.
+
+    variable: string
+
+        name of the variable used in the title.
+
+    period, unit: string
+
+        labels of the period and spectral variance axes.
+
+    xlim: list-like, optional
+
+        apply limit to x-axis of the psd. Must be a list of two values.
+
+    """
+
+    plt.figure(figsize=(12,9))
+
+    plt.subplot(211)
+    plt.plot(time, values)
+
+    plt.subplot(212)
+    plt.semilogy(1/freqs, spec)
+    plt.gca().invert_xaxis()
+    plt.xlim(xlim)
+
+    plt.title(f"Power Spectrum of {variable}")
+    plt.xlabel(f"Period{period}")
+    plt.ylabel(f"Spectral Variance {unit}")
+
+def regression_to_GCP(plot, index, x, y, linreg, xlabel, ylabel, xunit,
+                      legend=("GCP", "Model"), text_loc=(0.05, 0.85)):
+    """ Plot a model series against the matching GCP series as timeseries
+    and/or a scatter plot with the fitted regression line.
+
+    Parameters
+    ==========
+
+    plot: string
+
+        timeseries = timeseries only.
+        scatter = scatter plot only.
+        both = both plots.
+
+    index: array-like
+
+        x-axis values of the timeseries plot.
+
+    x, y: np.ndarray
+
+        GCP and model values respectively.
+
+    linreg: LinregressResult
+
+        regression of y on x.
+
+    xlabel, ylabel: string
+
+        axis labels of the timeseries plot.
+
+    xunit: string
+
+        unit appended to the axis labels of the scatter plot.
+
+    legend: tuple, optional
+
+        legend labels of the timeseries plot.
+
+    text_loc: tuple, optional
+
+        relative (x, y) location of the slope and r annotation.
+
+    """
+
+    def timeseries_plot():
+        plt.subplot(211).plot(index, x)
+        plt.subplot(211).plot(index, y)
+        plt.legend(list(legend), fontsize=16)
+        plt.xlabel(xlabel, fontsize=16)
+        plt.ylabel(ylabel, fontsize=16)
+
+    def scatter_plot():
+        yy = linreg.slope * x + linreg.intercept
+        plt.subplot(212).scatter(x, y)
+        plt.subplot(212).plot(x, yy, color='r')
+        plt.xlabel(f"GCP {xunit}", fontsize=16)
+        plt.ylabel(f"Model {xunit}", fontsize=16)
+
+        xloc = text_loc[0] * (x.max() - x.min()) + x.min()
+        yloc = text_loc[1] * (y.max() - y.min()) + y.min()
+        text = (
+            f'slope = {linreg.slope:.2f}\n'
+            f'r = {linreg.rvalue:.2f}'
+        )
+        plt.text(xloc, yloc, text, fontsize=16)
+
+    plt.figure(figsize=(20,12))
+
+    if plot == "timeseries":
+        timeseries_plot()
+    elif plot == "scatter":
+        scatter_plot()
+    elif plot == "both":
+        timeseries_plot()
+        scatter_plot()
+
+def trend_bar(GCP_slope, model_slope):
+    """ Bar plot of the GCP and model long-term trends.
+    """
+
+    plt.bar(["GCP", "Model"], [GCP_slope, model_slope])
+    plt.ylabel("Trend (GtC/yr)", fontsize=14)
+
+def autocorrelation(values, xlabel=None):
+    """ Plots autocorrelation of a timeseries using pandas.plotting.
+
+    Parameters
+    ==========
+
+    values: np.ndarray
+
+        timeseries values.
+
+    xlabel: string, optional
+
+        label of the lag axis.
+
+    """
+
+    ax = pd.plotting.autocorrelation_plot(values)
+    if xlabel is not None:
+        ax.set_xlabel(xlabel)
+
+    return ax
@@ -0,0 +1,343 @@
+""" Region masks for the spatial integration of gridded fluxes.
+
+A RegionMask holds any number of (possibly overlapping) regions on a
+latitude-longitude grid, defined either by an integer region-ID grid (e.g.
+TransCom or RECCAP region files) or by a dictionary of boolean masks (e.g.
+land/ocean or latitudinal bands). The regional totals of a cube are computed
+in one sparse (region x cell) by (cell x time) product, so integrating over
+dozens of regions costs the same as one pass over the data. The weights of a
+mask are cached per grid, for the MAX_WEIGHTS most recently used grids.
+"""
+
+
+""" IMPORTS """
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+from core import kernels
+
+
+""" INPUTS """
+MAX_WEIGHTS = 32
+
+# Sparse weight matrices keyed by (mask key, grid key), least recently used
+# first.
+_WEIGHTS_CACHE = OrderedDict()
+
+
+""" CLASSES """
+class RegionMask:
+    """ This class takes region definitions on a latitude-longitude grid and
+    integrates gridded data over all regions at once.
+
+    Parameters
+    ==========
+
+    masks: dict or xr.DataArray
+
+        Either a dictionary of {region name: boolean array} with shape
+        (latitude, longitude), or an integer DataArray of region IDs with
+        dimensions (latitude, longitude), where IDs <= 0 or NaN are not part
+        of any region.
+
+    latitude, longitude: array-like, optional
+
+        grid of the masks. Must be passed if masks is a dictionary of arrays
+        and ignored if masks is a DataArray.
+
+    names: dict, optional
+
+        {region ID: region name} for region ID grids. If None, regions are
+        named 'Region<ID>'.
+        Defaults to None.
+
+    """
+
+    def __init__(self, masks, latitude=None, longitude=None, names=None):
+        """ Initialise an instance of a RegionMask. """
+
+        if isinstance(masks, xr.DataArray):
+            latitude = masks.latitude.values
+            longitude = masks.longitude.values
+            masks = _masks_from_ids(masks.values, names)
+        elif latitude is None or longitude is None:
+            raise ValueError("latitude and longitude must be passed with a "
+                             "dictionary of masks.")
+
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+        self.names = list(masks)
+        self.masks = np.stack([np.asarray(masks[name], dtype=bool)
+                               for name in self.names])
+
+        shape = (self.latitude.size, self.longitude.size)
+        if self.masks.shape[1:] != shape:
+            raise ValueError(f"masks have shape {self.masks.shape[1:]}, "
+                             f"expected {shape}.")
+
+        self.key = (tuple(self.names), hash(self.masks.tobytes()))
+
+    def regrid(self, latitude, longitude):
+        """ Returns a RegionMask on another grid, taking the region of the
+        nearest grid cell of the original masks. Longitudes are compared
+        modulo 360, so that either grid can be -180..180 or 0..360.
+
+        Parameters
+        ==========
+
+        latitude, longitude: array-like
+
+            target grid.
+
+        """
+
+        lat_index = _nearest(self.latitude, latitude)
+        lon_index = _nearest(self.longitude, longitude, period=360)
+
+        masks = {name: mask[np.ix_(lat_index, lon_index)]
+                 for name, mask in zip(self.names, self.masks)}
+
+        return RegionMask(masks, latitude, longitude)
+
+    def weights(self, latitude, longitude, area=None):
+        """ Returns the sparse (region x cell) matrix of cell weights for a
+        grid. The matrix is cached per grid.
+
+        Parameters
+        ==========
+
+        latitude, longitude: array-like
+
+            grid of the data to integrate. If it differs from the grid of the
+            masks, the masks are regridded by nearest neighbour.
+
+        area: np.ndarray, optional
+
+            (latitude, longitude) array of cell areas. If None, each cell has
+            a weight of 1.
+            Defaults to None.
+
+        """
+
+        from scipy import sparse
+
+        latitude = np.asarray(latitude)
+        longitude = np.asarray(longitude)
+
+        grid_key = (latitude.tobytes(), longitude.tobytes(),
+                    None if area is None else hash(np.asarray(area).tobytes()))
+        cache_key = (self.key, grid_key)
+
+        if cache_key in _WEIGHTS_CACHE:
+            _WEIGHTS_CACHE.move_to_end(cache_key)
+        else:
+            if (np.array_equal(latitude, self.latitude) and
+                np.array_equal(longitude, self.longitude)):
+                masks = self.masks
+            else:
+                masks = self.regrid(latitude, longitude).masks
+
+            cell_weights = (np.ones(masks.shape[1:]) if area is None
+                            else np.asarray(area))
+            weights = masks * cell_weights[np.newaxis]
+
+            _WEIGHTS_CACHE[cache_key] = sparse.csr_matrix(
+                weights.reshape(len(self.names), -1)
+            )
+            while len(_WEIGHTS_CACHE) > MAX_WEIGHTS:
+                _WEIGHTS_CACHE.popitem(last=False)
+
+        return _WEIGHTS_CACHE[cache_key]
+
+    def integrate(self, data, area=None, scale=1.):
+        """ Returns the weighted sum of data over each region as a DataArray
+        with dimensions (region, time). NaN values are treated as zero, as in
+        xarray's sum. The sums are computed in one pass over the data by
+        core.kernels; dask-backed data stays lazy, with the sums of each time
+        chunk computed as one task.
+
+        Parameters
+        ==========
+
+        data: xr.DataArray
+
+            gridded data with dimensions (time, latitude, longitude).
+
+        area: np.ndarray, optional
+
+            (latitude, longitude) array of cell areas.
+            Defaults to None.
+
+        scale: float or np.ndarray, optional
+
+            factor of the sums, or (time,) array of factors of each time step
+            (see core.units).
+            Defaults to 1.
+
+        """
+
+        data = data.transpose('time', 'latitude', 'longitude')
+        weights = self.weights(data.latitude.values, data.longitude.values,
+                               area)
+
+        if data.chunks is None:
+            totals = kernels.regional_sums(data.values, weights, scale)
+        else:
+            totals = _lazy_sums(data.data, weights, scale)
+
+        return xr.DataArray(totals, dims=('region', 'time'),
+                            coords={'region': self.names,
+                                    'time': data.time.values})
+
+
+""" FUNCTIONS """
+def _block_sums(values, scale, weights):
+    return kernels.regional_sums(values, weights, scale)
+
+def _lazy_sums(values, weights, scale):
+    """ Returns the lazy (region x time) sums of a (time, latitude,
+    longitude) dask array, one task per time chunk.
+    """
+
+    import dask.array as da
+
+    values = values.rechunk({1: -1, 2: -1})
+    scale = da.from_array(np.broadcast_to(scale, values.shape[:1]),
+                          chunks=values.chunks[:1])
+
+    return da.blockwise(_block_sums, 'rt', values, 'tyx', scale, 't',
+                        weights=weights, new_axes={'r': weights.shape[0]},
+                        concatenate=True, dtype=float)
+
+def _nearest(source, target, period=None):
+    """ Returns the indices of the nearest values in source for each value of
+    target. If period is passed (e.g. 360 for longitudes), values are
+    compared modulo period, with the distance around the circle.
+    """
+
+    source = np.asarray(source, dtype=float)
+    target = np.asarray(target, dtype=float)
+
+    if period is not None:
+        source = source % period
+        target = target % period
+
+    order = np.argsort(source)
+    values = source[order]
+
+    if period is not None:
+        # The last and first values are also the neighbours of the first
+        # and last ones across the wrap.
+        order = np.concatenate([order[-1:], order, order[:1]])
+        values = np.concatenate([values[-1:] - period, values,
+                                 values[:1] + period])
+
+    index = np.searchsorted(values, target).clip(1, values.size - 1)
+
+    left = values[index - 1]
+    right = values[index]
+    index = index - (np.abs(target - left) <= np.abs(target - right))
+
+    return order[index]
+
+def _masks_from_ids(ids, names=None):
+    """ Returns a dictionary of boolean masks from an integer region ID grid.
+    """
+
+    ids = np.where(np.isfinite(ids), ids, 0).astype(int)
+
+    masks = {}
+    for region_id in np.unique(ids[ids > 0]):
+        name = (names[region_id] if names is not None
+                else f"Region{region_id}")
+        masks[name] = ids == region_id
+
+    return masks
+
+def latitudinal_masks(latitude, longitude, lat_split=30):
+    """ Returns a RegionMask of the Earth, South, Tropical and North regions
+    used in SpatialAgg.latitudinal_splits.
+
+    Parameters
+    ==========
+
+    latitude, longitude: array-like
+
+        grid of the masks.
+
+    lat_split: integer, optional
+
+        latitude of the split between the tropical and extratropical bands.
+        Defaults to 30.
+
+    """
+
+    latitude = np.asarray(latitude)
+    bands = {
+            "Earth": (-90, 90),
+            "South": (-90, -lat_split),
+            "Tropical": (-lat_split, lat_split),
+            "North": (lat_split, 90)
+            }
+
+    masks = {}
+    for region, (minlat, maxlat) in bands.items():
+        lat_mask = (latitude >= minlat) & (latitude <= maxlat)
+        masks[region] = np.repeat(lat_mask[:, np.newaxis], len(longitude),
+                                  axis=1)
+
+    return RegionMask(masks, latitude, longitude)
+
+def land_ocean_masks(land):
+    """ Returns a RegionMask of land and ocean cells, where land cells are
+    those with a non-zero and finite value at any time in land.
+
+    Parameters
+    ==========
+
+    land: xr.DataArray
+
+        gridded land data (e.g. Terrestrial_flux of an inversion, or CRUTEM
+        temperature) with dimensions (time, latitude, longitude).
+
+    """
+
+    land = land.transpose('time', 'latitude', 'longitude')
+    values = land.values
+    land_mask = ((values != 0) & np.isfinite(values)).any(axis=0)
+
+    return RegionMask({'Land': land_mask, 'Ocean': ~land_mask},
+                      land.latitude.values, land.longitude.values)
+
+def open_region_file(fname, variable, names=None):
+    """ Returns a RegionMask from a netCDF file of integer region IDs (e.g.
+    TransCom or RECCAP regions).
+
+    Parameters
+    ==========
+
+    fname: string
+
+        netCDF file containing the region IDs.
+
+    variable: string
+
+        name of the region ID variable.
+
+    names: dict, optional
+
+        {region ID: region name}.
+        Defaults to None.
+
+    """
+
+    ds = xr.open_dataset(fname)
+    ids = ds[variable]
+
+    rename = {dim: coord for dim, coord in (('lat', 'latitude'),
+                                            ('lon', 'longitude'))
+              if dim in ids.dims}
+    ids = ids.rename(rename).transpose('latitude', 'longitude')
+
+    return RegionMask(ids, names=names)
@@ -0,0 +1,262 @@
+""" Batched ordinary least squares.
+
+ols fits many independent regressions (e.g. one per grid cell) in a single
+set of array operations on a (batch, time, predictor) tensor, which is what
+makes gridded feedback maps feasible: looping over statsmodels.OLS for every
+cell of a 1-degree grid would take days. The results are the same as those of
+statsmodels.OLS with a constant term.
+"""
+
+
+""" IMPORTS """
+import itertools
+import numpy as np
+from collections import namedtuple
+from core import instrument
+
+
+""" INPUTS """
+OLSResult = namedtuple('OLSResult', ['params', 'bse', 'tvalues', 'pvalues',
+                                     'rsquared', 'nobs', 'cov_params'])
+
+LagScanResult = namedtuple('LagScanResult', ['lags', 'params', 'bse',
+                                             'pvalues', 'rsquared', 'nobs'])
+
+DiagnosticsResult = namedtuple('DiagnosticsResult',
+                               ['vif', 'condition_number', 'correlation',
+                                'autocorrelation', 'dof_eff'])
+
+
+""" FUNCTIONS """
+@instrument.timed('ols')
+def ols(X, Y):
+    """ Returns the OLS fits of a batch of regressions as an OLSResult of
+    arrays, where params, bse, tvalues and pvalues have shape (batch,
+    predictor), rsquared and nobs have shape (batch,) and cov_params (the
+    covariance matrix of params) has shape (batch, predictor, predictor).
+
+    Time points with a NaN value in Y or any predictor are dropped from their
+    regression only. Regressions with no more observations than predictors
+    are NaN.
+
+    Parameters
+    ==========
+
+    X: np.ndarray
+
+        (batch, time, predictor) array of predictors. The first predictor
+        must be the constant term, e.g. from add_constant.
+
+    Y: np.ndarray
+
+        (batch, time) array of the dependent variable.
+
+    """
+
+    from scipy import stats
+
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    k = X.shape[-1]
+
+    valid = ~(np.isnan(Y) | np.isnan(X).any(axis=-1))
+    X = np.where(valid[..., np.newaxis], X, 0.)
+    Y = np.where(valid, Y, 0.)
+    nobs = valid.sum(axis=-1)
+    dof = nobs - k
+
+    XtX = np.einsum('btk,btl->bkl', X, X)
+    XtY = np.einsum('btk,bt->bk', X, Y)
+    XtX_inv = np.linalg.pinv(XtX)
+    params = np.einsum('bkl,bl->bk', XtX_inv, XtY)
+
+    resid = np.where(valid, Y - np.einsum('btk,bk->bt', X, params), 0.)
+    ssr = (resid ** 2).sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        Y_mean = Y.sum(axis=-1) / nobs
+        centered = np.where(valid, Y - Y_mean[:, np.newaxis], 0.)
+        rsquared = 1 - ssr / (centered ** 2).sum(axis=-1)
+
+        scale = ssr / dof
+        cov_params = scale[:, np.newaxis, np.newaxis] * XtX_inv
+        bse = np.sqrt(np.diagonal(cov_params, axis1=1, axis2=2))
+        tvalues = params / bse
+        pvalues = 2 * stats.t.sf(np.abs(tvalues), dof[:, np.newaxis])
+
+    fitted = dof > 0
+    params[~fitted] = np.nan
+    bse[~fitted] = np.nan
+    tvalues[~fitted] = np.nan
+    pvalues[~fitted] = np.nan
+    rsquared[~fitted] = np.nan
+    cov_params[~fitted] = np.nan
+
+    return OLSResult(params, bse, tvalues, pvalues, rsquared, nobs,
+                     cov_params)
+
+@instrument.timed('diagnostics')
+def diagnostics(X, resid=None):
+    """ Returns the collinearity diagnostics of a batch of regressions as a
+    DiagnosticsResult of arrays, computed from the same (batch, time,
+    predictor) design as ols:
+
+        vif: (batch, predictor) variance inflation factors, NaN for the
+            constant.
+        condition_number: (batch,) condition numbers of the design with its
+            columns scaled to unit length (Belsley), so that they do not
+            depend on the units of the predictors.
+        correlation: (batch, predictor, predictor) correlations between the
+            predictors, NaN for the constant.
+        autocorrelation: (batch,) lag-1 autocorrelations of resid.
+        dof_eff: (batch,) residual degrees of freedom with the number of
+            observations reduced for the autocorrelation of resid,
+            nobs * (1 - r) / (1 + r) (at most nobs), minus the predictors.
+
+    autocorrelation and dof_eff are NaN without resid. Time points with a NaN
+    value in any predictor (or in resid) are dropped, as in ols.
+
+    Parameters
+    ==========
+
+    X: np.ndarray
+
+        (batch, time, predictor) array of predictors. The first predictor
+        must be the constant term, e.g. from add_constant.
+
+    resid: np.ndarray, optional
+
+        (batch, time) array of the residuals of the fits.
+        Defaults to None.
+
+    """
+
+    X = np.asarray(X, dtype=float)
+    batch, _, k = X.shape
+
+    valid = ~np.isnan(X).any(axis=-1)
+    if resid is not None:
+        resid = np.asarray(resid, dtype=float)
+        valid &= ~np.isnan(resid)
+    X = np.where(valid[..., np.newaxis], X, 0.)
+    nobs = valid.sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Correlations of the predictors without the constant.
+        Z = X[..., 1:]
+        mean = Z.sum(axis=1) / nobs[:, np.newaxis]
+        Z = np.where(valid[..., np.newaxis], Z - mean[:, np.newaxis], 0.)
+        S = np.einsum('btk,btl->bkl', Z, Z)
+        sd = np.sqrt(np.diagonal(S, axis1=1, axis2=2))
+        R = S / (sd[:, :, np.newaxis] * sd[:, np.newaxis, :])
+
+        correlation = np.full((batch, k, k), np.nan)
+        correlation[:, 1:, 1:] = R
+        vif = np.full((batch, k), np.nan)
+        finite = np.isfinite(R).all(axis=(1, 2))
+        vif[finite, 1:] = np.diagonal(np.linalg.pinv(R[finite]),
+                                      axis1=1, axis2=2)
+
+        scaled = X / np.sqrt((X ** 2).sum(axis=1))[:, np.newaxis]
+        singular = np.linalg.svd(np.nan_to_num(scaled), compute_uv=False)
+        condition_number = singular[:, 0] / singular[:, -1]
+
+        autocorrelation = np.full(batch, np.nan)
+        dof_eff = np.full(batch, np.nan)
+        if resid is not None:
+            e = np.where(valid, resid, 0.)
+            autocorrelation = ((e[:, 1:] * e[:, :-1]).sum(axis=-1) /
+                               (e ** 2).sum(axis=-1))
+            r = autocorrelation
+            dof_eff = np.minimum(nobs * (1 - r) / (1 + r), nobs) - k
+
+    condition_number[nobs <= k] = np.nan
+
+    return DiagnosticsResult(vif, condition_number, correlation,
+                             autocorrelation, dof_eff)
+
+def add_constant(X):
+    """ Returns the (batch, time, predictor) array X with a constant first
+    predictor, as statsmodels.api.add_constant.
+    """
+
+    X = np.asarray(X, dtype=float)
+    return np.concatenate([np.ones(X.shape[:-1] + (1,)), X], axis=-1)
+
+def lag(x, lags):
+    """ Returns the (..., time, lag) array of x (..., time) shifted forward by
+    each of lags time steps, i.e. x[..., t - lag], with NaN before the start
+    of x.
+    """
+
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape + (len(lags),), np.nan)
+    for i, steps in enumerate(lags):
+        out[..., steps:, i] = x[..., :x.shape[-1] - steps]
+
+    return out
+
+@instrument.timed('lag_scan')
+def lag_scan(Y, fixed, lagged, max_lag):
+    """ Returns the OLS fits of every combination of the lags (0 to max_lag
+    time steps) of the lagged predictors, with a constant and the fixed
+    predictors, as a LagScanResult: lags has shape (combination, lagged) and
+    params, bse and pvalues have shape (batch, combination, predictor), with
+    the constant first, then the fixed and the lagged predictors; rsquared
+    and nobs have shape (batch, combination).
+
+    All combinations are solved in one call to ols and use the same time
+    points (from max_lag on), so that their skills can be compared.
+
+    Parameters
+    ==========
+
+    Y: np.ndarray
+
+        (batch, time) array of the dependent variable.
+
+    fixed: np.ndarray
+
+        (batch, time, predictor) array of predictors at lag 0, which may have
+        no predictors.
+
+    lagged: np.ndarray
+
+        (batch, time, predictor) array of the predictors to lag.
+
+    max_lag: int
+
+        largest lag in time steps.
+
+    """
+
+    Y = np.asarray(Y, dtype=float)
+    fixed = np.asarray(fixed, dtype=float)
+    lagged = np.asarray(lagged, dtype=float)
+
+    lags = np.array(list(itertools.product(range(max_lag + 1),
+                                           repeat=lagged.shape[-1])))
+    lags = lags.reshape(-1, lagged.shape[-1])
+
+    # (batch, time, lag) of each lagged predictor, from max_lag on.
+    shifted = [lag(lagged[..., j], range(max_lag + 1))[:, max_lag:]
+               for j in range(lagged.shape[-1])]
+
+    X = np.stack([
+        np.concatenate([fixed[:, max_lag:]] +
+                       [shifted[j][..., [steps]]
+                        for j, steps in enumerate(combination)], axis=-1)
+        for combination in lags
+    ], axis=1)
+    Y = np.broadcast_to(Y[:, np.newaxis, max_lag:], X.shape[:-1])
+
+    batch, combinations = X.shape[:2]
+    result = ols(add_constant(X.reshape((-1,) + X.shape[2:])),
+                 Y.reshape(-1, Y.shape[-1]))
+
+    def unstack(values):
+        return values.reshape((batch, combinations) + values.shape[1:])
+
+    return LagScanResult(lags, unstack(result.params), unstack(result.bse),
+                         unstack(result.pvalues), unstack(result.rsquared),
+                         unstack(result.nobs))
@@ -0,0 +1,192 @@
+""" Power spectra of many timeseries at once.
+
+Analysis.psd computes the spectrum of one variable of one model per call.
+The functions here stack every variable of every model sharing a time axis
+into one array and compute all spectra along its last axis in a single call,
+returning a labelled (model, variable, frequency) DataArray.
+"""
+
+
+""" IMPORTS """
+import numpy as np
+import xarray as xr
+
+
+""" INPUTS """
+METHODS = ('welch', 'bartlett', 'periodogram', 'multitaper')
+
+# Period bands (years) of the band power maps.
+BANDS = {
+    "seasonal": (0.4, 1.5),
+    "ENSO": (2, 7),
+    "decadal": (7, 15)
+}
+
+
+""" FUNCTIONS """
+def stack(data, variables=None):
+    """ Returns a (model, variable, time) DataArray of the variables of one
+    or more datasets. Datasets are aligned to their common time points.
+
+    Parameters
+    ==========
+
+    data: dict or xr.Dataset
+
+        dictionary of {model name: xr.Dataset}, or a single xr.Dataset (then
+        the model dimension has the single label None).
+
+    variables: list-like, optional
+
+        variables to stack. Must be in every dataset.
+        Defaults to None, which is the variables of the first dataset.
+
+    """
+
+    if isinstance(data, xr.Dataset):
+        data = {None: data}
+
+    models = list(data)
+    if variables is None:
+        variables = list(data[models[0]].data_vars)
+
+    datasets = xr.align(*[data[model][list(variables)] for model in models],
+                        join='inner')
+
+    return xr.concat(
+        [ds.to_array(dim='variable') for ds in datasets],
+        dim=xr.DataArray(models, dims='model', name='model')
+    ).transpose('model', 'variable', 'time')
+
+def power_spectrum(data, fs, method='welch', variables=None, nperseg=None,
+                   NW=4):
+    """ Returns the power spectral density of every variable of every model
+    as a DataArray with dimensions (model, variable, frequency). The period
+    of each frequency is also a coordinate.
+
+    Parameters
+    ==========
+
+    data: dict or xr.Dataset
+
+        dictionary of {model name: xr.Dataset} or a single xr.Dataset, as in
+        stack.
+
+    fs: integer
+
+        sampling frequency.
+
+    method: string, optional
+
+        welch = Welch's method as in Analysis.psd (scipy.signal.welch).
+        bartlett = average of the periodograms of non-overlapping segments.
+        periodogram = periodogram of the whole series.
+        multitaper = average of the periodograms of the whole series tapered
+            by 2NW - 1 Slepian (DPSS) tapers.
+        Defaults to 'welch'.
+
+    variables: list-like, optional
+
+        variables to use. Passed to stack.
+        Defaults to None.
+
+    nperseg: integer, optional
+
+        segment length of the welch and bartlett methods.
+        Defaults to None, which is the scipy.signal.welch default.
+
+    NW: float, optional
+
+        time-halfbandwidth product of the multitaper method.
+        Defaults to 4.
+
+    """
+
+    da = stack(data, variables)
+    freqs, spec = spectrum(da.values, fs, method, nperseg, NW)
+
+    with np.errstate(divide='ignore'):
+        period = 1 / freqs
+
+    return xr.DataArray(
+        spec,
+        dims=('model', 'variable', 'frequency'),
+        coords={
+            'model': da['model'].values,
+            'variable': da['variable'].values,
+            'frequency': freqs,
+            'period': ('frequency', period)
+        },
+        attrs={'fs': fs, 'method': method}
+    )
+
+def spectrum(values, fs, method='welch', nperseg=None, NW=4):
+    """ Returns the frequencies and power spectral density of an array along
+    its last axis. The parameters are those of power_spectrum.
+    """
+
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}.")
+
+    from scipy import signal
+
+    if method == 'welch':
+        return signal.welch(values, fs=fs, nperseg=nperseg, axis=-1)
+    elif method == 'bartlett':
+        return signal.welch(values, fs=fs, window='boxcar', nperseg=nperseg,
+                            noverlap=0, axis=-1)
+    elif method == 'periodogram':
+        return signal.periodogram(values, fs=fs, axis=-1)
+
+    return _multitaper(values, fs, NW)
+
+def band_power(freqs, spec, bands):
+    """ Returns a dictionary of the power of spec integrated over each band of
+    periods, where spec has frequency as its last axis.
+
+    Parameters
+    ==========
+
+    freqs, spec: np.ndarray
+
+        frequencies and power spectral density returned by spectrum.
+
+    bands: dict
+
+        {band name: (minimum period, maximum period)} in the time unit of the
+        sampling frequency, e.g. years for fs=12 with monthly data.
+
+    """
+
+    df = freqs[1] - freqs[0]
+    with np.errstate(divide='ignore'):
+        period = 1 / freqs
+
+    power = {}
+    for band, (min_period, max_period) in bands.items():
+        in_band = (period >= min_period) & (period <= max_period)
+        power[band] = spec[..., in_band].sum(axis=-1) * df
+
+    return power
+
+def _multitaper(values, fs, NW):
+    """ Returns the frequencies and multitaper power spectral density of
+    values along the last axis.
+    """
+
+    from scipy import fft, signal
+
+    n = values.shape[-1]
+    tapers = signal.windows.dpss(n, NW, Kmax=max(1, int(2 * NW) - 1))
+
+    values = values - values.mean(axis=-1, keepdims=True)
+    coefs = fft.rfft(values[..., np.newaxis, :] * tapers, axis=-1)
+    spec = (np.abs(coefs) ** 2).mean(axis=-2) / fs
+
+    # One-sided density: double all but the zero and Nyquist frequencies.
+    if n % 2:
+        spec[..., 1:] *= 2
+    else:
+        spec[..., 1:-1] *= 2
+
+    return fft.rfftfreq(n, 1 / fs), spec
@@ -0,0 +1,266 @@
+""" Batched state-space regressions with time-varying coefficients.
+
+The feedback analysis fits U = beta * C + gamma * T + c by OLS on fixed
+windows, which is expensive to sweep over windows and discards information
+at their boundaries. Here the coefficients follow random walks instead,
+
+    y_t = x_t . theta_t + e_t,              e_t ~ N(0, sigma^2)
+    theta_t = theta_(t-1) + w_t,            w_t ~ N(0, sigma^2 diag(q))
+
+and a Kalman filter and Rauch-Tung-Striebel smoother give the continuous
+trajectories theta_t, with their covariance, in one O(n) pass over time. As
+regression.ols, every function works on a batch of series at once (e.g. all
+models and regions), so the loop over time is the only Python loop.
+
+The process noise q is relative to the observation variance sigma^2, which
+is estimated by maximum likelihood (concentrated out of the likelihood), and
+to the predictors scaled to a unit root mean square, so that the same ratios
+suit predictors of any units. q = 0 gives constant coefficients, equal to the
+OLS fit over the whole series. With state_ratio=None, q is tuned for each
+series by maximising the likelihood over GRID, one coefficient at a time.
+With a trending predictor such as CO2, a random-walk constant can absorb the
+drift of its coefficient, so the constant can be kept fixed with vary.
+"""
+
+
+""" IMPORTS """
+import numpy as np
+from collections import namedtuple
+from core import instrument
+
+
+""" INPUTS """
+KalmanResult = namedtuple('KalmanResult', ['params', 'bse', 'cov_params',
+                                           'obs_var', 'state_var',
+                                           'state_ratio', 'loglike', 'nobs'])
+
+# Candidate state ratios of tune.
+GRID = np.concatenate([[0.], np.logspace(-6, 2, 17)])
+
+# Variance of the diffuse initial state, for predictors of unit scale.
+DIFFUSE = 1e7
+
+
+""" FUNCTIONS """
+def _scales(X, valid):
+    """ Returns the (batch, predictor) root mean squares of the predictors
+    over the valid time points (1 if they are all zero).
+    """
+
+    squares = np.where(valid[..., np.newaxis], X, 0.) ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scales = np.sqrt(squares.sum(axis=1) /
+                         valid.sum(axis=1)[:, np.newaxis])
+
+    return np.where(np.isfinite(scales) & (scales > 0), scales, 1.)
+
+def _filter(X, Y, valid, ratio, store=True):
+    """ Runs the Kalman filter of unit observation variance and returns the
+    concentrated log-likelihood terms and, if store, the predicted and
+    filtered states and covariances.
+    """
+
+    batch, n, k = X.shape
+
+    theta = np.zeros((batch, k))
+    P = np.broadcast_to(DIFFUSE * np.eye(k), (batch, k, k)).copy()
+    Q = ratio[..., np.newaxis] * np.eye(k)
+
+    sum_v2F = np.zeros(batch)
+    sum_logF = np.zeros(batch)
+    n_ll = np.zeros(batch)
+    seen = np.zeros(batch)
+
+    if store:
+        theta_p, P_p = np.empty((batch, n, k)), np.empty((batch, n, k, k))
+        theta_f, P_f = np.empty((batch, n, k)), np.empty((batch, n, k, k))
+
+    for t in range(n):
+        if t > 0:
+            P = P + Q
+        if store:
+            theta_p[:, t], P_p[:, t] = theta, P
+
+        x = X[:, t]
+        ok = valid[:, t]
+
+        Px = np.einsum('bkl,bl->bk', P, x)
+        F = np.einsum('bk,bk->b', x, Px) + 1.
+        v = np.where(ok, Y[:, t] - np.einsum('bk,bk->b', x, theta), 0.)
+        K = np.where(ok[:, np.newaxis], Px / F[:, np.newaxis], 0.)
+
+        theta = theta + K * v[:, np.newaxis]
+        P = P - np.einsum('bk,bl->bkl', K, Px)
+        P = 0.5 * (P + np.swapaxes(P, 1, 2))
+
+        # The first k observations initialise the diffuse state.
+        seen += ok
+        counted = ok & (seen > k)
+        sum_v2F += np.where(counted, v ** 2 / F, 0.)
+        sum_logF += np.where(counted, np.log(F), 0.)
+        n_ll += counted
+
+        if store:
+            theta_f[:, t], P_f[:, t] = theta, P
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        obs_var = sum_v2F / n_ll
+        loglike = -0.5 * (n_ll * (np.log(2 * np.pi * obs_var) + 1) +
+                          sum_logF)
+    loglike = np.where(n_ll > 0, loglike, np.nan)
+
+    if not store:
+        return obs_var, loglike
+
+    return obs_var, loglike, theta_p, P_p, theta_f, P_f
+
+def _smooth(theta_p, P_p, theta_f, P_f):
+    """ Returns the smoothed states and covariances of a filter run (the
+    Rauch-Tung-Striebel smoother).
+    """
+
+    theta_s, P_s = theta_f.copy(), P_f.copy()
+
+    for t in range(theta_f.shape[1] - 2, -1, -1):
+        # J = P_f[t] P_p[t+1]^-1, with symmetric covariances.
+        J = np.swapaxes(np.linalg.solve(P_p[:, t + 1], P_f[:, t]), 1, 2)
+        theta_s[:, t] = theta_f[:, t] + np.einsum(
+            'bkl,bl->bk', J, theta_s[:, t + 1] - theta_p[:, t + 1])
+        P_s[:, t] = P_f[:, t] + np.einsum(
+            'bkl,blm,bnm->bkn', J, P_s[:, t + 1] - P_p[:, t + 1], J)
+
+    return theta_s, P_s
+
+def _prepare(X, Y):
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+
+    valid = ~(np.isnan(Y) | np.isnan(X).any(axis=-1))
+    scales = _scales(X, valid)
+    X = np.where(valid[..., np.newaxis], X, 0.) / scales[:, np.newaxis]
+    Y = np.where(valid, Y, 0.)
+
+    return X, Y, valid, scales
+
+def loglike(X, Y, state_ratio):
+    """ Returns the (batch,) concentrated log-likelihoods of the series for
+    the state ratios. See smooth for the parameters.
+    """
+
+    X, Y, valid, _ = _prepare(X, Y)
+    ratio = np.broadcast_to(np.asarray(state_ratio, dtype=float),
+                            (X.shape[0], X.shape[2])).copy()
+
+    return _filter(X, Y, valid, ratio, store=False)[1]
+
+@instrument.timed('kalman_tune')
+def tune(X, Y, grid=GRID, sweeps=2, vary=None):
+    """ Returns the (batch, predictor) state ratios that maximise the
+    likelihood of each series, searched over grid for one predictor at a time
+    (starting from constant coefficients), sweeps times over the predictors
+    that vary. Every search runs the filter once on all series and
+    candidates. See smooth for the parameters.
+    """
+
+    X, Y, valid, _ = _prepare(X, Y)
+    batch, n, k = X.shape
+    grid = np.asarray(grid, dtype=float)
+    g = grid.size
+
+    # Candidates are stacked along the batch.
+    X_g = np.repeat(X, g, axis=0)
+    Y_g = np.repeat(Y, g, axis=0)
+    valid_g = np.repeat(valid, g, axis=0)
+
+    vary = np.ones(k, dtype=bool) if vary is None else np.asarray(vary)
+
+    ratio = np.zeros((batch, k))
+    for sweep in range(sweeps):
+        for j in np.flatnonzero(vary):
+            candidates = np.repeat(ratio, g, axis=0)
+            candidates[:, j] = np.tile(grid, batch)
+
+            ll = _filter(X_g, Y_g, valid_g, candidates,
+                         store=False)[1].reshape(batch, g)
+            best = np.argmax(np.where(np.isnan(ll), -np.inf, ll), axis=1)
+            ratio[:, j] = grid[best]
+
+    return ratio
+
+@instrument.timed('kalman')
+def smooth(X, Y, state_ratio=None, grid=GRID, sweeps=2, vary=None):
+    """ Returns the smoothed time-varying coefficients of a batch of
+    regressions as a KalmanResult of arrays, where params and bse have shape
+    (batch, time, predictor), cov_params has shape (batch, time, predictor,
+    predictor), state_var and state_ratio have shape (batch, predictor) and
+    obs_var, loglike and nobs have shape (batch,).
+
+    state_var is the variance of the yearly (per time step) change of each
+    coefficient in the units of the coefficient, i.e. state_ratio scaled by
+    obs_var and the predictors. Time points with a NaN value in Y or any
+    predictor are not observed; the coefficients are still interpolated
+    through them.
+
+    Parameters
+    ==========
+
+    X: np.ndarray
+
+        (batch, time, predictor) array of predictors. The first predictor
+        should be the constant term, e.g. from regression.add_constant.
+
+    Y: np.ndarray
+
+        (batch, time) array of the dependent variable.
+
+    state_ratio: float or np.ndarray, optional
+
+        variance of the change of each coefficient per time step, relative to
+        the observation variance, for predictors scaled to a unit root mean
+        square. A scalar, (predictor,) or (batch, predictor) array.
+        Defaults to None, which tunes the ratios of each series with tune.
+
+    grid: np.ndarray, optional
+
+        candidate ratios of tune.
+        Defaults to GRID.
+
+    sweeps: int, optional
+
+        number of sweeps of tune over the predictors.
+        Defaults to 2.
+
+    vary: array-like of bool, optional
+
+        (predictor,) coefficients that tune lets vary; the others are
+        constant, e.g. [False, True, True] for a constant intercept.
+        Defaults to None, which lets all coefficients vary.
+
+    """
+
+    if state_ratio is None:
+        state_ratio = tune(X, Y, grid, sweeps, vary)
+
+    X, Y, valid, scales = _prepare(X, Y)
+    ratio = np.broadcast_to(np.asarray(state_ratio, dtype=float),
+                            (X.shape[0], X.shape[2])).copy()
+
+    obs_var, ll, theta_p, P_p, theta_f, P_f = _filter(X, Y, valid, ratio)
+    theta_s, P_s = _smooth(theta_p, P_p, theta_f, P_f)
+
+    # Back to the units of the predictors.
+    params = theta_s / scales[:, np.newaxis]
+    cov_params = (obs_var[:, np.newaxis, np.newaxis, np.newaxis] * P_s /
+                  (scales[:, np.newaxis, :, np.newaxis] *
+                   scales[:, np.newaxis, np.newaxis, :]))
+
+    # Series without observations have no estimates.
+    empty = ~valid.any(axis=1)
+    params[empty] = np.nan
+    cov_params[empty] = np.nan
+
+    bse = np.sqrt(np.diagonal(cov_params, axis1=2, axis2=3))
+    state_var = ratio * obs_var[:, np.newaxis] / scales ** 2
+
+    return KalmanResult(params, bse, cov_params, obs_var, state_var, ratio,
+                        ll, valid.sum(axis=1))
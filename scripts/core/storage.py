@@ -0,0 +1,451 @@
+""" Read and write the gridded inputs, spatial output datasets (month, year,
+decade, whole, summer and winter) and analysis results of the pipelines.
+
+Outputs are either written as one netCDF file per time resolution
+(output_folder/year.nc etc.), which is the original layout, or as a single
+netCDF file with one group per time resolution (output_folder/output.nc).
+open_output reads both layouts, so loaders do not need to know which profile
+was used to write the outputs.
+
+Intermediate gridded cubes are stored as Zarr or netCDF4 and opened lazily
+with open_cube, so that workers read only the chunks they need and share the
+files through the page cache. Pickled cubes from older runs can be converted
+with convert_pickle (or 'python -m core.storage file.pickle').
+"""
+
+
+""" IMPORTS """
+import os
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+import xarray as xr
+from core import instrument
+
+
+""" INPUTS """
+FREQUENCIES = ('month', 'year', 'decade', 'whole', 'summer', 'winter')
+SINGLE_FILE = 'output.nc'
+
+
+""" CLASSES """
+class EncodingProfile:
+    """ This class holds the encoding options used when writing the spatial
+    output datasets to netCDF.
+
+    Parameters
+    ==========
+
+    dtype: string, optional
+
+        dtype of the data variables on disk, e.g. 'float32'.
+        Defaults to 'float64'.
+
+    compression: string, optional
+
+        one of None, 'zlib' or a blosc compressor supported by netCDF4
+        ('blosc_lz', 'blosc_lz4', 'blosc_lz4hc', 'blosc_zlib', 'blosc_zstd').
+        The blosc compressors need netCDF4 >= 1.6 built with the blosc filter.
+        Defaults to None.
+
+    complevel: int, optional
+
+        compression level between 1 and 9. Ignored if compression is None.
+        Defaults to 4.
+
+    time_chunk: int, optional
+
+        chunk size along time. If None, netCDF4 chooses the chunking.
+        Defaults to None.
+
+    single_file: bool, optional
+
+        If True, write all time resolutions into one file with one group per
+        time resolution instead of one file per time resolution.
+        Defaults to False.
+
+    """
+
+    def __init__(self, dtype='float64', compression=None, complevel=4,
+                 time_chunk=None, single_file=False):
+        """ Initialise an instance of an EncodingProfile. """
+
+        if compression not in (None, 'zlib') and not compression.startswith('blosc'):
+            raise ValueError(f"compression '{compression}' is not supported.")
+
+        self.dtype = np.dtype(dtype)
+        self.compression = compression
+        self.complevel = complevel
+        self.time_chunk = time_chunk
+        self.single_file = single_file
+
+    def encoding(self, ds):
+        """ Returns the encoding dictionary to pass to xr.Dataset.to_netcdf
+        for the data variables of ds.
+
+        Parameters
+        ==========
+
+        ds: xr.Dataset
+
+            dataset to encode.
+
+        """
+
+        encoding = {}
+        for var in ds.data_vars:
+            da = ds[var]
+            var_encoding = {}
+
+            if np.issubdtype(da.dtype, np.floating):
+                var_encoding['dtype'] = self.dtype
+
+            # Scalar variables (e.g. the 'whole' output) cannot be chunked or
+            # compressed.
+            if da.ndim > 0:
+                if self.compression == 'zlib':
+                    var_encoding.update({'zlib': True,
+                                         'complevel': self.complevel,
+                                         'shuffle': True})
+                elif self.compression is not None:
+                    var_encoding.update({'compression': self.compression,
+                                         'complevel': self.complevel})
+
+                if self.time_chunk is not None and 'time' in da.dims:
+                    var_encoding['chunksizes'] = _time_chunks(da,
+                                                              self.time_chunk)
+
+            encoding[var] = var_encoding
+
+        return encoding
+
+
+PROFILES = {
+    # Original output: float64, uncompressed, one file per time resolution.
+    "default": EncodingProfile(),
+    "float32": EncodingProfile('float32'),
+    "compressed": EncodingProfile('float32', 'zlib', 4, time_chunk=120),
+    "single": EncodingProfile('float32', 'zlib', 4, time_chunk=120,
+                              single_file=True)
+}
+
+
+""" FUNCTIONS """
+def _time_chunks(da, time_chunk):
+    """ Returns the chunk shape of a DataArray chunked along time only.
+    """
+
+    return tuple(min(time_chunk, size) if dim == 'time' else size
+                 for dim, size in zip(da.dims, da.shape))
+
+def get_profile(profile=None):
+    """ Returns an EncodingProfile from either an instance, the name of one of
+    the PROFILES or None (for the default profile).
+    """
+
+    if profile is None:
+        return PROFILES['default']
+    if isinstance(profile, EncodingProfile):
+        return profile
+
+    return PROFILES[profile]
+
+def write_output(arrays, output_folder, profile=None, strict=True):
+    """ Write a dictionary of output datasets (keyed by time resolution) to
+    output_folder with the encoding profile passed. Returns a dictionary of
+    {time resolution: exception} of the outputs that failed to be written,
+    which is empty if strict.
+
+    Parameters
+    ==========
+
+    arrays: dict
+
+        dictionary of xr.Dataset with keys from FREQUENCIES.
+
+    output_folder: string
+
+        directory to write the outputs to. Created (with its parents) if it
+        does not exist. Outputs of the same time resolutions written with the
+        other layout are removed, so that open_output does not read them.
+
+    profile: EncodingProfile or string, optional
+
+        encoding profile or the name of one of PROFILES.
+        Defaults to None, which is the original layout and encoding.
+
+    strict: bool, optional
+
+        If True, raise the error of the first output that fails. Otherwise,
+        the other outputs are still written.
+        Defaults to True.
+
+    """
+
+    profile = get_profile(profile)
+
+    os.makedirs(output_folder, exist_ok=True)
+
+    failed = {}
+    mode = 'w'
+    for freq in arrays:
+        if profile.single_file:
+            destination = os.path.join(output_folder, SINGLE_FILE)
+            group = {'group': freq}
+        else:
+            destination = os.path.join(output_folder, f"{freq}.nc")
+            group, mode = {}, 'w'
+
+        try:
+            with instrument.stage('write_netcdf', destination=destination,
+                                  **group):
+                arrays[freq].to_netcdf(destination, mode=mode,
+                                       encoding=profile.encoding(arrays[freq]),
+                                       **group)
+        except Exception as e:
+            if strict:
+                raise
+            failed[freq] = e
+        else:
+            # Later groups are appended to the single file once it exists.
+            mode = 'a'
+
+            if profile.single_file:
+                stale = os.path.join(output_folder, f"{freq}.nc")
+                if os.path.isfile(stale):
+                    os.remove(stale)
+
+    # A single file from an earlier run is only read for time resolutions
+    # without their own file, so it is removed once it has none left.
+    single_fname = os.path.join(output_folder, SINGLE_FILE)
+    if not profile.single_file and os.path.isfile(single_fname):
+        unread = [_open_group(single_fname, freq) for freq in FREQUENCIES
+                  if not os.path.isfile(os.path.join(output_folder,
+                                                     f"{freq}.nc"))]
+        unread = [ds for ds in unread if ds is not None]
+        for ds in unread:
+            ds.close()
+        if not unread:
+            os.remove(single_fname)
+
+    return failed
+
+def _open_group(fname, freq):
+    """ Returns the group freq of a single file output, or None if it has
+    none.
+    """
+
+    try:
+        return xr.open_dataset(fname, group=freq)
+    except OSError:
+        return None
+
+def open_output(output_folder, freq):
+    """ Open the output dataset of a time resolution from output_folder,
+    regardless of the layout used to write it.
+
+    Parameters
+    ==========
+
+    output_folder: string
+
+        directory of the outputs of one model.
+
+    freq: string
+
+        time resolution to open. One of FREQUENCIES.
+
+    """
+
+    fname = os.path.join(output_folder, f"{freq}.nc")
+    if os.path.isfile(fname):
+        return xr.open_dataset(fname)
+
+    single_fname = os.path.join(output_folder, SINGLE_FILE)
+    if os.path.isfile(single_fname):
+        ds = _open_group(single_fname, freq)
+        if ds is not None:
+            return ds
+
+    raise FileNotFoundError(f"No '{freq}' output in {output_folder}.")
+
+def open_cube(data, chunks=None):
+    """ Open a gridded dataset lazily from a Zarr store or netCDF file. Only
+    the chunks that are indexed are read from disk.
+
+    Pickle files are still accepted for older intermediate outputs, but they
+    are deserialised entirely into memory and should be converted with
+    convert_pickle.
+
+    Parameters
+    ==========
+
+    data: string
+
+        path to a .zarr store, a netCDF file or a .pickle file.
+
+    chunks: dict, optional
+
+        dask chunks to open the dataset with (e.g. {'time': 120}). If None,
+        the dataset is opened with lazily indexed arrays and without dask.
+        Defaults to None.
+
+    """
+
+    if data.endswith('.pickle'):
+        warnings.warn(f"{data} is a pickle and is loaded entirely into memory; "
+                      "convert it with core.storage.convert_pickle.",
+                      DeprecationWarning)
+        return _load_pickle(data)
+
+    if data.rstrip('/').endswith('.zarr'):
+        return xr.open_zarr(data, chunks=chunks)
+
+    return xr.open_dataset(data, chunks=chunks)
+
+def _load_pickle(fname):
+    """ Load a pickled xr.Dataset.
+    """
+
+    import pickle
+
+    with open(fname, 'rb') as read_file:
+        ds = pickle.load(read_file)
+
+    if not isinstance(ds, xr.Dataset):
+        raise TypeError("Pickle object must be of type xr.Dataset.")
+
+    return ds
+
+def convert_pickle(fname, destination=None, time_chunk=120):
+    """ Convert a pickled xr.Dataset to a Zarr store or netCDF4 file chunked
+    along time, which can then be passed to SpatialAgg in place of the pickle.
+
+    Parameters
+    ==========
+
+    fname: string
+
+        path to the .pickle file.
+
+    destination: string, optional
+
+        path of the converted dataset. Its extension (.zarr or .nc) selects
+        the format.
+        Defaults to fname with the .pickle extension replaced by .zarr.
+
+    time_chunk: int, optional
+
+        chunk size along time.
+        Defaults to 120.
+
+    """
+
+    if destination is None:
+        destination = os.path.splitext(fname)[0] + '.zarr'
+
+    return write_cube(_load_pickle(fname), destination, time_chunk)
+
+def write_cube(ds, destination, time_chunk=120):
+    """ Write a gridded dataset to a Zarr store or netCDF4 file chunked along
+    time (if it has a time dimension), so that it can be opened lazily with
+    open_cube. Returns the path written.
+
+    Parameters
+    ==========
+
+    ds: xr.Dataset
+
+        dataset to write.
+
+    destination: string
+
+        path of the dataset. Its extension (.zarr or .nc) selects the format.
+
+    time_chunk: int, optional
+
+        chunk size along time.
+        Defaults to 120.
+
+    """
+
+    is_zarr = destination.rstrip('/').endswith('.zarr')
+
+    encoding = {}
+    for var in ds.data_vars:
+        if 'time' in ds[var].dims:
+            chunk_key = 'chunks' if is_zarr else 'chunksizes'
+            encoding[var] = {chunk_key: _time_chunks(ds[var], time_chunk)}
+
+    with instrument.stage('write_cube', destination=destination):
+        if is_zarr:
+            ds.to_zarr(destination, mode='w', encoding=encoding)
+        else:
+            ds.to_netcdf(destination, encoding=encoding)
+
+    return destination
+
+def save_result(result, fname):
+    """ Save an analysis result in a format that does not need pickle and
+    returns the path written. The extension of fname is replaced to match the
+    type of result:
+
+        xr.Dataset, xr.DataArray: .nc
+        pd.DataFrame, pd.Series: .csv
+        namedtuple (e.g. scipy.stats.linregress results): .csv
+        np.ndarray: .npy
+
+    Parameters
+    ==========
+
+    result: one of the types above.
+
+        result to save.
+
+    fname: string
+
+        path of the file to write.
+
+    """
+
+    root = os.path.splitext(fname)[0]
+
+    if isinstance(result, (xr.Dataset, xr.DataArray)):
+        destination = root + '.nc'
+        result.to_netcdf(destination)
+    elif isinstance(result, (pd.DataFrame, pd.Series)):
+        destination = root + '.csv'
+        result.to_csv(destination)
+    elif hasattr(result, '_asdict'):
+        destination = root + '.csv'
+        pd.Series(result._asdict(), name=type(result).__name__).to_csv(destination)
+    elif isinstance(result, np.ndarray):
+        destination = root + '.npy'
+        np.save(destination, result)
+    else:
+        raise TypeError(f"Cannot save result of type {type(result)}.")
+
+    return destination
+
+def load_result(fname):
+    """ Load a result written by save_result. .npy files are memory-mapped.
+    """
+
+    if fname.endswith('.nc'):
+        return xr.open_dataset(fname)
+    elif fname.endswith('.csv'):
+        return pd.read_csv(fname, index_col=0)
+    elif fname.endswith('.npy'):
+        return np.load(fname, mmap_mode='r')
+
+    raise ValueError(f"Unknown result format: {fname}")
+
+
+""" EXECUTION """
+if __name__ == "__main__":
+    # Convert pickled cubes: python -m core.storage file.pickle [destination]
+    fname = sys.argv[1]
+    destination = sys.argv[2] if len(sys.argv) > 2 else None
+
+    print(convert_pickle(fname, destination))
@@ -0,0 +1,305 @@
+""" Synthetic datasets with the layout of the TRENDY, inversion and HadCRUT
+inputs, and of the CO2 and GCP records.
+
+The data under data/ and output/ are not shipped with the repository, so the
+functions here generate stand-ins of any size for tests and benchmarks:
+gridded cubes with a configurable grid, calendar, length and pattern of
+missing values, and the yearly timeseries and csv files read by the analysis
+modules. Values are a seasonal cycle plus a trend plus noise, drawn from a
+seeded RNG so that every call with the same arguments returns the same data.
+"""
+
+
+""" IMPORTS """
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+""" INPUTS """
+CALENDARS = ('gregorian', 'noleap', '360_day')
+
+# Patterns of missing values of the gridded cubes:
+#   ocean: every ocean cell (land-only fields such as TRENDY nbp).
+#   land: every land cell (ocean-only fields such as HadSST).
+#   random: a fraction of all values.
+#   gaps: a fraction of whole time steps.
+NAN_PATTERNS = ('ocean', 'land', 'random', 'gaps')
+
+# Columns of data/GCP/budget.csv, in order.
+BUDGET_COLUMNS = ('fossil fuel and industry', 'land-use change emissions',
+                  'atmospheric growth', 'ocean sink', 'land sink',
+                  'budget imbalance')
+
+
+""" FUNCTIONS """
+def time_axis(start='1959-01', periods=720, freq='MS', calendar='gregorian',
+              use_cftime=None):
+    """ Returns the time points of a cube: a CFTimeIndex (as decoded from the
+    TRENDY and inversion files) or a pd.DatetimeIndex (as decoded from the
+    HadCRUT file). use_cftime=None uses cftime for the non-gregorian
+    calendars only.
+    """
+
+    if calendar not in CALENDARS:
+        raise ValueError(f"calendar must be one of {CALENDARS}.")
+
+    if use_cftime is None:
+        use_cftime = calendar != 'gregorian'
+    if not use_cftime:
+        return pd.date_range(start, periods=periods, freq=freq)
+
+    return xr.date_range(start, periods=periods, freq=freq,
+                         calendar=calendar, use_cftime=True)
+
+def grid(resolution=1.):
+    """ Returns the latitudes and longitudes of the centres of a global grid
+    with cells of resolution degrees.
+    """
+
+    lat = np.arange(-90 + resolution / 2, 90, resolution)
+    lon = np.arange(-180 + resolution / 2, 180, resolution)
+
+    return lat, lon
+
+def land_mask(lat, lon):
+    """ Returns a (lat, lon) boolean array of synthetic continents covering
+    about a third of the globe.
+    """
+
+    lat_rad = np.deg2rad(lat)[:, np.newaxis]
+    lon_rad = np.deg2rad(lon)
+
+    pattern = (np.sin(2 * lon_rad) * np.cos(lat_rad) +
+               0.5 * np.sin(3 * lat_rad + lon_rad))
+
+    return pattern > 0.35
+
+def _field(time, lat, land, rng, amplitude, trend, noise, dtype):
+    """ Returns a (time, lat, lon) field of a seasonal cycle of opposite sign
+    in each hemisphere, a linear trend and noise.
+    """
+
+    month = np.asarray(time.month)
+    year = np.asarray(time.year) + (month - 1) / 12
+    year = year - year[0]
+
+    hemisphere = np.sign(lat)[:, np.newaxis]
+    seasonal = (amplitude * np.cos(2 * np.pi * (month - 1) / 12)
+                [:, np.newaxis, np.newaxis] * hemisphere)
+    values = (seasonal + trend * year[:, np.newaxis, np.newaxis] +
+              noise * rng.standard_normal((len(time),) + land.shape))
+
+    return values.astype(dtype)
+
+def _add_nans(values, land, nan, nan_fraction, rng):
+    """ Sets the missing values of each pattern in nan (see NAN_PATTERNS) in
+    the (time, lat, lon) array values.
+    """
+
+    if nan is None:
+        return values
+
+    patterns = (nan,) if isinstance(nan, str) else tuple(nan)
+    for pattern in patterns:
+        if pattern not in NAN_PATTERNS:
+            raise ValueError(f"nan patterns must be in {NAN_PATTERNS}.")
+
+        if pattern == 'ocean':
+            values[:, ~land] = np.nan
+        elif pattern == 'land':
+            values[:, land] = np.nan
+        elif pattern == 'random':
+            values[rng.random(values.shape) < nan_fraction] = np.nan
+        elif pattern == 'gaps':
+            values[rng.random(values.shape[0]) < nan_fraction] = np.nan
+
+    return values
+
+def _cube(variables, resolution, start, periods, freq, calendar, use_cftime,
+          nan, nan_fraction, seed, dtype):
+    """ Returns a xr.Dataset of (time, latitude, longitude) fields of the
+    variables, which are {name: (amplitude, trend, noise, cells)} where cells
+    is 'land', 'ocean' or None (everywhere); values outside cells are zero.
+    """
+
+    rng = np.random.default_rng(seed)
+    time = time_axis(start, periods, freq, calendar, use_cftime)
+    lat, lon = grid(resolution)
+    land = land_mask(lat, lon)
+
+    data_vars = {}
+    for name, (amplitude, trend, noise, cells) in variables.items():
+        values = _field(time, lat, land, rng, amplitude, trend, noise, dtype)
+        if cells == 'land':
+            values[:, ~land] = 0
+        elif cells == 'ocean':
+            values[:, land] = 0
+        values = _add_nans(values, land, nan, nan_fraction, rng)
+
+        data_vars[name] = (('time', 'latitude', 'longitude'), values)
+
+    return xr.Dataset(
+        data_vars,
+        coords={
+            'time': (('time'), time),
+            'latitude': (('latitude'), lat),
+            'longitude': (('longitude'), lon)
+        }
+    )
+
+def trendy_cube(resolution=1., start='1959-01', periods=720, freq='MS',
+                calendar='noleap', use_cftime=None, nan='ocean',
+                nan_fraction=0.05, seed=0, dtype='float32'):
+    """ Returns a xr.Dataset like a TRENDY file, with the land flux 'nbp' (kg
+    C m-2 s-1, positive into the land).
+
+    Parameters
+    ==========
+
+    resolution: float, optional
+
+        grid resolution in degrees.
+        Defaults to 1.
+
+    start, periods, freq, calendar, use_cftime: optional
+
+        time points, passed to time_axis.
+        Default to 720 months from 1959-01 in the noleap calendar.
+
+    nan: str or list-like, optional
+
+        pattern(s) of missing values (see NAN_PATTERNS) or None.
+        Defaults to 'ocean'.
+
+    nan_fraction: float, optional
+
+        fraction of missing values of the random and gaps patterns.
+        Defaults to 0.05.
+
+    seed: int, optional
+
+        seed of the RNG.
+        Defaults to 0.
+
+    dtype: str, optional
+
+        dtype of the values.
+        Defaults to 'float32'.
+
+    """
+
+    variables = {'nbp': (3e-9, 2e-11, 1e-9, 'land')}
+
+    return _cube(variables, resolution, start, periods, freq, calendar,
+                 use_cftime, nan, nan_fraction, seed, dtype)
+
+def inversion_cube(resolution=1., start='1979-01', periods=480, freq='MS',
+                   calendar='gregorian', use_cftime=True, nan=None,
+                   nan_fraction=0.05, seed=0, dtype='float32'):
+    """ Returns a xr.Dataset like an inversion file, with the land
+    'Terrestrial_flux' and the 'Ocean_flux' (positive into the atmosphere).
+    The parameters are those of trendy_cube.
+    """
+
+    variables = {
+        'Terrestrial_flux': (5., -0.05, 2., 'land'),
+        'Ocean_flux': (1., -0.02, 0.5, 'ocean')
+    }
+
+    return _cube(variables, resolution, start, periods, freq, calendar,
+                 use_cftime, nan, nan_fraction, seed, dtype)
+
+def hadcrut_cube(resolution=5., start='1850-01', periods=2040, freq='MS',
+                 calendar='gregorian', use_cftime=None, nan='random',
+                 nan_fraction=0.2, seed=0, dtype='float32'):
+    """ Returns a xr.Dataset like the HadCRUT file, with the
+    'temperature_anomaly' (K). The parameters are those of trendy_cube.
+    """
+
+    variables = {'temperature_anomaly': (0.2, 0.008, 0.5, None)}
+
+    return _cube(variables, resolution, start, periods, freq, calendar,
+                 use_cftime, nan, nan_fraction, seed, dtype)
+
+def co2_series(start=1957, end=2018, freq='year'):
+    """ Returns a pd.Series of CO2 (ppm) like data/CO2/co2_year.csv (indexed
+    by Year) or, if freq is 'month', co2_month.csv (indexed by Year and
+    Month).
+    """
+
+    years = np.arange(start, end + 1)
+    if freq == 'year':
+        index = pd.Index(years, name='Year')
+        time = years + 0.5
+    else:
+        index = pd.MultiIndex.from_product([years, range(1, 13)],
+                                           names=['Year', 'Month'])
+        time = (index.get_level_values('Year') +
+                (index.get_level_values('Month') - 0.5) / 12).values
+
+    t = time - 1957
+    co2 = 314 + 0.7 * t + 0.012 * t ** 2
+    if freq != 'year':
+        co2 = co2 + 3 * np.sin(2 * np.pi * (time % 1))
+
+    return pd.Series(co2, index=index, name='CO2')
+
+def timeseries(variables=('Earth_Land', 'Earth_Ocean'), start=1959,
+               end=2018, co2=None, seed=0):
+    """ Returns a xr.Dataset of yearly timeseries of the variables, labelled
+    at the end of each year like the year outputs of the spatial
+    aggregations. Each variable is a linear response to co2 (from
+    co2_series if None) plus noise.
+    """
+
+    rng = np.random.default_rng(seed)
+    years = np.arange(start, end + 1)
+    if co2 is None:
+        co2 = co2_series(start, end)
+    C = co2.loc[start:end].values
+
+    data_vars = {}
+    for i, variable in enumerate(variables):
+        slope = 0.01 * (1 + i % 3)
+        values = slope * (C - C[0]) + rng.normal(0, 0.3, years.size)
+        data_vars[variable] = (('time'), values)
+
+    time = pd.to_datetime([f"{year}-12-31" for year in years])
+    return xr.Dataset(data_vars, coords={'time': (('time'), time)})
+
+def budget(start=1959, end=2018, seed=0):
+    """ Returns a pd.DataFrame like data/GCP/budget.csv, indexed by Year.
+    """
+
+    rng = np.random.default_rng(seed)
+    years = np.arange(start, end + 1)
+    t = years - 1959
+
+    ocean = 1 + 0.025 * t + rng.normal(0, 0.1, years.size)
+    land = 1.2 + 0.02 * t + rng.normal(0, 0.6, years.size)
+    fossil = 2.5 + 0.12 * t + rng.normal(0, 0.1, years.size)
+    luc = 1.5 + rng.normal(0, 0.2, years.size)
+    imbalance = rng.normal(0, 0.5, years.size)
+    growth = fossil + luc - ocean - land - imbalance
+
+    values = (fossil, luc, growth, ocean, land, imbalance)
+    return pd.DataFrame(dict(zip(BUDGET_COLUMNS, values)),
+                        index=pd.Index(years, name='Year'))
+
+def write_data_dir(directory, seed=0):
+    """ Writes the csv files that the analysis modules read from the data
+    folder (data/CO2/co2_year.csv, data/CO2/co2_month.csv and
+    data/GCP/budget.csv) under directory, which can then be used as
+    MAIN_DIR.
+    """
+
+    os.makedirs(os.path.join(directory, 'data/CO2'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'data/GCP'), exist_ok=True)
+
+    co2_series(freq='year').to_csv(
+        os.path.join(directory, 'data/CO2/co2_year.csv'))
+    co2_series(freq='month').to_csv(
+        os.path.join(directory, 'data/CO2/co2_month.csv'))
+    budget(seed=seed).to_csv(os.path.join(directory, 'data/GCP/budget.csv'))
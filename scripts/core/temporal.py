@@ -0,0 +1,246 @@
+""" Temporal aggregation of monthly spatial outputs.
+
+TemporalAgg reshapes a monthly Dataset once into a (year, month) array and
+derives the yearly, decadal, whole-period and seasonal (summer and winter)
+aggregates from it, instead of resampling the monthly series separately for
+each time resolution. The aggregates match those of pandas resampling:
+
+    year: ds.resample({'time': 'Y'}).sum() (or .mean())
+    decade: ds.resample({'time': '10Y'}).sum() (or .mean())
+    whole: ds.sum() (or .mean())
+    summer, winter: SpatialAgg.seasonal_uptake()
+
+Both numpy datetimes and cftime dates of any calendar are supported.
+"""
+
+
+""" IMPORTS """
+import numpy as np
+import pandas as pd
+import xarray as xr
+from core import instrument
+
+
+""" CLASSES """
+class TemporalAgg:
+    """ This class takes a monthly xr.Dataset, such as the output of
+    SpatialAgg.latitudinal_splits, and aggregates all of its variables to
+    yearly, decadal, whole-period and seasonal resolutions from a single
+    (year, month) array.
+
+    Parameters
+    ==========
+
+    data: xr.Dataset
+
+        monthly dataset with time as the first dimension of every variable.
+
+    how: string, optional
+
+        'sum' for fluxes or 'mean' for temperatures. As in xarray, NaN values
+        are skipped: periods of only NaN values have a sum of 0 and a mean of
+        NaN, and periods without any time points are NaN.
+        Defaults to 'sum'.
+
+    """
+
+    def __init__(self, data, how='sum'):
+        """ Initialise an instance of a TemporalAgg. """
+
+        if how not in ('sum', 'mean'):
+            raise ValueError(f"how must be 'sum' or 'mean', not '{how}'.")
+
+        self.data = data
+        self.how = how
+        self.variables = list(data.data_vars)
+
+        years = data.time.dt.year.values
+        months = data.time.dt.month.values
+
+        self.first_year = years.min()
+        self.years = np.arange(self.first_year, years.max() + 1)
+        self.present_years = np.unique(years)
+
+        first_time = data.time.values[0]
+        self.calendar = getattr(first_time, 'calendar', None)
+
+        # (variable, year, month, ...) array of the monthly values.
+        values = np.stack([data[var].transpose('time', ...).values
+                           for var in self.variables])
+        cube = np.full((len(self.variables), self.years.size, 12)
+                       + values.shape[2:], np.nan)
+
+        year_index = years - self.first_year
+        if np.unique(year_index * 12 + months).size != months.size:
+            raise ValueError("data must have at most one value per month.")
+        cube[:, year_index, months - 1] = values
+
+        self.cube = cube
+        valid = ~np.isnan(cube)
+        self.year_sums = np.where(valid, cube, 0.).sum(axis=2)
+        self.year_counts = valid.sum(axis=2)
+
+        # Number of time points in each year, broadcastable to year_sums.
+        rows = np.bincount(year_index, minlength=self.years.size)
+        self.year_rows = rows.reshape((1, -1) + (1,) * (values.ndim - 2))
+
+    def _dims(self, var):
+        """ Returns the dimensions of a variable other than time.
+        """
+
+        return tuple(dim for dim in self.data[var].dims if dim != 'time')
+
+    def _coords(self, var):
+        """ Returns the coordinates of a variable other than time.
+        """
+
+        return {dim: self.data[dim].values for dim in self._dims(var)
+                if dim in self.data.coords}
+
+    def _dataset(self, values, time=None):
+        """ Returns a Dataset from an array with a first dimension of
+        variables, along the time points passed (if any).
+        """
+
+        data_vars, coords = {}, {}
+        for var, value in zip(self.variables, values):
+            dims = self._dims(var)
+            if time is not None:
+                dims = ('time',) + dims
+            data_vars[var] = (dims, value)
+            coords.update(self._coords(var))
+
+        if time is not None:
+            coords['time'] = (('time'), time)
+
+        return xr.Dataset(data_vars, coords=coords)
+
+    def _aggregate(self, sums, counts, rows):
+        """ Returns the sums or the means of the aggregated values. As in
+        pandas, periods without any time points are NaN.
+        """
+
+        if self.how == 'sum':
+            return np.where(rows > 0, sums, np.nan)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def _year_end(self, years):
+        """ Returns the time labels of periods ending in the years passed, in
+        the calendar of the data.
+        """
+
+        if self.calendar is None:
+            return pd.to_datetime([f"{year}-12-31" for year in years]).values
+
+        import cftime
+
+        last_day = 30 if self.calendar == '360_day' else 31
+        return np.array([cftime.datetime(year, 12, last_day,
+                                         calendar=self.calendar)
+                         for year in years])
+
+    def year(self):
+        """ Returns the yearly aggregates, labelled at the end of each year.
+        """
+
+        values = self._aggregate(self.year_sums, self.year_counts,
+                                 self.year_rows)
+
+        return self._dataset(values, self._year_end(self.years))
+
+    def decade(self, anchor=None):
+        """ Returns the decadal aggregates, labelled at the end of each
+        decade.
+
+        Parameters
+        ==========
+
+        anchor: int, optional
+
+            a year that ends a decade, e.g. 1969 for the decades 1960-1969,
+            1970-1979 and so on. The first and last decades can be incomplete.
+            Defaults to None, which is the first year of the data as in
+            pandas' '10Y' resampling (the first year is its own decade).
+
+        """
+
+        if anchor is None:
+            anchor = self.first_year
+
+        # Each year belongs to the first decade end at or after it.
+        ends = self.years + (anchor - self.years) % 10
+        decade_ends, starts = np.unique(ends, return_index=True)
+
+        sums = np.add.reduceat(self.year_sums, starts, axis=1)
+        counts = np.add.reduceat(self.year_counts, starts, axis=1)
+        rows = np.add.reduceat(self.year_rows, starts, axis=1)
+        values = self._aggregate(sums, counts, rows)
+
+        return self._dataset(values, self._year_end(decade_ends))
+
+    def whole(self):
+        """ Returns the aggregates over the whole period.
+        """
+
+        values = self._aggregate(self.year_sums.sum(axis=1),
+                                 self.year_counts.sum(axis=1),
+                                 self.year_rows.sum(axis=1))
+
+        return self._dataset(values)
+
+    def seasonal(self):
+        """ Returns the annual sums of uptake in the summer (negative values)
+        and winter (positive values) seasons as in
+        SpatialAgg.seasonal_uptake, labelled at the start of each year.
+
+        Returns
+        -------
+
+        dict: {'summer': xr.Dataset, 'winter': xr.Dataset}
+
+        """
+
+        present = np.isin(self.years, self.present_years)
+        cube = self.cube[:, present]
+
+        summer = np.where(cube < 0, cube, 0.).sum(axis=2)
+        winter = np.where(cube >= 0, cube, 0.).sum(axis=2)
+
+        time = pd.to_datetime(self.present_years.astype(str), format='%Y')
+
+        return {'summer': self._dataset(summer, time),
+                'winter': self._dataset(winter, time)}
+
+    @instrument.timed('resample')
+    def outputs(self, decade_anchor=None, seasonal=True):
+        """ Returns a dictionary of the monthly data and all of its
+        aggregates, keyed by the time resolutions of core.storage.FREQUENCIES.
+
+        Parameters
+        ==========
+
+        decade_anchor: int, optional
+
+            passed to decade as anchor.
+            Defaults to None.
+
+        seasonal: bool, optional
+
+            If True, include the summer and winter aggregates.
+            Defaults to True.
+
+        """
+
+        arrays = {
+            "month": self.data,
+            "year": self.year(),
+            "decade": self.decade(decade_anchor),
+            "whole": self.whole()
+        }
+
+        if seasonal:
+            arrays.update(self.seasonal())
+
+        return arrays
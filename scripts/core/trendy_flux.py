@@ -4,22 +4,34 @@
 """ IMPORTS"""
 import numpy as np
 import xarray as xr
-import sys
 import os
 import pandas as pd
-import pickle
-import matplotlib.pyplot as plt
 from datetime import datetime
-from scipy import stats, signal
 from core import GCP_flux as GCPf
-from itertools import *
+from core import storage
+from core import temporal
+from core import instrument
+from core import kernels
+from core.regions import latitudinal_masks
+from core import units
 from collections import namedtuple
 
+# matplotlib (through core.plotting) and the scipy submodules are imported
+# on first use so that batch runs only pay for the aggregation dependencies.
+
 
 """ INPUTS """
 CURRENT_PATH = os.path.dirname(__file__)
 MAIN_DIR = CURRENT_PATH + "./../../"
 
+# Offsets of the time resolutions, as the 'M' and 'Y' aliases are no longer
+# accepted by pandas.
+FREQUENCIES = {'M': pd.offsets.MonthEnd(), 'Y': pd.offsets.YearEnd()}
+
+# Grid of _regrid_dataarray, whose cells add up to the surface of the Earth.
+REGRID_LATITUDE = np.arange(-89.5, 90.5, 1)
+REGRID_LONGITUDE = np.arange(-179.5, 180.5, 1)
+
 
 """ CLASSES """
 class SpatialAgg:
@@ -35,41 +47,71 @@ class SpatialAgg:
 
     data: xarray.Dataset or .nc file.
 
+    chunks: dict, optional
+
+        dask chunks of the data (e.g. {'time': 120}). The spatial integrations
+        then return lazy datasets, which can be computed together on a
+        cluster (see core.cluster).
+        Defaults to None, which uses numpy arrays.
+
+    month_length: string, optional
+
+        'fixed' to convert the integrated fluxes with 30-day months, or
+        'calendar' for the exact length of each time step in the calendar of
+        the data (see core.units).
+        Defaults to None, which uses core.units.MONTH_LENGTH ('fixed' unless
+        set by the PIPELINE_MONTH_LENGTH environment variable).
+
+    time_resolution: string, optional
+
+        'M' for monthly or 'Y' for yearly data.
+        Defaults to None, which reads it from data/TRENDY/models for files.
+
+    model: string, optional
+
+        name of the TRENDY model, which sets the regridding (e.g. 'OCN' is
+        not regridded).
+        Defaults to None, which takes it from the path of files.
+
     """
 
-    def __init__(self, data):
+    @instrument.timed('spatial_agg')
+    def __init__(self, data, chunks=None, month_length=None,
+                 time_resolution=None, model=None):
         """ Initialise an instance of an SpatialAgg. """
         if isinstance(data, xr.Dataset):
-            _data = data
-
-        elif type(data) == str and data.endswith('.pickle'):
-            read_file = open(data, 'rb')
-            _data = pickle.load(read_file)
-            if not isinstance(_data, xr.Dataset):
-                raise TypeError("Pickle object must be of type xr.Dataset.")
+            _data = data if chunks is None else data.chunk(chunks)
 
         else:
-            _data = xr.open_dataset(data)
+            # Zarr stores and netCDF files are opened lazily; pickles are
+            # still read but should be converted with storage.convert_pickle.
+            _data = storage.open_cube(data, chunks)
 
         self.var = 'nbp'
         self.data = -_data[self.var] # -ve sign is to direct fluxes positive
                                      # to the atmosphere instead of into the land.
 
         self.earth_radius = 6.371e6 # Radius of Earth
-
-        # Metadata
-        models_info_fname = os.path.join(os.path.dirname(__file__),
-                            './../../data/TRENDY/models/models_info.txt')
-        models_info = pd.read_csv(models_info_fname,
-                                 delim_whitespace=True,
-                                 index_col="File"
-                                 )
-
-        if isinstance(data, str):
-            model_info = models_info.loc[data.split('/')[-1]]
+        self.month_length = month_length
+
+        # Metadata (only known for files; pass time_resolution and model for
+        # datasets).
+        self.time_resolution = time_resolution
+        self.model = model
+        if isinstance(data, str) and time_resolution is None:
+            models_info_fname = os.path.join(os.path.dirname(__file__),
+                                './../../data/TRENDY/models/models_info.txt')
+            models_info = pd.read_csv(models_info_fname,
+                                     delim_whitespace=True,
+                                     index_col="File"
+                                     )
+
+            # Converted .zarr/.pickle cubes share the metadata of the .nc file.
+            fname = os.path.splitext(data.rstrip('/').split('/')[-1])[0] + '.nc'
+            model_info = models_info.loc[fname]
             self.time_resolution = model_info['time_resolution']
-
-            self.model = data.split('/')[-3]
+        if isinstance(data, str) and model is None:
+            self.model = data.rstrip('/').split('/')[-3]
 
     """The following three functions obtain the area of specific grid boxes of
     the Earth in different formats. It is used within the SpatialAgg class.
@@ -126,6 +168,7 @@ class SpatialAgg:
 
         return result
 
+    @instrument.timed('regrid')
     def _regrid_dataarray(self):
         """ Regrid the DataArray from initialisation of the SpatialAgg instance
         to a latitude-longitude grid which ensures that, when the surface area
@@ -136,13 +179,20 @@ class SpatialAgg:
         # to the surface area of the Earth (OCN coordinates already has this).
         # Interpolation is used to produce values at correct lats and lons.
 
-        correct_longitude = np.arange(-179.5, 180.5, 1)
-        correct_latitude = np.arange(-89.5, 90.5, 1)
-
-        return self.data.interp(coords={'longitude': correct_longitude,
-                                        'latitude': correct_latitude}
+        return self.data.interp(coords={'longitude': REGRID_LONGITUDE,
+                                        'latitude': REGRID_LATITUDE}
                                )
 
+    def _grid(self):
+        """ Returns the latitudes and longitudes of the integrated data: the
+        grid of _regrid_dataarray, or that of the data for OCN.
+        """
+
+        if self.model != 'OCN':
+            return REGRID_LATITUDE, REGRID_LONGITUDE
+
+        return self.data.latitude.values, self.data.longitude.values
+
     def time_range(self, start_time=None, end_time=None, slice_obj=False):
         """ Returns a list or slice object of a range of time points, as is
         required when selecting time points for other functions.
@@ -199,7 +249,7 @@ class SpatialAgg:
         arg_time_range = (
         pd
             .date_range(start=start_time, end=end_time,
-                        freq=self.time_resolution)
+                        freq=FREQUENCIES[self.time_resolution])
             .strftime(tformat)
         )
 
@@ -208,6 +258,7 @@ class SpatialAgg:
         else:
             return arg_time_range
 
+    @instrument.timed('regional_cut')
     def regional_cut(self, lats, lons, start_time=None, end_time=None):
         """ Cuts the dataset into selected latitude and longitude values.
 
@@ -249,9 +300,12 @@ class SpatialAgg:
 
         df = df.sel(latitude=slice(*lats), longitude=slice(*lons),
                     time=slice_time_range)
-        df = df * self.earth_area_grid(df.latitude, df.longitude) * 1e-12
-        df = df.sum(axis=(1,2))
-        df = df * np.ones(len(df.time)) * 30*24*3600
+        # PgC/s to PgC per time step, applied to the sums.
+        df = kernels.area_sum(df, self.earth_area_grid(df.latitude,
+                                                       df.longitude) * 1e-12,
+                              scale=units.step_seconds(df.time,
+                                                       self.time_resolution,
+                                                       self.month_length))
 
         df['time'] = arg_time_range
 
@@ -274,8 +328,8 @@ class SpatialAgg:
 
         The regions are split into land and ocean and are latitudinally split
         according to passed argument for lat_split.
-        This function uses the regional_cut function to cut the gridded carbon
-        sinks to the latitudes required for the latitudinal splits.
+        The bands are regions.latitudinal_masks, integrated together by
+        regional_masks.
 
         Globally integrated fluxes are also included for each of land and
         ocean.
@@ -309,40 +363,86 @@ class SpatialAgg:
 
         """
 
+        # The bands are integrated together in one pass over the data.
+        masks = latitudinal_masks(*self._grid(), lat_split)
+        ds = self.regional_masks(masks, start_time, end_time)
+
+        self.lat_split_ds = ds
+
+        return ds
+
+    @instrument.timed('regional_masks')
+    def regional_masks(self, regions, start_time=None, end_time=None):
+        """ Returns a xr.Dataset of the total land carbon sink of every region
+        of a RegionMask at each time point within a range of time points,
+        with variables named '<region>_Land'.
+
+        Unlike regional_cut, the regions can have any shape and all regions
+        are integrated in a single pass over the data.
+
+        Parameters
+        ==========
+
+        regions: core.regions.RegionMask
+
+            regions to integrate over, e.g. from regions.latitudinal_masks,
+            regions.land_ocean_masks or regions.open_region_file. Masks on a
+            different grid are regridded by nearest neighbour.
+
+        start_time: string, optional
+
+            The month and year of the time to start the integration in the
+            format '%Y-%M'.
+            Default is None.
+
+        end_time: string, optional
+
+            The month and year of the time to end the integration in the
+            format '%Y-%M'. Note that the integration will stop the month
+            before argument.
+            Default is None.
+
+        """
+
         df = self.data
 
-        vars = {
-                "Earth_Land": (-90, 90),
-                "South_Land": (-90, -lat_split),
-                "Tropical_Land": (-lat_split, lat_split),
-                "North_Land": (lat_split, 90)
-                }
+        # Re-grid DataArray if model is not OCN.
+        if self.model != 'OCN':
+            df = self._regrid_dataarray()
+
+        slice_time_range = self.time_range(start_time, end_time, slice_obj=True)
+        df = df.sel(time=slice_time_range)
 
-        values = {}
-        for var in vars:
-            region_df = self.regional_cut(vars[var], (-180,180),
-                                    start_time=start_time, end_time=end_time)
+        area = self.earth_area_grid(df.latitude.values,
+                                    df.longitude.values) * 1e-12
 
-            values[var] = region_df.values
+        totals = regions.integrate(df, area, scale=units.step_seconds(
+            df.time, self.time_resolution, self.month_length))
+
+        # .data keeps dask arrays lazy.
+        values = {f"{region}_Land": totals.sel(region=region).data
+                  for region in regions.names}
+
+        return xr.Dataset(
+            {key: (('time'), value) for (key, value) in values.items()},
+            coords={'time': (('time'), self._output_time(start_time, end_time))}
+        )
+
+    def _output_time(self, start_time, end_time):
+        """ Returns the time points of the integrated outputs as datetimes.
+        """
 
         slice_time_range = self.time_range(start_time, end_time, slice_obj=True)
 
         ds_time = []
         try:
-            for time in df.sel(time=slice_time_range).time.values:
+            for time in self.data.sel(time=slice_time_range).time.values:
                 time_value = datetime.strptime(time.strftime('%Y-%m'), '%Y-%m')
                 ds_time.append(time_value)
         except AttributeError:
-            ds_time = df.sel(time=slice_time_range).time.values
-
-        ds = xr.Dataset(
-            {key: (('time'), value) for (key, value) in values.items()},
-            coords={'time': (('time'), ds_time)}
-        )
+            ds_time = self.data.sel(time=slice_time_range).time.values
 
-        self.lat_split_ds = ds
-
-        return ds
+        return ds_time
 
     def seasonal_uptake(self):
         """If data is monthly resolved, split the dataset into negative values
@@ -369,28 +469,10 @@ class SpatialAgg:
 
         ds = self.lat_split_ds
 
-        index = pd.to_datetime(ds.time.values).year.unique()
         variables = [
             'Earth_Land', 'South_Land', 'Tropical_Land', 'North_Land']
 
-        summer, winter = {}, {}
-        for variable in variables:
-            winter[variable], summer[variable] = [], []
-            for time in index:
-                year = ds[variable].sel(time=str(time)).values
-                winter[variable].append(year[year >= 0].sum())
-                summer[variable].append(year[year < 0].sum())
-
-        summer_ds = xr.Dataset(
-            {key: (('time'), value) for (key, value) in summer.items()},
-            coords={'time': (('time'), pd.to_datetime(index, format='%Y'))}
-        )
-        winter_ds = xr.Dataset(
-            {key: (('time'), value) for (key, value) in winter.items()},
-            coords={'time': (('time'), pd.to_datetime(index, format='%Y'))}
-        )
-
-        return {'summer': summer_ds, 'winter': winter_ds}
+        return temporal.TemporalAgg(ds[variables]).seasonal()
 
 
 class Analysis:
@@ -447,10 +529,11 @@ class Analysis:
         if time == None:
             time = slice(self.data.time.values[0], self.data.time.values[-1])
 
+        from core import plotting
+
         df = self.data[variable].sel(time=time)
 
-        plt.figure(figsize=(20,10))
-        return plt.plot(df.time.values, df.values)
+        return plotting.timeseries(df.time.values, df.values)
 
     def _time_to_CO2(self, time):
         """ Converts any time series array to corresponding atmospheric CO2
@@ -491,7 +574,8 @@ class Analysis:
         except AttributeError:
             return CO2.loc[index_to_pass].values
 
-    def cascading_window_trend(self, variable='Earth_Land', window_size=10, plot=False):
+    def cascading_window_trend(self, variable='Earth_Land', window_size=10,
+                               indep="CO2", plot=False, pearson=False):
         """ Calculates the slope of the trend of an uptake variable for each
         time window and for a given window size. The function also plots the
         slopes as a timeseries and, if prompted, the r-value of each slope as
@@ -510,10 +594,20 @@ class Analysis:
             size of time window of trends (in years).
             Defaults to 25.
 
+        indep: string, optional
+
+            Regress uptake variable over "CO2" or "time".
+            Defaults to "CO2".
+
         plot: bool, optional
 
             Option to show plots of the slopes.
             Defaults to False.
+
+        pearson: bool, optional
+
+            If True, also return the Pearson r-value of each window.
+            Defaults to False.
         """
 
         df = self.data.sel(time=slice('1959', '2017'))
@@ -528,13 +622,29 @@ class Analysis:
             index=index
         )
 
-        cwt = []
+        if indep == "CO2":
+            x = cwt_df.CO2.values
+        elif indep == "time":
+            x = cwt_df.index.values
+        else:
+            raise ValueError("indep must be 'CO2' or 'time'.")
+
+        from scipy import stats
+
+        cwt, rvalues = [], []
         for i in range(len(cwt_df) - window_size):
-            sub_df = cwt_df.iloc[i:i+window_size]
-            slope = stats.linregress(sub_df.CO2.values, sub_df.U.values).slope
-            cwt.append(slope)
+            linreg = stats.linregress(x[i:i+window_size],
+                                      cwt_df.U.values[i:i+window_size])
+            cwt.append(linreg.slope)
+            rvalues.append(linreg.rvalue)
 
-        return pd.DataFrame({'CWT': cwt}, index=cwt_df.index[:-window_size]).CWT
+        cwt_df = pd.DataFrame({'CWT': cwt, 'r': rvalues},
+                              index=cwt_df.index[:-window_size])
+
+        if pearson:
+            return cwt_df.CWT, cwt_df.r
+
+        return cwt_df.CWT
 
     def psd(self, variable, fs, xlim=None, plot=False):
         """ Calculates the power spectral density (psd) of a timeseries of a
@@ -584,22 +694,14 @@ class Analysis:
                 period = ""
                 unit = ""
 
+        from scipy import signal
+
         freqs, spec = signal.welch(df[variable].values, fs=fs)
 
         if plot:
-            plt.figure(figsize=(12,9))
-
-            plt.subplot(211)
-            plt.plot(df.time, df[variable].values)
-
-            plt.subplot(212)
-            plt.semilogy(1/freqs, spec)
-            plt.gca().invert_xaxis()
-            plt.xlim(xlim)
-
-            plt.title(f"Power Spectrum of {variable}")
-            plt.xlabel(f"Period{period}")
-            plt.ylabel(f"Spectral Variance {unit}")
+            from core import plotting
+            plotting.psd(df.time, df[variable].values, freqs, spec, variable,
+                         period, unit, xlim)
 
         return pd.DataFrame({f"Period{period}": 1/freqs,
         f"Spectral Variance {unit}": spec}, index=freqs)
@@ -617,6 +719,8 @@ class Analysis:
 
         """
 
+        from scipy import signal
+
         x = self.data[variable].values
 
         fs = 12
@@ -627,7 +731,8 @@ class Analysis:
 
         return signal.filtfilt(b, a, x)
 
-    def bandpass(self, variable, fc, fs=1, order=5, btype="low"):
+    def bandpass(self, variable, fc, fs=1, order=5, btype="low",
+                 deseasonalise_first=False):
         """ Applies a bandpass filter to a dataset (either lowpass, highpass
         or bandpass) using the scipy.signal.butter function.
 
@@ -656,14 +761,25 @@ class Analysis:
             options are low, high and band.
             Defaults to low.
 
+        deseasonalise_first: bool, optional
+
+            If True, filter the deseasonalised timeseries (see deseasonalise)
+            instead.
+            Defaults to False.
+
         """
 
-        x = self.data[variable].values
+        if deseasonalise_first:
+            x = self.deseasonalise(variable)
+        else:
+            x = self.data[variable].values
 
         if btype == "band":
             assert type(fc) == list, "fc must be a list of two values."
             fc = np.array(fc)
 
+        from scipy import signal
+
         w = fc / (fs / 2) # Normalize the frequency.
         b, a = signal.butter(order, w, btype)
 
@@ -695,16 +811,17 @@ class ModelEvaluation(Analysis):
         start_year = _time.year[0]
         end_year = _time.year[-1]
 
-        GCP = (pd
-               .read_csv(MAIN_DIR + "data/GCP/budget.csv",
-                         index_col=0,
-                         usecols=[0,4,5,6]
-                        )
+        # The csv files are read once per process and shared between
+        # instances.
+        GCP = (GCPf
+               .cached_csv(GCPf.GCP_FNAME, 0)
+               .iloc[:, [3,4,5]]
                .loc[start_year:end_year]
               )
 
-        GCP['CO2'] = pd.read_csv(MAIN_DIR + "data/CO2/co2_year.csv",
-        index_col=0, header=0)[2:]
+        CO2 = GCPf.cached_csv(GCPf.CO2_FNAME, 'Year')['CO2']
+        self.CO2 = CO2
+        GCP['CO2'] = CO2.iloc[2:]
         GCP['land sink'] = GCP['land sink']
         GCP['ocean sink'] = GCP['ocean sink']
         GCP.rename(columns={"ocean sink": "ocean",
@@ -741,42 +858,18 @@ class ModelEvaluation(Analysis):
         df = self.data
         GCP = self.GCP
 
-        linreg = stats.linregress(GCP[sink].values, df[model_sink].values)
+        from scipy import stats
 
-        def timeseries_plot():
-            plt.subplot(211).plot(GCP.index, GCP[sink])
-            plt.subplot(211).plot(GCP.index, df[model_sink].values)
-            plt.legend(["GCP", "Model"], fontsize=16)
-            plt.xlabel("Year", fontsize=16)
-            plt.ylabel("C flux to the atmosphere (GtC/yr)", fontsize=16)
-
-        def scatter_plot():
-            x = GCP[sink].values
-            y = df[model_sink].values
-            yy = linreg.slope * GCP[sink].values + linreg.intercept
-            plt.subplot(212).scatter(x, y)
-            plt.subplot(212).plot(x, yy, color='r')
-            plt.xlabel("GCP (GtC/yr)", fontsize=16)
-            plt.ylabel("Model (GtC/yr)", fontsize=16)
-
-            xloc = 0.03 * (x.max() - x.min()) + x.min()
-            yloc = 0.05 * (y.max() - y.min()) + y.min()
-            text = (
-                f'slope = {linreg.slope:.2f}\n'
-                f'r = {linreg.rvalue:.2f}'
-            )
-            plt.text(xloc, yloc, text, fontsize=16)
+        linreg = stats.linregress(GCP[sink].values, df[model_sink].values)
 
         if plot:
-            plt.figure(figsize=(20,12))
-
-            if plot == "timeseries":
-                timeseries_plot()
-            elif plot == "scatter":
-                scatter_plot()
-            elif plot == "both":
-                timeseries_plot()
-                scatter_plot()
+            from core import plotting
+            plotting.regression_to_GCP(plot, GCP.index, GCP[sink].values,
+                                       df[model_sink].values, linreg,
+                                       "Year",
+                                       "C flux to the atmosphere (GtC/yr)",
+                                       "(GtC/yr)",
+                                       text_loc=(0.03, 0.05))
 
         return linreg
 
@@ -813,6 +906,8 @@ class ModelEvaluation(Analysis):
         model_sink = "Earth_Land"
         GCP_sink = "land sink"
 
+        from scipy import stats
+
         df = self.data
 
         model_roll = (
@@ -822,59 +917,32 @@ class ModelEvaluation(Analysis):
             .squeeze()
         )
 
-        GCP_roll_df = (
-        GCPf
-            .Analysis(GCP_sink)
-            .cascading_window_trend(indep, window_size=window_size)
-        )
+        # The GCP trends are computed once per (sink, window_size, indep).
+        GCP_roll_df = GCPf.reference_cwt(GCP_sink, window_size, indep)
+
+        # Windows are labelled by their start year.
+        start_years = self.GCP.index[:-window_size]
+        GCP_roll = GCP_roll_df.loc[start_years.year].values.squeeze()
 
         if indep == "CO2":
-            index = self._time_to_CO2(self.GCP.index[:-window_size])
-            GCP_roll = GCP_roll_df.loc[index].values.squeeze()
+            index = self._time_to_CO2(start_years)
             xlabel = "CO2 (ppm)"
             cascading_yunit = "(GtC/ppm/yr)"
         elif indep == "time":
-            index = self.GCP.index[:-window_size]
-            GCP_roll = GCP_roll_df.loc[index.year].values.squeeze()
+            index = start_years
             xlabel = "Year"
             cascading_yunit = "(GtC/ppm$^2$)"
 
         linreg = stats.linregress(GCP_roll, model_roll)
 
-        def timeseries_plot():
-            plt.subplot(211).plot(index, GCP_roll)
-            plt.subplot(211).plot(index, model_roll)
-            plt.legend(["GCP", "model"], fontsize=16)
-            plt.xlabel(xlabel, fontsize=16)
-            plt.ylabel(f"Slope of C flux trend {cascading_yunit}", fontsize=16)
-
-        def scatter_plot():
-            x = GCP_roll
-            y = model_roll
-            yy = GCP_roll * linreg.slope + linreg.intercept
-            plt.subplot(212).scatter(x, y)
-            plt.subplot(212).plot(x, yy, color='r')
-            plt.xlabel(f"GCP {cascading_yunit}", fontsize=16)
-            plt.ylabel(f"Model {cascading_yunit}", fontsize=16)
-
-            xloc = 0.05 * (x.max() - x.min()) + x.min()
-            yloc = 0.85 * (y.max() - y.min()) + y.min()
-            text = (
-                f'slope = {linreg.slope:.2f}\n'
-                f'r = {linreg.rvalue:.2f}'
-            )
-            plt.text(xloc, yloc, text, fontsize=16)
-
         if plot:
-            plt.figure(figsize=(20,12))
-
-            if plot == "timeseries":
-                timeseries_plot()
-            elif plot == "scatter":
-                scatter_plot()
-            elif plot == "both":
-                timeseries_plot()
-                scatter_plot()
+            from core import plotting
+            plotting.regression_to_GCP(plot, index, GCP_roll, model_roll,
+                                       linreg, xlabel,
+                                       f"Slope of C flux trend {cascading_yunit}",
+                                       cascading_yunit,
+                                       legend=("GCP", "model"),
+                                       text_loc=(0.03, 0.05))
 
         return linreg
 
@@ -898,12 +966,14 @@ class ModelEvaluation(Analysis):
         df = self.data
         GCP = self.GCP
 
+        from scipy import stats
+
         GCP_stats = stats.linregress(GCP.index.year, GCP[sink].values)
         model_stats = stats.linregress(GCP.index.year, df[model_sink].values)
 
         if plot:
-            plt.bar(["GCP", "Model"], [GCP_stats[0], model_stats[0]])
-            plt.ylabel("Trend (GtC/yr)", fontsize=14)
+            from core import plotting
+            plotting.trend_bar(GCP_stats[0], model_stats[0])
 
         trend_stats = namedtuple('Trend', ['GCP_slope', 'model_slope', 'diff'])
 
@@ -924,4 +994,6 @@ class ModelEvaluation(Analysis):
 
         """
 
-        return pd.plotting.autocorrelation_plot(self.data[variable].values)
+        from core import plotting
+
+        return plotting.autocorrelation(self.data[variable].values)
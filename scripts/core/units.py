@@ -0,0 +1,149 @@
+""" Conversion of integrated flux rates to totals per time step.
+
+The spatial integrations give a flux rate per time step: per year for the
+inversions (PgC/yr) and per second for TRENDY (PgC/s). Traditionally, every
+month is converted with a fixed length of 30 days (30/365 of a year, or
+30*24*3600 seconds), so that the twelve months of a year sum to 360 days and
+annual totals are about 1.4% low. With month_length='calendar', the exact
+length of each time step is taken from the calendar of the time axis
+(standard, noleap, 360_day, etc.):
+
+    month_length    year fraction               seconds
+    'fixed'         30 / 365                    30 * 24 * 3600
+    'calendar'      days in month / in year     days in month * 24 * 3600
+
+The calendar lengths are computed once per time axis and cached. The 'fixed'
+factors are scalars, so converting the summed timeseries allocates nothing
+either way. The default is read from the PIPELINE_MONTH_LENGTH environment
+variable, and 'fixed' if it is not set.
+"""
+
+
+""" IMPORTS """
+import os
+import functools
+import numpy as np
+
+
+""" INPUTS """
+MONTH_LENGTH_ENV = "PIPELINE_MONTH_LENGTH"
+MONTH_LENGTH = os.environ.get(MONTH_LENGTH_ENV) or 'fixed'
+
+FIXED_MONTH_DAYS = 30
+FIXED_YEAR_DAYS = 365
+SECONDS_PER_DAY = 24 * 3600
+
+
+""" FUNCTIONS """
+def _check(month_length):
+    month_length = month_length or MONTH_LENGTH
+    if month_length not in ('fixed', 'calendar'):
+        raise ValueError("month_length must be 'fixed' or 'calendar', not "
+                         f"{month_length!r}.")
+    return month_length
+
+def calendar(time):
+    """ Returns the calendar of a time coordinate: that of its cftime dates,
+    or 'standard' for numpy datetimes.
+    """
+
+    first = np.asarray(time).flat[0]
+    return getattr(first, 'calendar', 'standard') or 'standard'
+
+def _days(calendar, year, month, months):
+    """ Returns the number of days of the months months long from year and
+    month in calendar.
+    """
+
+    import cftime
+
+    end_year, end_month = divmod(year * 12 + month - 1 + months, 12)
+
+    start = cftime.datetime(year, month, 1, calendar=calendar)
+    end = cftime.datetime(end_year, end_month + 1, 1, calendar=calendar)
+
+    return (end - start).days
+
+@functools.lru_cache(maxsize=128)
+def _calendar_factors(calendar, years, months, freq):
+    """ Returns the read-only arrays of the days, year fractions and seconds
+    of each time step (months, or years if freq is 'Y') of a time axis.
+    """
+
+    if freq == 'M':
+        days = [_days(calendar, year, month, 1)
+                for year, month in zip(years, months)]
+    else:
+        days = [_days(calendar, year, 1, 12) for year in years]
+
+    days = np.array(days, dtype=float)
+    year_days = np.array([_days(calendar, year, 1, 12) for year in years],
+                         dtype=float)
+
+    factors = {'days': days, 'year_fractions': days / year_days,
+               'seconds': days * SECONDS_PER_DAY}
+    for factor in factors.values():
+        factor.setflags(write=False)
+
+    return factors
+
+def _factors(time, freq, month_length):
+    """ Returns None if month_length is 'fixed', else the cached calendar
+    factors of time.
+    """
+
+    if _check(month_length) == 'fixed':
+        return None
+
+    return _calendar_factors(calendar(time.values),
+                             tuple(time.dt.year.values.tolist()),
+                             tuple(time.dt.month.values.tolist()),
+                             'M' if freq == 'M' else 'Y')
+
+def step_days(time, freq='M', month_length=None):
+    """ Returns the number of days of each time step of a time coordinate:
+    the fixed month length (a scalar) or a cached array of the calendar
+    lengths of each month (or year if freq is 'Y').
+
+    Parameters
+    ==========
+
+    time: xr.DataArray
+
+        time coordinate of numpy datetimes or cftime dates.
+
+    freq: string, optional
+
+        'M' for monthly or 'Y' for yearly time steps. The fixed length of
+        both is FIXED_MONTH_DAYS, as in the original outputs.
+        Defaults to 'M'.
+
+    month_length: string, optional
+
+        'fixed' or 'calendar'.
+        Defaults to None, which uses MONTH_LENGTH.
+
+    """
+
+    factors = _factors(time, freq, month_length)
+    return float(FIXED_MONTH_DAYS) if factors is None else factors['days']
+
+def year_fractions(time, freq='M', month_length=None):
+    """ Returns the fraction of a year of each time step of a time coordinate,
+    to convert rates per year to totals per time step. See step_days for the
+    parameters.
+    """
+
+    factors = _factors(time, freq, month_length)
+    return (FIXED_MONTH_DAYS / FIXED_YEAR_DAYS if factors is None
+            else factors['year_fractions'])
+
+def step_seconds(time, freq='M', month_length=None):
+    """ Returns the number of seconds of each time step of a time coordinate,
+    to convert rates per second to totals per time step. See step_days for
+    the parameters.
+    """
+
+    factors = _factors(time, freq, month_length)
+    return (float(FIXED_MONTH_DAYS * SECONDS_PER_DAY) if factors is None
+            else factors['seconds'])
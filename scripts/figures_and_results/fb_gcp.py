@@ -1,7 +1,7 @@
 """ IMPORTS """
 import numpy as np
 import pandas as pd
-import xarray as xr
+from core import storage
 
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -25,8 +25,8 @@ Ul = U['land sink']
 Uo = U['ocean sink']
 
 C = pd.read_csv(INPUT_DIRECTORY + 'CO2/co2_year.csv',index_col='Year').CO2[2:]
-T = (xr
-        .open_dataset('./../../output/TEMP/spatial/output_all/HadCRUT/year.nc')
+T = (storage
+        .open_output('./../../output/TEMP/spatial/output_all/HadCRUT', 'year')
         .sel(time=slice("1959", "2018"))
     )
 T= T.Earth
@@ -10,6 +10,7 @@ from scipy import signal
 
 import os
 from core import FeedbackAnalysis
+from core import storage
 
 
 """ INPUTS """
@@ -24,8 +25,8 @@ co2 = {
 }
 
 temp = {
-    "year": xr.open_dataset(OUTPUT_DIR + f'TEMP/spatial/output_all/HadCRUT/year.nc'),
-    "month": xr.open_dataset(OUTPUT_DIR + f'TEMP/spatial/output_all/HadCRUT/month.nc')
+    "year": storage.open_output(OUTPUT_DIR + 'TEMP/spatial/output_all/HadCRUT', 'year'),
+    "month": storage.open_output(OUTPUT_DIR + 'TEMP/spatial/output_all/HadCRUT', 'month')
 }
 
 temp_zero = {}
@@ -41,25 +42,25 @@ invf_uptake = {'year': {}, 'winter': {}, 'summer': {}}
 for timeres in invf_uptake:
     for model in invf_models:
         model_dir = INV_DIRECTORY + model + '/'
-        invf_uptake[timeres][model] = xr.open_dataset(model_dir + f'{timeres}.nc')
+        invf_uptake[timeres][model] = storage.open_output(model_dir, timeres)
 
 
 trendy_models = ['VISIT', 'OCN', 'JSBACH', 'CLASS-CTEM', 'CABLE-POP']
 trendy_uptake = {
     "S1": {
-        "year": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp/year.nc')
+        "year": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp', 'year')
         for model_name in trendy_models},
-        "summer": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp/summer.nc')
+        "summer": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp', 'summer')
         for model_name in trendy_models},
-        "winter": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp/winter.nc')
+        "winter": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp', 'winter')
         for model_name in trendy_models}
     },
     "S3": {
-        "year": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp/year.nc')
+        "year": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp', 'year')
         for model_name in trendy_models},
-        "summer": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp/summer.nc')
+        "summer": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp', 'summer')
         for model_name in trendy_models},
-        "winter": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp/winter.nc')
+        "winter": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp', 'winter')
         for model_name in trendy_models},
     }
 }
@@ -11,7 +11,7 @@ import seaborn as sns
 sns.set_style('darkgrid')
 
 import os
-from core import FeedbackAnalysis
+from core import feedbacks
 
 import fb_input_data as fb_id
 
@@ -73,7 +73,7 @@ def feedback_regression(timeres, variable):
 def all_regstat(timeres, variable):
     uptake = fb_id.invf_uptake[timeres]
 
-    df = FeedbackAnalysis.INVF(
+    df = feedbacks.invf(
                                 fb_id.co2['year'],
                                 fb_id.temp['year'],
                                 uptake,
@@ -89,7 +89,7 @@ def all_regstat(timeres, variable):
 def mean_regstat(timeres, variable):
     uptake = fb_id.invf_uptake[timeres]
 
-    df = FeedbackAnalysis.INVF(
+    df = feedbacks.invf(
                                 fb_id.co2['year'],
                                 fb_id.temp['year'],
                                 uptake,
@@ -118,7 +118,7 @@ def mean_regstat(timeres, variable):
 def median_regstat(timeres, variable):
     uptake = fb_id.invf_uptake[timeres]
 
-    df = FeedbackAnalysis.INVF(
+    df = feedbacks.invf(
                                 fb_id.co2['year'],
                                 fb_id.temp['year'],
                                 uptake,
@@ -176,7 +176,7 @@ def fb_inv(save=False):
     fb_inv_df = {}
 
     for subplot, region in zip(["211", "212"], ["Land", "Ocean"]):
-        df = FeedbackAnalysis.INVF(
+        df = feedbacks.invf(
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
                                     uptake,
@@ -248,7 +248,7 @@ def fb_seasonal_inv(save=False):
     fb_inv_df = {}
 
     for subplot, time in zip(["211", "212"], timeres):
-        df = FeedbackAnalysis.INVF(
+        df = feedbacks.invf(
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
                                     uptake[time],
@@ -332,7 +332,7 @@ def fb_regional_inv(save=False):
     for subplot, parameter in zip(all_subplots, parameters):
         for var, color, bar_pos in zip(vars, colors, bar_position):
             variable = var + parameter[1]
-            df = FeedbackAnalysis.INVF(
+            df = feedbacks.invf(
                                         fb_id.co2['year'],
                                         fb_id.temp['year'],
                                         uptake,
@@ -395,7 +395,7 @@ def fb_seasonal_regional_inv(save=False):
         parameter, time = pro
         for var, color, bar_pos in zip(vars, colors, bar_position):
             variable = var + parameter[1]
-            df = FeedbackAnalysis.INVF(
+            df = feedbacks.invf(
                                         fb_id.co2['year'],
                                         fb_id.temp['year'],
                                         uptake[time],
@@ -458,7 +458,7 @@ def fb_regional_inv2(save=False):
     ymin_ocean, ymax_ocean = [], []
     for subplot, var in zip(all_subplots, vars):
 
-        df = FeedbackAnalysis.INVF(
+        df = feedbacks.invf(
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
                                     uptake,
@@ -542,7 +542,7 @@ def fb_seasonal_regional_inv2(save=False):
         variable = var[0] + '_Land'
         time = var[1]
 
-        df = FeedbackAnalysis.INVF(
+        df = feedbacks.invf(
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
                                     uptake[time],
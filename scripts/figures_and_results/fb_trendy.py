@@ -12,6 +12,7 @@ sns.set_style('darkgrid')
 
 import os
 from core import FeedbackAnalysis
+from core import feedbacks
 
 import fb_input_data as fb_id
 
@@ -107,7 +108,7 @@ def all_regstat(timeres, variable):
     all_regstats = {}
 
     for simulation in ['S1', 'S3']:
-        df = FeedbackAnalysis.TRENDY(
+        df = feedbacks.trendy(
                                     timeres,
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
@@ -124,7 +125,7 @@ def median_regstat(timeres, variable):
     median_regstats = {}
 
     for simulation in ["S1", "S3"]:
-        df = FeedbackAnalysis.TRENDY(
+        df = feedbacks.trendy(
                                     timeres,
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
@@ -202,7 +203,7 @@ def fb_trendy(timeres='year', save=False):
         color = param_details[parameter]['color']
         label = param_details[parameter]['label']
 
-        df = FeedbackAnalysis.TRENDY(
+        df = feedbacks.trendy(
                                     timeres,
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
@@ -275,7 +276,7 @@ def fb_trendy_seasonal(save=False):
             color = param_details[parameter]['color']
             label = param_details[parameter]['label']
 
-            df = FeedbackAnalysis.TRENDY(
+            df = feedbacks.trendy(
                                         timeres,
                                         fb_id.co2['year'],
                                         fb_id.temp['year'],
@@ -336,7 +337,7 @@ def fb_regional_trendy(timeres='year', save=False):
 
     for subplot, parameter in zip(all_subplots, parameters):
         for var, color, bar_pos in zip(vars, colors, bar_position):
-            df = FeedbackAnalysis.TRENDY(
+            df = feedbacks.trendy(
                                         timeres,
                                         fb_id.co2['year'],
                                         fb_id.temp['year'],
@@ -397,7 +398,7 @@ def fb_regional_trendy2(timeres='year', save=False):
 
     ymin, ymax = [], []
     for subplot, var in zip(all_subplots, vars):
-        df = FeedbackAnalysis.TRENDY(
+        df = feedbacks.trendy(
                                     timeres,
                                     fb_id.co2['year'],
                                     fb_id.temp['year'],
@@ -469,7 +470,7 @@ def fb_regional_trendy_seasonal2(save=False):
         ymin, ymax = [], []
         fb_trendy_df[timeres] = {}
         for subplot, var in zip(subplots, vars):
-            df = FeedbackAnalysis.TRENDY(
+            df = feedbacks.trendy(
                                         timeres,
                                         fb_id.co2['year'],
                                         fb_id.temp['year'],
@@ -10,6 +10,7 @@ from copy import deepcopy
 
 from core import inv_flux as invf
 from core import trendy_flux as TRENDYf
+from core import storage
 
 import os
 
@@ -57,10 +58,10 @@ summer_invf = {}
 winter_invf = {}
 for model in os.listdir(INV_DIRECTORY):
     model_dir = INV_DIRECTORY + model + '/'
-    year_invf[model] = invf.Analysis(xr.open_dataset(model_dir + 'year.nc'))
-    month_invf[model] = invf.Analysis(xr.open_dataset(model_dir + 'month.nc'))
-    summer_invf[model] = invf.Analysis(xr.open_dataset(model_dir + 'summer.nc'))
-    winter_invf[model] = invf.Analysis(xr.open_dataset(model_dir + 'winter.nc'))
+    year_invf[model] = invf.Analysis(storage.open_output(model_dir, 'year'))
+    month_invf[model] = invf.Analysis(storage.open_output(model_dir, 'month'))
+    summer_invf[model] = invf.Analysis(storage.open_output(model_dir, 'summer'))
+    winter_invf[model] = invf.Analysis(storage.open_output(model_dir, 'winter'))
 
 year_S1_trendy = {}
 year_S3_trendy = {}
@@ -74,24 +75,24 @@ for model in os.listdir(TRENDY_DIRECTORY):
     model_dir = TRENDY_DIRECTORY + model + '/'
 
     if 'S1' in model:
-        year_S1_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'year.nc'))
-        month_S1_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'month.nc'))
-        summer_S1_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'summer.nc'))
-        winter_S1_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'winter.nc'))
+        year_S1_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'year'))
+        month_S1_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'month'))
+        summer_S1_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'summer'))
+        winter_S1_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'winter'))
 
     elif 'S3' in model:
-        year_S3_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'year.nc'))
-        month_S3_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'month.nc'))
-        summer_S3_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'summer.nc'))
-        winter_S3_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'winter.nc'))
+        year_S3_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'year'))
+        month_S3_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'month'))
+        summer_S3_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'summer'))
+        winter_S3_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'winter'))
 
 year_mean = {
-    "S1": TRENDYf.Analysis(xr.open_dataset(TRENDY_MEAN_DIRECTORY + 'S1/year.nc')),
-    "S3": TRENDYf.Analysis(xr.open_dataset(TRENDY_MEAN_DIRECTORY + 'S3/year.nc'))
+    "S1": TRENDYf.Analysis(storage.open_output(TRENDY_MEAN_DIRECTORY + 'S1', 'year')),
+    "S3": TRENDYf.Analysis(storage.open_output(TRENDY_MEAN_DIRECTORY + 'S3', 'year'))
 }
 month_mean = {
-    "S1": TRENDYf.Analysis(xr.open_dataset(TRENDY_MEAN_DIRECTORY + 'S1/month.nc')),
-    "S3": TRENDYf.Analysis(xr.open_dataset(TRENDY_MEAN_DIRECTORY + 'S3/month.nc'))
+    "S1": TRENDYf.Analysis(storage.open_output(TRENDY_MEAN_DIRECTORY + 'S1', 'month')),
+    "S3": TRENDYf.Analysis(storage.open_output(TRENDY_MEAN_DIRECTORY + 'S3', 'month'))
 }
 
 co2 = pd.read_csv("./../../data/CO2/co2_year.csv").CO2[2:]
@@ -3,7 +3,6 @@ import matplotlib.pyplot as plt
 from scipy import stats, signal
 import pandas as pd
 import numpy as np
-import xarray as xr
 
 import seaborn as sns
 sns.set_style('darkgrid')
@@ -14,6 +13,7 @@ sys.path.append('../core')
 import GCP_flux as GCPf
 import inv_flux as invf
 import trendy_flux as TRENDYf
+from core import storage
 
 import os
 
@@ -32,22 +32,22 @@ seasons = ['summer', 'winter']
 year_invf = {}
 for model in os.listdir(INV_DIRECTORY):
     model_dir = INV_DIRECTORY + model + '/'
-    year_invf[model] = invf.Analysis(xr.open_dataset(model_dir + 'year.nc'))
+    year_invf[model] = invf.Analysis(storage.open_output(model_dir, 'year'))
 
 seasonal_invf = {'summer': {}, 'winter': {}}
 for season in seasonal_invf:
     for model in os.listdir(INV_DIRECTORY):
         model_dir = INV_DIRECTORY + model + '/'
-        seasonal_invf[season][model] = invf.Analysis(xr.open_dataset(model_dir + f'{season}.nc'))
+        seasonal_invf[season][model] = invf.Analysis(storage.open_output(model_dir, season))
 
 year_S1_trendy = {}
 year_S3_trendy = {}
 for model in os.listdir(TRENDY_DIRECTORY):
     model_dir = TRENDY_DIRECTORY + model + '/'
     if 'S1' in model:
-        year_S1_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'year.nc'))
+        year_S1_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'year'))
     elif 'S3' in model:
-        year_S3_trendy[model] = TRENDYf.Analysis(xr.open_dataset(model_dir + 'year.nc'))
+        year_S3_trendy[model] = TRENDYf.Analysis(storage.open_output(model_dir, 'year'))
 
 seasonal_S1_trendy = {'summer': {}, 'winter': {}}
 seasonal_S3_trendy = {'summer': {}, 'winter': {}}
@@ -55,9 +55,9 @@ for season in seasonal_S1_trendy:
     for model in os.listdir(TRENDY_DIRECTORY):
         model_dir = TRENDY_DIRECTORY + model + '/'
         if 'S1' in model:
-            seasonal_S1_trendy[season][model] = TRENDYf.Analysis(xr.open_dataset(model_dir + f'{season}.nc'))
+            seasonal_S1_trendy[season][model] = TRENDYf.Analysis(storage.open_output(model_dir, season))
         elif 'S3' in model:
-            seasonal_S3_trendy[season][model] = TRENDYf.Analysis(xr.open_dataset(model_dir + f'{season}.nc'))
+            seasonal_S3_trendy[season][model] = TRENDYf.Analysis(storage.open_output(model_dir, season))
 
 
 co2 = pd.read_csv("./../../data/CO2/co2_year.csv").CO2[2:]
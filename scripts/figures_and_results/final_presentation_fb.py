@@ -16,6 +16,7 @@ import GCP_flux as GCPf
 import inv_flux as invf
 import trendy_flux as TRENDYf
 import FeedbackAnalysis
+from core import storage
 
 import os
 
@@ -33,7 +34,7 @@ DIR = './../../'
 OUTPUT_DIR = DIR + 'output/'
 
 co2 = pd.read_csv(DIR + f"data/CO2/co2_year.csv", index_col=["Year"]).CO2
-temp = xr.open_dataset(OUTPUT_DIR + f'TEMP/spatial/output_all/HadCRUT/year.nc')
+temp = storage.open_output(OUTPUT_DIR + 'TEMP/spatial/output_all/HadCRUT', 'year')
 
 temp_zero = xr.Dataset(
     {key: (('time'), np.zeros(len(temp[key]))) for key in ['Earth', 'South', 'Tropical', 'North']},
@@ -45,17 +46,17 @@ invf_uptake = {'year': {}, 'winter': {}, 'summer': {}}
 for timeres in invf_uptake:
     for model in invf_models:
         model_dir = INV_DIRECTORY + model + '/'
-        invf_uptake[timeres][model] = xr.open_dataset(model_dir + f'{timeres}.nc')
+        invf_uptake[timeres][model] = storage.open_output(model_dir, timeres)
 
 
 trendy_models = ['VISIT', 'OCN', 'JSBACH', 'CLASS-CTEM', 'CABLE-POP']
 trendy_uptake = {
         "S1": {'year':
-                {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp/year.nc')
+                {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp', 'year')
                 for model_name in trendy_models}
                 },
         "S3": {'year':
-                {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp/year.nc')
+                {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp', 'year')
                 for model_name in trendy_models}
             }
 }
@@ -68,8 +69,8 @@ Ul = gcp_uptake['land sink']
 Uo = gcp_uptake['ocean sink']
 
 C = pd.read_csv(INPUT_DIRECTORY + 'CO2/co2_year.csv',index_col='Year').CO2[2:]
-T = (xr
-        .open_dataset('./../../output/TEMP/spatial/output_all/HadCRUT/year.nc')
+T = (storage
+        .open_output('./../../output/TEMP/spatial/output_all/HadCRUT', 'year')
         .sel(time=slice("1959", "2018"))
     )
 T= T.Earth
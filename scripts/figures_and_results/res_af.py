@@ -1,5 +1,6 @@
 """ IMPORTS """
 from core import AirborneFraction
+from core import storage
 
 from importlib import reload
 reload(AirborneFraction);
@@ -28,8 +29,8 @@ co2 = {
 }
 
 temp = {
-    "year": xr.open_dataset(OUTPUT_DIR + f'TEMP/spatial/output_all/HadCRUT/year.nc'),
-    "month": xr.open_dataset(OUTPUT_DIR + f'TEMP/spatial/output_all/HadCRUT/month.nc')
+    "year": storage.open_output(OUTPUT_DIR + 'TEMP/spatial/output_all/HadCRUT', 'year'),
+    "month": storage.open_output(OUTPUT_DIR + 'TEMP/spatial/output_all/HadCRUT', 'month')
 }
 
 temp_zero = {}
@@ -45,20 +46,20 @@ invf_uptake = {'year': {}, 'month': {}}
 for timeres in invf_uptake:
     for model in invf_models:
         model_dir = INV_DIRECTORY + model + '/'
-        invf_uptake[timeres][model] = xr.open_dataset(model_dir + f'{timeres}.nc')
+        invf_uptake[timeres][model] = storage.open_output(model_dir, timeres)
 
 trendy_models = ['VISIT', 'OCN', 'JSBACH', 'CLASS-CTEM', 'CABLE-POP']
 trendy_uptake = {
     "S1": {
-        "year": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp/year.nc')
+        "year": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp', 'year')
         for model_name in trendy_models},
-        "month": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp/month.nc')
+        "month": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S1_nbp', 'month')
         for model_name in trendy_models}
     },
     "S3": {
-        "year": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp/year.nc')
+        "year": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp', 'year')
         for model_name in trendy_models},
-        "month": {model_name : xr.open_dataset(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp/month.nc')
+        "month": {model_name : storage.open_output(OUTPUT_DIR + f'TRENDY/spatial/output_all/{model_name}_S3_nbp', 'month')
         for model_name in trendy_models}
     }
 }
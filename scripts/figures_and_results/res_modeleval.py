@@ -3,7 +3,6 @@ import matplotlib.pyplot as plt
 from scipy import stats
 import pandas as pd
 import numpy as np
-import xarray as xr
 from copy import deepcopy
 from itertools import *
 
@@ -13,6 +12,8 @@ sns.set_style('darkgrid')
 import sys
 from core import inv_flux as invf
 from core import trendy_flux as TRENDYf
+from core import ensemble_evaluation
+from core import storage
 
 import os
 
@@ -27,59 +28,48 @@ GCP = pd.read_csv('./../../data/GCP/budget.csv', index_col='Year')[['ocean sink'
 inv_modeleval = {}
 for model in os.listdir(SPATIAL_DIRECTORY):
     model_dir = SPATIAL_DIRECTORY + model + '/'
-    inv_modeleval[model] = invf.ModelEvaluation(xr.open_dataset(model_dir + 'year.nc'))
+    inv_modeleval[model] = invf.ModelEvaluation(storage.open_output(model_dir, 'year'))
 
 trendy_modeleval = {}
 for model in [m for m in os.listdir(TRENDY_DIRECTORY) if 'S3' in m]:
     model_dir = TRENDY_DIRECTORY + model + '/'
-    trendy_modeleval[model] = TRENDYf.ModelEvaluation(xr.open_dataset(model_dir + 'year.nc'))
+    trendy_modeleval[model] = TRENDYf.ModelEvaluation(storage.open_output(model_dir, 'year'))
+
+# All models are evaluated against GCP at once.
+inv_ensemble = ensemble_evaluation.EnsembleEvaluation(
+    {model: inv_modeleval[model].data for model in inv_modeleval}
+)
+trendy_ensemble = ensemble_evaluation.EnsembleEvaluation(
+    {model: trendy_modeleval[model].data for model in trendy_modeleval}
+)
 
 
 """ FUNCTIONS """
 def inv_regress_timeseries():
-    land_stats = {}
-    ocean_stats = {}
-    for model in inv_modeleval:
-        land_stats[model] = inv_modeleval[model].regress_timeseries_to_GCP("land")
-        ocean_stats[model] = inv_modeleval[model].regress_timeseries_to_GCP("ocean")
-
-    stats = {}
-    for var, stat_dict in zip(("land", "ocean"), (land_stats, ocean_stats)):
-        df = pd.DataFrame(stat_dict).iloc[:4].T
-        df.columns = ['slope', 'intercept', 'rvalue', 'pvalue']
-        stats[var] = df
+    df = inv_ensemble.evaluate(window_sizes=())
 
-    return stats
+    return {sink: df.xs(sink, level='sink')[['slope', 'intercept', 'rvalue',
+                                             'pvalue']]
+            for sink in ("land", "ocean")}
 
 def inv_regress_CWT(window_size):
-    land_stats = {}
-    ocean_stats = {}
-    for model in inv_modeleval:
-        land_stats[model] = inv_modeleval[model].regress_cascading_window_trend_to_GCP("land", window_size, indep="CO2")
-        ocean_stats[model] = inv_modeleval[model].regress_cascading_window_trend_to_GCP("ocean", window_size, indep="CO2")
+    df = inv_ensemble.evaluate(window_sizes=(window_size,), indep="CO2")
+    columns = [f'CWT{window_size}_{stat}' for stat in ('slope', 'intercept',
+                                                       'rvalue', 'pvalue')]
 
     stats = {}
-    for var, stat_dict in zip(("land", "ocean"), (land_stats, ocean_stats)):
-        df = pd.DataFrame(stat_dict).iloc[:4].T
-        df.columns = ['slope', 'intercept', 'rvalue', 'pvalue']
-        stats[var] = df
+    for sink in ("land", "ocean"):
+        stats[sink] = df.xs(sink, level='sink')[columns]
+        stats[sink].columns = ['slope', 'intercept', 'rvalue', 'pvalue']
 
     return stats
 
 def inv_compare_trend():
-    land_stats = {}
-    ocean_stats = {}
-    for model in inv_modeleval:
-        land_stats[model] = inv_modeleval[model].compare_trend_to_GCP("land")
-        ocean_stats[model] = inv_modeleval[model].compare_trend_to_GCP("ocean")
+    df = inv_ensemble.evaluate(window_sizes=())
 
-    stats = {}
-    for var, stat_dict in zip(("land", "ocean"), (land_stats, ocean_stats)):
-        df = pd.DataFrame(stat_dict).T
-        df.columns = ['GCP_slope', 'model_slope', 'diff']
-        stats[var] = df
-
-    return stats
+    return {sink: df.xs(sink, level='sink')[['GCP_slope', 'model_slope',
+                                             'diff']]
+            for sink in ("land", "ocean")}
 
 def mean_inv_trend(compare_stats):
     stats = {}
@@ -90,34 +80,25 @@ def mean_inv_trend(compare_stats):
     return stats
 
 def trendy_regress_timeseries():
-    stats = {}
-    for model in trendy_modeleval:
-        stats[model] = trendy_modeleval[model].regress_timeseries_to_GCP()
+    df = trendy_ensemble.evaluate(window_sizes=()).xs('land', level='sink')
 
-    df = pd.DataFrame(stats).iloc[:4].T
-    df.columns = ['slope', 'intercept', 'rvalue', 'pvalue']
-
-    return df
+    return df[['slope', 'intercept', 'rvalue', 'pvalue']]
 
 def trendy_regress_CWT(window_size):
-    stats = {}
-    for model in trendy_modeleval:
-        stats[model] = trendy_modeleval[model].regress_cascading_window_trend_to_GCP(window_size=window_size, indep="CO2")
-
-    df = pd.DataFrame(stats).iloc[:4].T
+    df = (trendy_ensemble
+            .evaluate(window_sizes=(window_size,), indep="CO2")
+            .xs('land', level='sink')
+         )
+    df = df[[f'CWT{window_size}_{stat}' for stat in ('slope', 'intercept',
+                                                     'rvalue', 'pvalue')]]
     df.columns = ['slope', 'intercept', 'rvalue', 'pvalue']
 
     return df
 
 def trendy_compare_trend():
-    stats = {}
-    for model in trendy_modeleval:
-        stats[model] = trendy_modeleval[model].compare_trend_to_GCP()
+    df = trendy_ensemble.evaluate(window_sizes=()).xs('land', level='sink')
 
-    df = pd.DataFrame(stats).T
-    df.columns = ['GCP_slope', 'model_slope', 'diff']
-
-    return df
+    return df[['GCP_slope', 'model_slope', 'diff']]
 
 def mean_trendy_trend(compare_stats):
 
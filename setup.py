@@ -4,5 +4,8 @@ setup(name='masters-project',
       author='Ross Ursino',
       author_email='rursino@student.unimelb.edu.au',
       packages=find_packages('scripts'),
-      package_dir={'': 'scripts'}
+      package_dir={'': 'scripts'},
+      entry_points={
+          'console_scripts': ['carbon-pipeline = core.cli:main']
+      }
      )
@@ -239,3 +239,23 @@ def test_TRENDY_window():
     for decade in class_af['mean'].index:
         assert class_af['mean'].loc[decade] == pytest.approx(test_af, 1e-4)
         assert class_af['std'].loc[decade] == pytest.approx(0.)
+
+def test_af_surface():
+    beta = xr.DataArray(np.full((6, 3), 0.5 / 2.12), dims=('window', 'model'))
+    gamma = xr.DataArray(np.full((6, 3), 0.5), dims=('window', 'model'))
+
+    emission_rates = [0.01, 0.02, 0.03]
+    rhos = [1.5, 1.93]
+    phi = 0.015 / 2.12
+
+    af = AirborneFraction.af_surface(beta, gamma, emission_rates, phi, rhos)
+
+    assert af.dims == ('emission_rate', 'rho', 'window', 'model')
+    assert af.shape == (3, 2, 6, 3)
+
+    for emission_rate, rho in product(emission_rates, rhos):
+        b = 1 / np.log(1 + emission_rate)
+        test_af = 1 / (1 - b * (0.5 / 2.12 + 0.5 * phi / rho))
+
+        assert np.allclose(af.sel(emission_rate=emission_rate, rho=rho),
+                           test_af)
@@ -0,0 +1,144 @@
+""" pytest: GCP_flux module reference trend cache.
+"""
+
+
+""" IMPORTS """
+from core import GCP_flux as GCPf
+from core import inv_flux as invf
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+import tempfile
+import os
+from scipy import stats
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global data_dir, monkeypatch
+
+    rng = np.random.default_rng(0)
+    data_dir = tempfile.mkdtemp()
+
+    years = np.arange(1959, 2019)
+    pd.DataFrame(
+        {
+            'fossil fuel and industry': rng.normal(size=60),
+            'land-use change emissions': rng.normal(size=60),
+            'atmospheric growth': rng.normal(size=60),
+            'ocean sink': 1 + 0.04 * (years - 1959) + rng.normal(0, 0.1, 60),
+            'land sink': 1 + 0.03 * (years - 1959) + rng.normal(0, 0.5, 60),
+            'budget imbalance': rng.normal(size=60)
+        },
+        index=pd.Index(years, name='Year')
+    ).to_csv(os.path.join(data_dir, 'budget.csv'))
+
+    co2_years = np.arange(1957, 2019)
+    pd.DataFrame(
+        {'CO2': 315 + 0.015 * (co2_years - 1957) ** 2},
+        index=pd.Index(co2_years, name='Year')
+    ).to_csv(os.path.join(data_dir, 'co2_year.csv'))
+
+    # Undone in teardown_module, so that later modules read the data folder.
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setattr(GCPf, 'GCP_FNAME', os.path.join(data_dir, 'budget.csv'))
+    monkeypatch.setattr(GCPf, 'CO2_FNAME',
+                        os.path.join(data_dir, 'co2_year.csv'))
+    monkeypatch.setattr(GCPf, 'CACHE_DIR', os.path.join(data_dir, 'cache'))
+
+def teardown_module(module):
+    monkeypatch.undo()
+    GCPf.cached_csv.files.clear()
+    GCPf._CWT_CACHE.clear()
+
+def setup_function(function):
+    GCPf._CWT_CACHE.clear()
+
+
+""" TESTS """
+def test_reference_cwt():
+    """ Check that the cached reference trends equal the trends of Analysis.
+    """
+
+    for indep in ("CO2", "time"):
+        expected = (GCPf
+                      .Analysis("land sink")
+                      .cascading_window_trend(10, indep=indep)
+                   )
+        cwt = GCPf.reference_cwt("land sink", 10, indep)
+
+        pd.testing.assert_series_equal(cwt, expected)
+
+    x = np.arange(1959, 1969)
+    y = GCPf.Analysis("land sink").data.loc[1959:1968].values
+    assert cwt.loc[1959] == pytest.approx(stats.linregress(x, y).slope)
+
+def test_reference_cwt_disk_cache():
+    """ Check that reference trends are read back from the disk cache by
+    other processes and recomputed when the GCP data change.
+    """
+
+    cwt = GCPf.reference_cwt("ocean sink", 25)
+    fnames = os.listdir(GCPf.CACHE_DIR)
+    fname = os.path.join(GCPf.CACHE_DIR,
+                         [f for f in fnames if 'ocean_sink_25' in f][0])
+
+    # A new process only has the disk cache.
+    GCPf._CWT_CACHE.clear()
+    (cwt * 2).to_csv(fname)
+    pd.testing.assert_series_equal(GCPf.reference_cwt("ocean sink", 25),
+                                   cwt * 2)
+
+    # Updating budget.csv changes the cache key.
+    GCPf._CWT_CACHE.clear()
+    stat = os.stat(GCPf.GCP_FNAME)
+    os.utime(GCPf.GCP_FNAME, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    pd.testing.assert_series_equal(GCPf.reference_cwt("ocean sink", 25), cwt)
+
+def test_reference_cwt_memory_cache():
+    """ Check that the reference trends of a process are recomputed when the
+    GCP data change.
+    """
+
+    cwt = GCPf.reference_cwt("land sink", 10)
+    assert GCPf.reference_cwt("land sink", 10).equals(cwt)
+
+    budget = pd.read_csv(GCPf.GCP_FNAME, index_col=0)
+    try:
+        (budget * 2).to_csv(GCPf.GCP_FNAME)
+        stat = os.stat(GCPf.GCP_FNAME)
+        os.utime(GCPf.GCP_FNAME,
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        pd.testing.assert_series_equal(GCPf.reference_cwt("land sink", 10),
+                                       cwt * 2)
+    finally:
+        budget.to_csv(GCPf.GCP_FNAME)
+
+def test_model_evaluation_cwt():
+    """ Check the regression of model trends on the reference GCP trends.
+    """
+
+    years = np.arange(1979, 2018)
+    time = pd.to_datetime([f"{year}-12-31" for year in years])
+    uptake = np.random.default_rng(1).normal(2, 1, years.size)
+    ds = xr.Dataset({'Earth_Land': (('time'), uptake)},
+                    coords={'time': (('time'), time)})
+
+    linreg = (invf
+                .ModelEvaluation(ds)
+                .regress_cascading_window_trend_to_GCP("land", 10,
+                                                       indep="CO2")
+             )
+
+    model_cwt = invf.ModelEvaluation(ds).cascading_window_trend(
+        'Earth_Land', 10, indep="CO2"
+    )
+    GCP_cwt = GCPf.reference_cwt("land sink", 10, "CO2").loc[1979:2007]
+    expected = stats.linregress(GCP_cwt.values, model_cwt.values)
+
+    assert linreg.slope == pytest.approx(expected.slope)
+    assert linreg.rvalue == pytest.approx(expected.rvalue)
@@ -0,0 +1,93 @@
+""" pytest: af_montecarlo module.
+"""
+
+
+""" IMPORTS """
+from core import af_montecarlo
+from core import AirborneFraction
+
+import numpy as np
+import xarray as xr
+
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global params
+
+    rng = np.random.default_rng(0)
+    windows, models = 6, 4
+
+    beta = -0.012 - 0.002 * rng.random((windows, models))
+    gamma = -1.5 + 0.5 * rng.random((windows, models))
+
+    cov = np.zeros((windows, models, 2, 2))
+    cov[..., 0, 0] = 1e-6
+    cov[..., 1, 1] = 0.25
+    cov[..., 0, 1] = cov[..., 1, 0] = -2e-4
+
+    params = AirborneFraction._params_dataset(
+        beta, gamma, cov, np.arange(1960, 2020, 10),
+        [f'model{i}' for i in range(models)]
+    )
+
+    # A model without the first window.
+    for var in params:
+        params[var][0, 0] = np.nan
+
+
+""" TESTS """
+def test_fixed_inputs():
+    """ Check that samples with no uncertainty equal the AF surface.
+    """
+
+    fixed = params.copy()
+    for var in ('var_beta', 'var_gamma', 'cov_beta_gamma'):
+        fixed[var] = fixed[var].where(fixed[var].isnull(), 0.)
+
+    mc = af_montecarlo.AFMonteCarlo(fixed, tcr=2.)
+    samples = mc.sample(10)
+
+    af = AirborneFraction.af_surface(fixed['beta'], fixed['gamma'], 0.02,
+                                     0.015 / 2.12, af_montecarlo.F2X / 2.)
+
+    np.testing.assert_allclose(samples[:, :, :-1],
+                               np.broadcast_to(af.values[0], (10, 6, 4)))
+    assert np.isnan(samples[:, 0, 0]).all()
+    assert np.isfinite(samples[:, 0, -1]).all()
+
+def test_parameter_covariance():
+    """ Check that the sampled parameters follow the OLS covariance.
+    """
+
+    mc = af_montecarlo.AFMonteCarlo(params)
+    chol = mc.chol[1, 1]
+
+    np.testing.assert_allclose(chol @ chol.T,
+                               [[1e-6, -2e-4], [-2e-4, 0.25]])
+
+def test_run():
+    """ Check that the run quantiles match those of the samples of the same
+    RNG streams and do not depend on the number of processes.
+    """
+
+    mc = af_montecarlo.AFMonteCarlo(params, emission_rate=(0.02, 0.002),
+                                    seed=42)
+    ds = mc.run(20000, batch_size=5000, processes=1)
+
+    assert ds['af_quantile'].dims == ('quantile', 'window', 'model')
+    assert list(ds.model.values)[-1] == 'ensemble'
+    assert ds['af_quantile'].sel(window=1960, model='model0').isnull().all()
+
+    seeds = np.random.SeedSequence(42).spawn(4)
+    samples = np.concatenate([mc.sample(5000, seed) for seed in seeds])
+    expected = np.quantile(samples[:, 1:], af_montecarlo.QUANTILES, axis=0)
+
+    np.testing.assert_allclose(ds['af_quantile'].values[:, 1:], expected,
+                               atol=2e-3)
+    np.testing.assert_allclose(ds['mean'].values[1:],
+                               samples[:, 1:].mean(axis=0))
+
+    parallel = mc.run(20000, batch_size=5000, processes=2)
+    xr.testing.assert_identical(ds, parallel)
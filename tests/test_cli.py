@@ -0,0 +1,100 @@
+""" pytest: cli module.
+"""
+
+
+""" IMPORTS """
+from core import cli
+from core import synthetic
+from core import storage
+from core import GCP_flux
+
+import pandas as pd
+
+import pytest
+
+
+""" SETUP """
+@pytest.fixture
+def main_dir(tmp_path, monkeypatch):
+    """ Synthetic data folder and yearly outputs of three inversions.
+    """
+
+    directory = str(tmp_path) + '/'
+    synthetic.write_data_dir(directory)
+
+    monkeypatch.setattr(cli, 'DATA_DIR', directory + 'data/')
+    monkeypatch.setattr(cli, 'OUTPUT_DIR', directory + 'output/')
+    monkeypatch.setattr(GCP_flux, 'GCP_FNAME', directory + 'data/GCP/budget.csv')
+    monkeypatch.setattr(GCP_flux, 'CO2_FNAME',
+                        directory + 'data/CO2/co2_year.csv')
+    GCP_flux.cached_csv.files.clear()
+
+    for i, model in enumerate(('CAMS', 'JENA_s76', 'Rayner')):
+        ds = synthetic.timeseries(seed=i)
+        storage.write_output({'year': ds}, directory +
+                             f'output/inversions/spatial/output_all/{model}/')
+
+    yield directory
+    GCP_flux.cached_csv.files.clear()
+
+def square(x):
+    if x < 0:
+        raise ValueError("negative")
+    return x ** 2
+
+
+""" TESTS """
+def test_run_tasks(tmp_path):
+    """ Check that failed tasks are counted and logged, serially and on
+    worker processes.
+    """
+
+    tasks = [(str(x), square, (x,)) for x in (1, -1, 2, -2, 3)]
+
+    assert cli.run_tasks(tasks, jobs=1) == 2
+    assert cli.run_tasks(tasks, jobs=2) == 2
+    assert cli.run_tasks(tasks[:1], jobs=2) == 0
+
+def test_parser():
+    """ Check the arguments of the commands.
+    """
+
+    args = cli.parser().parse_args(['--jobs', '4', 'spatial', 'TRENDY',
+                                    '--models', 'OCN_S1_nbp'])
+    assert (args.jobs, args.kind, args.models) == (4, 'TRENDY', ['OCN_S1_nbp'])
+    assert args.run is cli.spatial
+
+    with pytest.raises(SystemExit):
+        cli.parser().parse_args(['spatial', 'GCP'])
+
+def test_evaluate(main_dir):
+    """ Check that the evaluate command writes the evaluation of every model.
+    """
+
+    inputs = cli.Inputs()
+    log = main_dir + 'result.log'
+
+    assert cli.main(['--log', log, 'evaluate', 'inversions', '--window-size',
+                     '10', '15'], inputs) == 0
+
+    df = pd.read_csv(main_dir + 'output/inversions/model_evaluation/'
+                     'ensemble_evaluation.csv')
+    assert set(df.iloc[:, 0]) == {'CAMS', 'JENA_s76', 'Rayner'}
+
+    # The reference data are read once.
+    assert inputs.co2('year') is inputs.co2('year')
+    assert inputs.invf_uptake('year').keys() == {'CAMS', 'JENA_s76', 'Rayner'}
+
+def test_failed_tasks(main_dir):
+    """ Check that missing input files fail their task only.
+    """
+
+    log = main_dir + 'result.log'
+
+    assert cli.main(['--log', log, 'spatial', 'inversions', '--models',
+                     'CAMS', 'Rayner']) == 1
+
+    with open(log) as f:
+        lines = f.read()
+    assert 'CAMS :: fail' in lines and 'Rayner :: fail' in lines
+    assert 'JAMSTEC' not in lines
@@ -0,0 +1,45 @@
+""" pytest: cluster module.
+"""
+
+
+""" IMPORTS """
+from core import synthetic
+from core import trendy_flux
+
+import numpy as np
+
+import pytest
+
+distributed = pytest.importorskip('distributed')
+import dask
+from core import cluster
+
+
+""" SETUP """
+def latitudinal_splits(ds, chunks=None):
+    df = trendy_flux.SpatialAgg(ds, chunks=chunks, time_resolution='M',
+                                model='CABLE-POP')
+    return df.latitudinal_splits()
+
+
+""" TESTS """
+def test_compute():
+    """ Check that the latitudinal splits computed on a local cluster match
+    the eager ones, and that a failed collection does not lose the others.
+    """
+
+    cubes = {f'model{i}': synthetic.trendy_cube(5., periods=120, seed=i)
+             for i in range(2)}
+    eager = {name: latitudinal_splits(ds) for name, ds in cubes.items()}
+
+    with cluster.LocalBackend(n_workers=1, memory_limit='1GB',
+                              time_chunk=48, progress=False) as backend:
+        lazy = {name: latitudinal_splits(ds, backend.chunks)
+                for name, ds in cubes.items()}
+        lazy['bad'] = dask.delayed(int)('nan')
+        results = backend.compute(lazy)
+
+    assert isinstance(results['bad'], Exception)
+    for name, ds in eager.items():
+        for var in ds:
+            assert np.allclose(results[name][var], ds[var], equal_nan=True)
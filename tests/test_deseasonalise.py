@@ -0,0 +1,81 @@
+""" pytest: deseasonalise module.
+"""
+
+
+""" IMPORTS """
+from core import deseasonalise
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global models, t
+
+    time = pd.date_range('1980-01', periods=480, freq='MS')
+    t = deseasonalise.decimal_year(xr.DataArray(time, dims='time').time)
+
+    trend = 340 + 1.5 * (t - 1980) + 0.01 * (t - 1980) ** 2
+    seasonal = 3 * np.sin(2 * np.pi * t)
+
+    models = {}
+    for model, scale in (('CAMS', 1), ('JENA', -0.01)):
+        models[model] = xr.Dataset(
+            {
+                'CO2': (('time'), trend + seasonal),
+                'Earth_Land': (('time'), scale * (trend + 2 * seasonal))
+            },
+            coords={'time': (('time'), time)}
+        )
+
+
+""" TESTS """
+def test_decimal_year():
+    """ Check decimal years of monthly numpy and cftime dates.
+    """
+
+    assert t[0] == 1980
+    assert t[6] == pytest.approx(1980.5)
+
+    time = xr.date_range('2000-01', periods=12, freq='MS', calendar='360_day',
+                         use_cftime=True)
+    cf_t = deseasonalise.decimal_year(xr.DataArray(time, dims='time').time)
+    np.testing.assert_allclose(cf_t, 2000 + np.arange(12) / 12)
+
+def test_components():
+    """ Check that the trend, seasonal cycle and growth rate of every series
+    are recovered.
+    """
+
+    ds = deseasonalise.deseasonalise(models)
+    assert set(ds.data_vars) == set(deseasonalise.COMPONENTS)
+    assert ds.trend.dims == ('model', 'variable', 'time')
+
+    co2 = ds.sel(model='CAMS', variable='CO2')
+    np.testing.assert_allclose(co2.trend, 340 + 1.5 * (t - 1980)
+                               + 0.01 * (t - 1980) ** 2, atol=1e-6)
+    np.testing.assert_allclose(co2.seasonal, 3 * np.sin(2 * np.pi * t),
+                               atol=1e-6)
+    np.testing.assert_allclose(co2.growth_rate[1:-1],
+                               1.5 + 0.02 * (t[1:-1] - 1980), atol=1e-3)
+
+    land = ds.sel(model='JENA', variable='Earth_Land')
+    np.testing.assert_allclose(land.seasonal, -0.06 * np.sin(2 * np.pi * t),
+                               atol=1e-6)
+
+def test_missing_values():
+    """ Check that missing values are excluded from the fit.
+    """
+
+    values = models['CAMS'].CO2.values.copy()
+    values[100:110] = np.nan
+
+    complete = deseasonalise.fit(models['CAMS'].CO2.values, t)
+    missing = deseasonalise.fit(values, t)
+
+    np.testing.assert_allclose(missing['function'], complete['function'])
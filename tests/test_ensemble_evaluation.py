@@ -0,0 +1,148 @@
+""" pytest: ensemble_evaluation module.
+"""
+
+
+""" IMPORTS """
+from core import ensemble_evaluation
+from core import GCP_flux
+from core import inv_flux
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+from scipy import stats
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global GCP, co2, models
+
+    rng = np.random.default_rng(0)
+    years = np.arange(1959, 2019)
+
+    GCP = pd.DataFrame(
+        {
+            'land sink': 1 + 0.03 * (years - 1959) + rng.normal(0, 0.5, 60),
+            'ocean sink': 1 + 0.04 * (years - 1959) + rng.normal(0, 0.1, 60)
+        },
+        index=pd.Index(years, name='Year')
+    )
+    co2 = pd.Series(315 + 0.02 * (years - 1959) ** 2 + 0.8 * (years - 1959),
+                    index=years)
+
+    def dataset(start, end, variables):
+        time = pd.to_datetime([f"{year}-12-31" for year in range(start, end)])
+        return xr.Dataset(
+            {var: (('time'), rng.normal(1, 1, time.size))
+             for var in variables},
+            coords={'time': (('time'), time)}
+        )
+
+    models = {
+        'CAMS': dataset(1979, 2018, ['Earth_Land', 'Earth_Ocean']),
+        'Rayner': dataset(1992, 2009, ['Earth_Land', 'Earth_Ocean']),
+        'CABLE_S3': dataset(1959, 2018, ['Earth_Land'])
+    }
+
+
+""" TESTS """
+def test_timeseries_statistics():
+    """ Check the regression, bias and trend statistics against scipy.
+    """
+
+    df = ensemble_evaluation.EnsembleEvaluation(models, GCP, co2).evaluate()
+
+    assert ('CABLE_S3', 'ocean') not in df.index
+    assert len(df) == 5
+
+    model = models['Rayner'].Earth_Ocean.values
+    gcp = GCP.loc[1992:2008, 'ocean sink'].values
+    linreg = stats.linregress(gcp, model)
+
+    row = df.loc[('Rayner', 'ocean')]
+    assert row.nobs == 17
+    assert row.slope == pytest.approx(linreg.slope)
+    assert row.intercept == pytest.approx(linreg.intercept)
+    assert row.rvalue == pytest.approx(linreg.rvalue)
+    assert row.pvalue == pytest.approx(linreg.pvalue)
+    assert row.bias == pytest.approx((model - gcp).mean())
+    assert row.rmse == pytest.approx(np.sqrt(((model - gcp) ** 2).mean()))
+
+    years = np.arange(1992, 2009)
+    GCP_slope = stats.linregress(years, gcp).slope
+    model_slope = stats.linregress(years, model).slope
+    assert row.GCP_slope == pytest.approx(GCP_slope * 1e3)
+    assert row.model_slope == pytest.approx(model_slope * 1e3)
+    assert row['diff'] == pytest.approx(GCP_slope * 100 / model_slope - 100)
+
+def test_cascading_window_trend_statistics():
+    """ Check the CWT statistics against a loop over windows.
+    """
+
+    df = (ensemble_evaluation
+            .EnsembleEvaluation(models, GCP, co2)
+            .evaluate(window_sizes=(10, 25))
+         )
+
+    model = models['CAMS'].Earth_Land.values
+    gcp = GCP.loc[1979:2017, 'land sink'].values
+    x = co2.loc[1979:2017].values * 2.12
+
+    for window_size in (10, 25):
+        windows = range(model.size - window_size)
+        model_cwt = [stats.linregress(x[i:i+window_size],
+                                      model[i:i+window_size]).slope
+                     for i in windows]
+        GCP_cwt = [stats.linregress(x[i:i+window_size],
+                                    gcp[i:i+window_size]).slope
+                   for i in windows]
+        linreg = stats.linregress(GCP_cwt, model_cwt)
+
+        row = df.loc[('CAMS', 'land')]
+        assert row[f"CWT{window_size}_slope"] == pytest.approx(linreg.slope)
+        assert row[f"CWT{window_size}_rvalue"] == pytest.approx(linreg.rvalue)
+        assert row[f"CWT{window_size}_pvalue"] == pytest.approx(linreg.pvalue)
+
+def test_cascading_window_trend_model_evaluation(tmp_path, monkeypatch):
+    """ Check the CWT regression against
+    inv_flux.ModelEvaluation.regress_cascading_window_trend_to_GCP.
+    """
+
+    budget = pd.DataFrame(
+        {
+            'fossil emissions': 0, 'land-use change emissions': 0,
+            'atmospheric growth': 0, 'ocean sink': GCP['ocean sink'],
+            'land sink': GCP['land sink'], 'budget imbalance': 0
+        },
+        index=GCP.index
+    )
+    budget.to_csv(tmp_path / "budget.csv")
+    years = np.arange(1957, 2019)
+    pd.DataFrame({'CO2': co2.reindex(years).interpolate(
+                      limit_direction='backward')},
+                 index=pd.Index(years, name='Year')
+                ).to_csv(tmp_path / "co2_year.csv")
+
+    monkeypatch.setattr(GCP_flux, 'GCP_FNAME', str(tmp_path / "budget.csv"))
+    monkeypatch.setattr(GCP_flux, 'CO2_FNAME', str(tmp_path / "co2_year.csv"))
+    monkeypatch.setattr(GCP_flux, 'CACHE_DIR', None)
+    monkeypatch.setattr(GCP_flux.cached_csv, 'files', {})
+    monkeypatch.setattr(GCP_flux, '_CWT_CACHE', {})
+
+    for indep in ("CO2", "time"):
+        df = (ensemble_evaluation
+                .EnsembleEvaluation(models, GCP, co2)
+                .evaluate(window_sizes=(10,), indep=indep)
+             )
+        linreg = (inv_flux
+                    .ModelEvaluation(models['CAMS'])
+                    .regress_cascading_window_trend_to_GCP("land", 10, indep)
+                 )
+
+        row = df.loc[('CAMS', 'land')]
+        assert row["CWT10_slope"] == pytest.approx(linreg.slope)
+        assert row["CWT10_rvalue"] == pytest.approx(linreg.rvalue)
+        assert row["CWT10_pvalue"] == pytest.approx(linreg.pvalue)
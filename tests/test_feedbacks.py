@@ -0,0 +1,186 @@
+""" pytest: feedbacks module.
+"""
+
+
+""" IMPORTS """
+from core import feedbacks
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+from statsmodels import api as sm
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global co2, temp, GCP
+
+    rng = np.random.default_rng(0)
+    years = np.arange(1957, 2019)
+
+    co2 = pd.Series(np.linspace(315, 410, years.size),
+                    index=pd.Index(years, name='Year'), name='CO2')
+    temp = xr.Dataset(
+        {'Earth': (('time'), rng.normal(size=years.size))},
+        coords={'time': pd.to_datetime([f'{year}-07-01' for year in years])}
+    )
+
+    GCP = pd.DataFrame(
+        {
+            'land sink': 0.01 * co2.values + rng.normal(size=years.size),
+            'ocean sink': 0.02 * co2.values + rng.normal(size=years.size)
+        },
+        index=pd.Index(years, name='Year')
+    ).loc[1959:]
+
+def setup_function(function):
+    feedbacks.clear()
+
+
+""" TESTS """
+def test_gcp_windows_matches_statsmodels():
+    """ Check the batched sink regressions against statsmodels.
+    """
+
+    windows = ((1960, 1969), (1970, 1979), (2008, 2017))
+    ds = feedbacks.gcp_windows(co2, temp, windows, GCP)
+
+    assert ds['beta'].dims == ('sink', 'window')
+    assert list(ds.window.values) == [1960, 1970, 2008]
+
+    sinks = {
+        'land': GCP['land sink'],
+        'ocean': GCP['ocean sink'],
+        'total': GCP['land sink'] + GCP['ocean sink']
+    }
+    for sink, (start, end) in zip(sinks, windows):
+        X = pd.DataFrame({
+            'CO2': co2.loc[start:end].values,
+            'temp': temp.Earth.sel(time=slice(str(start), str(end))).values
+        })
+        model = sm.OLS(sinks[sink].loc[start:end].values,
+                       sm.add_constant(X)).fit()
+        fit = ds.sel(sink=sink, window=start)
+
+        assert fit['beta'].item() == pytest.approx(model.params['CO2'])
+        assert fit['gamma'].item() == pytest.approx(model.params['temp'])
+        assert fit['var_gamma'].item() == pytest.approx(
+            model.cov_params().loc['temp', 'temp'])
+        assert fit['cov_beta_gamma'].item() == pytest.approx(
+            model.cov_params().loc['CO2', 'temp'])
+
+def test_gcp_windows_cached():
+    """ Check that a fit is computed once per input and window set.
+    """
+
+    windows = ((1960, 1969), (1970, 1979))
+
+    ds = feedbacks.gcp_windows(co2, temp, windows, GCP)
+    assert feedbacks.gcp_windows(co2, temp.Earth, windows, GCP) is not ds
+    assert feedbacks.gcp_windows(co2, temp, windows, GCP) is ds
+    assert feedbacks.gcp_windows(co2, temp, windows[:1], GCP) is not ds
+
+    # Equal copies of the inputs share the fit.
+    assert feedbacks.gcp_windows(co2.copy(), temp.copy(deep=True), windows,
+                                 GCP.copy()) is ds
+
+    feedbacks.clear()
+    assert feedbacks.gcp_windows(co2, temp, windows, GCP) is not ds
+
+def test_cache_bounded(monkeypatch):
+    """ Check that only the most recently used fits are kept.
+    """
+
+    monkeypatch.setattr(feedbacks, 'MAX_FITS', 2)
+    windows = ((1960, 1969), (1970, 1979), (1980, 1989))
+
+    first = feedbacks.gcp_windows(co2, temp, windows[:1], GCP)
+    second = feedbacks.gcp_windows(co2, temp, windows[1:2], GCP)
+    assert feedbacks.gcp_windows(co2, temp, windows[:1], GCP) is first
+
+    feedbacks.gcp_windows(co2, temp, windows[2:], GCP)
+    assert len(feedbacks._FITS) == 2
+    assert feedbacks.gcp_windows(co2, temp, windows[:1], GCP) is first
+    assert feedbacks.gcp_windows(co2, temp, windows[1:2], GCP) is not second
+    assert len(feedbacks._FITS) == 2
+
+def test_lag_scan():
+    """ Check that the lag scan finds the lag of the temperature response,
+    with the fit of each lag matching statsmodels over the common years.
+    """
+
+    rng = np.random.default_rng(1)
+    years = np.arange(1962, 2019)
+
+    # A linear co2 has a constant growth, collinear with the constant.
+    co2_noisy = co2 + rng.normal(0, 0.5, co2.size)
+    C = co2_noisy.loc[1959:].values
+    T = temp.Earth.sel(time=slice('1959', '2018')).values
+
+    # The uptake responds to the temperature of two years before.
+    U = 0.01 * C[3:] + 0.5 * T[1:-2] + rng.normal(0, 0.05, years.size)
+    time = pd.to_datetime([f'{year}-12-31' for year in years])
+    uptake = {'CAMS': xr.Dataset({'Earth_Land': (('time'), U)},
+                                 coords={'time': time})}
+
+    ds = feedbacks.lag_scan(co2_noisy, temp, uptake, ['Earth_Land'], 3,
+                            co2_growth=True)
+
+    assert ds['gamma'].dims == ('model', 'variable', 'lag_T', 'lag_dC')
+    assert (ds.nobs == years.size).all()
+    assert ds.rsquared.argmax(['lag_T', 'lag_dC'])['lag_T'].item() == 2
+
+    # Years before the uptake are used for the lags.
+    X = pd.DataFrame({'C': C[3:], 'T': T[2:-1], 'dC': np.diff(C)[1:-1]})
+    model = sm.OLS(U, sm.add_constant(X)).fit()
+    fit = ds.sel(model='CAMS', variable='Earth_Land', lag_T=1, lag_dC=1)
+
+    assert fit['beta'].item() == pytest.approx(model.params['C'])
+    assert fit['gamma'].item() == pytest.approx(model.params['T'])
+    assert fit['bse_delta'].item() == pytest.approx(model.bse['dC'])
+    assert fit['rsquared'].item() == pytest.approx(model.rsquared)
+
+    # Cached.
+    assert feedbacks.lag_scan(co2_noisy, temp, uptake, ['Earth_Land'], 3,
+                              co2_growth=True) is ds
+
+    with pytest.raises(ValueError):
+        feedbacks.lag_scan(co2_noisy, temp, uptake, ['Earth_Land'], 3,
+                           freq='day')
+
+def test_invf_regstats_diagnostics():
+    """ Check the collinearity diagnostics of the INVF regression statistics
+    against statsmodels and numpy.
+    """
+
+    from statsmodels.stats.outliers_influence import variance_inflation_factor
+
+    rng = np.random.default_rng(2)
+    years = np.arange(1980, 2018)
+    time = pd.to_datetime([f'{year}-12-31' for year in years])
+    C = co2.loc[1980:2017].values
+    uptake = {'CAMS': xr.Dataset(
+        {'Earth_Land': (('time'), 0.01 * C + rng.normal(size=years.size))},
+        coords={'time': time}
+    )}
+
+    df = feedbacks.invf(co2, temp, uptake, 'Earth_Land')
+    stats = df.regstats()['CAMS']
+
+    for start, end in df.time_periods['CAMS']:
+        model = df.fb_models['CAMS'][(start, end)]
+        row = stats.loc[start]
+        X = model.model.exog
+        scaled = X / np.linalg.norm(X, axis=0)
+        e = model.resid.values
+        r = (e[1:] * e[:-1]).sum() / (e ** 2).sum()
+
+        assert row['vif'] == pytest.approx(variance_inflation_factor(X, 1))
+        assert row['condition_number'] == pytest.approx(np.linalg.cond(scaled))
+        assert row['r_C_T'] == pytest.approx(np.corrcoef(X[:, 1:].T)[0, 1])
+        assert row['autocorrelation'] == pytest.approx(r)
+        assert row['dof_eff'] == pytest.approx(
+            min(model.nobs * (1 - r) / (1 + r), model.nobs) - 3)
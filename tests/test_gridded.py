@@ -0,0 +1,177 @@
+""" pytest: regression and gridded modules.
+"""
+
+
+""" IMPORTS """
+from core import regression
+from core import gridded
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+from statsmodels import api as sm
+
+import tempfile
+import os
+from scipy import stats
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global co2, temp, uptake
+
+    rng = np.random.default_rng(0)
+    years = np.arange(1960, 2018)
+    time = pd.to_datetime(years.astype(str), format='%Y')
+    lat = np.arange(-87.5, 90, 5.)
+    lon = np.arange(-177.5, 180, 5.)
+
+    co2 = pd.Series(315 + 1.5 * np.arange(years.size), index=years)
+    temp_values = (0.01 * np.arange(years.size)[:, None, None] +
+                   rng.normal(0, 0.1, (years.size, lat.size, lon.size)))
+    beta = rng.normal(0.02, 0.01, (lat.size, lon.size))
+    uptake_values = (beta * co2.values[:, None, None] - 0.5 * temp_values +
+                     rng.normal(0, 0.2, temp_values.shape))
+
+    # Missing temperatures and an empty (ocean) cell.
+    temp_values[:5, 0, 0] = np.nan
+    uptake_values[:, 1, 1] = np.nan
+
+    dims = ('time', 'latitude', 'longitude')
+    coords = {'time': time, 'latitude': lat, 'longitude': lon}
+    temp = xr.DataArray(temp_values, dims=dims, coords=coords)
+    uptake = xr.DataArray(uptake_values, dims=dims, coords=coords)
+
+
+""" TESTS """
+def test_ols_matches_statsmodels():
+    """ Check that the batched OLS matches statsmodels, with NaN values
+    dropped per regression.
+    """
+
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(4, 30, 2))
+    Y = X @ np.array([1., -2.]) + rng.normal(size=(4, 30))
+    Y[2, :3] = np.nan
+
+    fit = regression.ols(regression.add_constant(X), Y)
+
+    for i in range(4):
+        valid = ~np.isnan(Y[i])
+        model = sm.OLS(Y[i][valid], sm.add_constant(X[i][valid])).fit()
+
+        np.testing.assert_allclose(fit.params[i], model.params)
+        np.testing.assert_allclose(fit.bse[i], model.bse)
+        np.testing.assert_allclose(fit.tvalues[i], model.tvalues)
+        np.testing.assert_allclose(fit.pvalues[i], model.pvalues)
+        np.testing.assert_allclose(fit.cov_params[i], model.cov_params())
+        assert fit.rsquared[i] == pytest.approx(model.rsquared)
+        assert fit.nobs[i] == model.nobs
+
+def test_regression_maps():
+    """ Check the maps of one cell against statsmodels and that chunking
+    does not change the maps.
+    """
+
+    ds = gridded.SpatialFeedback(co2, temp, uptake).regression_maps()
+    assert ds.beta.dims == ('period', 'latitude', 'longitude')
+    assert list(ds.period.values) == [1960, 1970, 1980, 1990, 2000, 2008]
+
+    for cell in [(0, 0), (10, 20)]:
+        U = uptake[:, cell[0], cell[1]].sel(time=slice('1960', '1969')).values
+        T = temp[:, cell[0], cell[1]].sel(time=slice('1960', '1969')).values
+        C = co2.loc[1960:1969].values
+        valid = ~np.isnan(T)
+        X = sm.add_constant(np.stack([C, T], axis=1)[valid])
+        model = sm.OLS(U[valid], X).fit()
+
+        result = ds.isel(period=0, latitude=cell[0], longitude=cell[1])
+        assert result.beta.values == pytest.approx(model.params[1])
+        assert result.gamma.values == pytest.approx(model.params[2])
+        assert result.p_gamma.values == pytest.approx(model.pvalues[2])
+        assert result.nobs.values == model.nobs
+
+    assert np.isnan(ds.beta[:, 1, 1]).all()
+
+    chunked = gridded.SpatialFeedback(co2, temp, uptake,
+                                      chunk_size=100).regression_maps()
+    xr.testing.assert_allclose(ds, chunked)
+
+def test_params():
+    """ Check the single-predictor regressions and the feedback units.
+    """
+
+    df = gridded.SpatialFeedback(co2, temp, uptake, predictors=('C',))
+    maps = df.regression_maps()
+    params = df.params()
+
+    assert 'gamma' not in params
+    np.testing.assert_allclose(params.beta, maps.beta / 2.12)
+
+    with pytest.raises(ValueError):
+        gridded.SpatialFeedback(co2, temp, uptake, predictors=('U',))
+
+def test_cascading_window_trend():
+    """ Check the trend maps against linregress on each window of a cell, for
+    CO2 and time slopes and with time chunks shorter than the window.
+    """
+
+    for x, co2_series in ((co2.values * 2.12, co2), (co2.index.values, None)):
+        ds = gridded.SpatialTrend(uptake, co2_series).cascading_window_trend()
+
+        assert ds.CWT.dims == ('start_year', 'latitude', 'longitude')
+        assert list(ds.start_year.values) == list(range(1960, 2008))
+
+        y = uptake[:, 10, 20].values
+        expected = [stats.linregress(x[i:i+10], y[i:i+10]).slope
+                    for i in range(y.size - 10)]
+        np.testing.assert_allclose(ds.CWT[:, 10, 20], expected)
+
+    chunked = gridded.SpatialTrend(uptake, co2, chunk_size=100,
+                                   time_chunk=3).cascading_window_trend()
+    ds = gridded.SpatialTrend(uptake, co2).cascading_window_trend()
+    xr.testing.assert_allclose(ds, chunked)
+
+    # Cells with missing values are regressed on the valid time points only.
+    assert np.isnan(ds.CWT[:, 1, 1]).all()
+
+def test_cascading_window_trend_output():
+    """ Check that the trend maps are written to the destination.
+    """
+
+    destination = os.path.join(tempfile.mkdtemp(), 'cwt.nc')
+    ds = gridded.SpatialTrend(uptake).cascading_window_trend(
+        window_size=25, destination=destination
+    )
+
+    xr.testing.assert_allclose(ds, xr.open_dataset(destination))
+
+def test_band_power():
+    """ Check that band power maps locate the power of each cell in its band
+    and do not depend on chunking.
+    """
+
+    time = pd.date_range('1700-01', periods=2400, freq='MS')
+    months = np.arange(time.size)[:, None, None]
+    period = np.where(np.arange(4) < 2, 1, 3)[None, :, None]
+    values = np.sin(2 * np.pi * months / (12 * period)) * np.ones((1, 4, 3))
+    values[:, 3, 2] = np.nan
+
+    flux = xr.DataArray(values, dims=('time', 'latitude', 'longitude'),
+                        coords={'time': time, 'latitude': np.arange(4),
+                                'longitude': np.arange(3)})
+
+    ds = gridded.SpatialSpectrum(flux).band_power()
+    assert set(ds.data_vars) == {'seasonal', 'ENSO', 'decadal'}
+
+    # A sine wave has a variance of 0.5.
+    np.testing.assert_allclose(ds.seasonal[:2], 0.5, rtol=0.05)
+    np.testing.assert_allclose(ds.ENSO[2, :], 0.5, rtol=0.05)
+    assert (ds.ENSO[:2] < 0.01).all()
+    assert np.isnan(ds.seasonal[3, 2])
+
+    chunked = gridded.SpatialSpectrum(flux, chunk_size=1).band_power()
+    xr.testing.assert_allclose(ds, chunked)
@@ -0,0 +1,96 @@
+""" pytest: instrument module.
+"""
+
+
+""" IMPORTS """
+from core import instrument
+from core import synthetic
+from core import storage
+from core import temporal
+from core import regression
+
+import numpy as np
+import json
+import os
+import tempfile
+
+import pytest
+
+
+""" SETUP """
+def setup_function():
+    instrument.disable()
+
+def teardown_function():
+    instrument.disable()
+
+
+""" TESTS """
+def test_disabled():
+    """ Check that nothing is recorded while tracing is disabled.
+    """
+
+    assert not instrument.enabled()
+    assert instrument.stage('stage') is instrument.stage('other')
+
+    X = regression.add_constant(np.random.default_rng(0).random((2, 10, 1)))
+    regression.ols(X, X[..., 1])
+
+    assert instrument.disable() == []
+
+def test_nested_stages():
+    """ Check the fields and nesting of the records.
+    """
+
+    instrument.enable()
+
+    with instrument.stage('outer', input_file='file.nc'):
+        with instrument.stage('inner'):
+            np.ones((1000, 1000)).sum()
+
+    inner, outer = instrument.disable()
+
+    assert (inner['name'], inner['parent'], inner['depth']) == ('inner',
+                                                                'outer', 1)
+    assert (outer['parent'], outer['depth']) == (None, 0)
+    assert outer['input_file'] == 'file.nc'
+    assert outer['wall'] >= inner['wall'] > 0
+    assert outer['peak_rss'] > 0
+
+def test_pipeline_trace():
+    """ Check that the stages of a pipeline are traced to the file, and the
+    summary and Chrome trace of the file.
+    """
+
+    directory = tempfile.mkdtemp()
+    fname = os.path.join(directory, 'trace.jsonl')
+    instrument.enable(fname)
+
+    ds = synthetic.inversion_cube(10., periods=24)
+    arrays = temporal.TemporalAgg(ds).outputs(seasonal=False)
+    storage.write_output(arrays, os.path.join(directory, 'output'))
+
+    with pytest.raises(ValueError):
+        with instrument.stage('failed'):
+            raise ValueError
+    assert instrument.disable() == []
+
+    records = instrument.read_trace(fname)
+    assert set(records.name) == {'resample', 'write_netcdf', 'failed'}
+    assert (records.function[records.name == 'resample'] ==
+            'core.temporal.TemporalAgg.outputs').all()
+
+    writes = records[records.name == 'write_netcdf']
+    assert len(writes) == 4
+    assert (writes.write_bytes > 0).all()
+
+    df = instrument.summary(fname)
+    assert df.loc['write_netcdf', 'calls'] == 4
+    assert df.loc['write_netcdf', 'wall'] == pytest.approx(writes.wall.sum())
+
+    with open(instrument.chrome_trace(records,
+                                      os.path.join(directory, 'trace.json'))) as f:
+        events = json.load(f)['traceEvents']
+    assert len(events) == len(records)
+    assert events[0]['ph'] == 'X'
+    assert events[0]['args']['function'] == 'core.temporal.TemporalAgg.outputs'
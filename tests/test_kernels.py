@@ -0,0 +1,64 @@
+""" pytest: kernels module.
+"""
+
+
+""" IMPORTS """
+from core import kernels
+from core import synthetic
+
+import numpy as np
+import xarray as xr
+from scipy import sparse
+
+import pytest
+
+
+""" SETUP """
+ENGINES = ['numpy', pytest.param('numba', marks=pytest.mark.skipif(
+    not kernels.HAS_NUMBA, reason="numba is not installed"))]
+
+@pytest.fixture
+def cube():
+    return synthetic.inversion_cube(5., periods=150).Terrestrial_flux
+
+
+""" TESTS """
+@pytest.mark.parametrize('engine', ENGINES)
+def test_regional_sums(cube, engine):
+    """ Check the regional sums against xarray, with NaN treated as zero.
+    """
+
+    area = np.linspace(1, 2, cube.latitude.size)[:, np.newaxis] * \
+           np.ones(cube.longitude.size)
+    masks = np.stack([np.ones(area.shape, dtype=bool),
+                      np.broadcast_to(cube.latitude.values[:, np.newaxis] > 0,
+                                      area.shape),
+                      np.zeros(area.shape, dtype=bool)])
+    weights = sparse.csr_matrix((masks * area).reshape(3, -1))
+
+    totals = kernels.regional_sums(cube.values, weights, 2., engine=engine)
+
+    assert totals.shape == (3, cube.time.size)
+    for region, mask in enumerate(masks):
+        expected = (cube * (area * mask)).sum(('latitude', 'longitude')) * 2.
+        assert np.allclose(totals[region], expected)
+    assert not totals[2].any()
+
+    # A single region of dense weights.
+    assert np.allclose(kernels.regional_sums(cube.values, area, 2.,
+                                             engine=engine), totals[:1])
+
+def test_area_sum(cube):
+    """ Check that area_sum matches xarray for numpy and dask data.
+    """
+
+    area = np.full((cube.latitude.size, cube.longitude.size), 3.)
+    expected = (cube * area).sum(('latitude', 'longitude')) * 0.5
+
+    ds = xr.Dataset({'flux': cube})
+    assert np.allclose(kernels.area_sum(ds, area, 0.5).flux, expected)
+    assert np.allclose(kernels.area_sum(cube.chunk({'time': 50}), area, 0.5),
+                       expected)
+
+    with pytest.raises(ValueError):
+        kernels.regional_sums(cube.values, area[1:])
@@ -0,0 +1,107 @@
+""" pytest: ledger module.
+"""
+
+
+""" IMPORTS """
+from core import ledger
+from core import cli
+
+import os
+
+import pytest
+
+
+""" SETUP """
+def write(fname, text):
+    with open(fname, 'w') as f:
+        f.write(text)
+    return fname
+
+def task(fname, destination):
+    with open(fname) as f:
+        text = f.read()
+    if text == 'bad':
+        raise ValueError(fname)
+    return write(destination, text.upper())
+
+
+""" TESTS """
+def test_task_records(tmp_path):
+    """ Check the records of done and failed tasks, which persist in the
+    file.
+    """
+
+    fname = str(tmp_path / 'ledger.sqlite')
+    output = str(tmp_path / 'output.txt')
+
+    with ledger.Ledger(fname) as db:
+        with db.task('a', 'fp') as t:
+            t.outputs = write(output, 'a')
+
+        with pytest.raises(ValueError):
+            with db.task('b', 'fp'):
+                raise ValueError('b failed')
+
+    with ledger.Ledger(fname) as db:
+        record = db.get('a')
+        assert (record['status'], record['outputs'],
+                record['attempts']) == ('done', [output], 1)
+        assert db.status('b') == 'failed'
+        assert db.status('c') == 'pending'
+        assert db.failed() == {'b': "ValueError('b failed')"}
+        assert db.summary() == {'done': 1, 'failed': 1}
+
+        assert not db.should_run('a', 'fp')
+        assert db.should_run('a', 'changed')
+        assert db.should_run('b', 'fp') and db.should_run('c', 'fp')
+        assert [key for key in 'abc'
+                if db.should_run(key, 'fp', only_failed=True)] == ['b']
+
+        # Removed outputs are rerun.
+        os.remove(output)
+        assert db.should_run('a', 'fp')
+
+        with db.task('b', 'fp'):
+            pass
+        assert (db.status('b'), db.get('b')['attempts']) == ('done', 2)
+
+def test_fingerprint(tmp_path):
+    """ Check that the fingerprint changes with the files and parameters.
+    """
+
+    folder = tmp_path / 'inputs'
+    folder.mkdir()
+    fname = write(str(folder / 'year.nc'), 'data')
+
+    fingerprint = ledger.Ledger.fingerprint('CAMS', (str(folder), 10))
+    assert fingerprint == ledger.Ledger.fingerprint('CAMS', (str(folder), 10))
+    assert fingerprint != ledger.Ledger.fingerprint('CAMS', (str(folder), 20))
+
+    write(fname, 'more data')
+    assert fingerprint != ledger.Ledger.fingerprint('CAMS', (str(folder), 10))
+
+def test_resume(tmp_path):
+    """ Check that run_tasks skips the done tasks and can rerun only the
+    failed ones.
+    """
+
+    db = ledger.Ledger(str(tmp_path / 'ledger.sqlite'))
+    inputs = {key: write(str(tmp_path / f'{key}.txt'), text)
+              for key, text in (('a', 'a'), ('b', 'bad'), ('c', 'c'))}
+    tasks = [(key, task, (fname, str(tmp_path / f'{key}.out')), (fname,))
+             for key, fname in inputs.items()]
+
+    assert cli.run_tasks(tasks, ledger=db) == 1
+    assert db.summary() == {'done': 2, 'failed': 1}
+    mtime = os.stat(tmp_path / 'a.out').st_mtime_ns
+
+    # Nothing is rerun but the failed task.
+    assert cli.run_tasks(tasks, ledger=db, only_failed=True) == 1
+    assert db.get('b')['attempts'] == 2
+    assert os.stat(tmp_path / 'a.out').st_mtime_ns == mtime
+
+    write(inputs['b'], 'b')
+    assert cli.run_tasks(tasks, jobs=2, ledger=db) == 0
+    assert db.summary() == {'done': 3}
+    assert db.get('a')['attempts'] == 1
+    assert db.get('b')['outputs'] == [str(tmp_path / 'b.out')]
@@ -0,0 +1,170 @@
+""" pytest: regions module and SpatialAgg.regional_masks.
+"""
+
+
+""" IMPORTS """
+from core import regions
+from core import inv_flux as invf
+
+import numpy as np
+import xarray as xr
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global ds, lat, lon
+
+    lat = np.arange(-89.5, 90, 1.)
+    lon = np.arange(-179.5, 180, 1.)
+    # Inversions have cftime time coordinates.
+    time = xr.date_range('1980-01', periods=24, freq='MS', use_cftime=True)
+
+    rng = np.random.default_rng(0)
+    land = rng.normal(size=(time.size, lat.size, lon.size))
+    land[:, :, :90] = np.nan
+    ocean = rng.normal(size=(time.size, lat.size, lon.size))
+
+    dims = ('time', 'latitude', 'longitude')
+    ds = xr.Dataset(
+        {
+            'Terrestrial_flux': (dims, land),
+            'Ocean_flux': (dims, ocean)
+        },
+        coords={'time': time, 'latitude': lat, 'longitude': lon}
+    )
+
+
+""" TESTS """
+def test_latitudinal_masks():
+    """ Check that regional_masks with latitudinal masks gives the land and
+    ocean sinks of each latitudinal band.
+    """
+
+    df = invf.SpatialAgg(ds)
+    masks = regions.latitudinal_masks(lat, lon)
+    regional = df.regional_masks(masks)
+
+    assert set(regional.data_vars) == {f"{region}_{sink}"
+                                       for region in masks.names
+                                       for sink in ('Land', 'Ocean')}
+
+    area = xr.DataArray(df.earth_area_grid(lat, lon) * 1e-15,
+                        dims=('latitude', 'longitude'))
+    bands = {"Earth": (-90, 90), "South": (-90, -30),
+             "Tropical": (-30, 30), "North": (30, 90)}
+    for region, lats in bands.items():
+        band = (ds * area).sel(latitude=slice(*lats))
+        for var, sink in (('Terrestrial_flux', 'Land'), ('Ocean_flux', 'Ocean')):
+            expected = band[var].sum(('latitude', 'longitude')) * 30/365
+            np.testing.assert_allclose(regional[f"{region}_{sink}"].values,
+                                       expected.values)
+
+def test_latitudinal_splits_match_cuts():
+    """ Check that latitudinal_splits, which integrates the bands together,
+    matches the regional_cut of each band, with numpy and dask data.
+    """
+
+    bands = {"Earth": (-90, 90), "South": (-90, -30),
+             "Tropical": (-30, 30), "North": (30, 90)}
+
+    for chunks in (None, {'time': 10}):
+        df = invf.SpatialAgg(ds, chunks=chunks)
+        splits = df.latitudinal_splits()
+
+        for region, lats in bands.items():
+            cut = df.regional_cut(lats, (-180, 180))
+            for var, sink in (('Terrestrial_flux', 'Land'),
+                              ('Ocean_flux', 'Ocean')):
+                np.testing.assert_allclose(splits[f"{region}_{sink}"].values,
+                                           cut[var].values)
+
+def test_region_ids():
+    """ Check that masks from a region ID grid integrate each region.
+    """
+
+    ids = np.zeros((lat.size, lon.size))
+    ids[:, :180] = 1
+    ids[:, 180:] = 2
+    ids[:10] = np.nan
+    id_grid = xr.DataArray(ids, dims=('latitude', 'longitude'),
+                           coords={'latitude': lat, 'longitude': lon})
+
+    masks = regions.RegionMask(id_grid, names={1: 'West', 2: 'East'})
+    assert masks.names == ['West', 'East']
+
+    totals = masks.integrate(ds.Ocean_flux)
+    expected = ds.Ocean_flux.isel(latitude=slice(10, None),
+                                  longitude=slice(None, 180)).sum(('latitude',
+                                                                   'longitude'))
+    np.testing.assert_allclose(totals.sel(region='West').values,
+                               expected.values)
+
+def test_weights_cached():
+    """ Check that the weights of a mask are computed once per grid.
+    """
+
+    masks = regions.latitudinal_masks(lat, lon)
+
+    assert masks.weights(lat, lon) is masks.weights(lat, lon)
+    assert masks.weights(lat, lon) is not masks.weights(lat[::2], lon[::2])
+
+def test_regrid():
+    """ Check that regridding a mask takes the nearest grid cell.
+    """
+
+    masks = regions.latitudinal_masks(lat, lon)
+    coarse_lat = np.arange(-88, 90, 4.)
+    coarse_lon = np.arange(-178, 180, 4.)
+    coarse = masks.regrid(coarse_lat, coarse_lon)
+
+    expected = regions.latitudinal_masks(coarse_lat, coarse_lon)
+    assert (coarse.masks == expected.masks).all()
+
+def test_regrid_longitude_conventions():
+    """ Check that a mask on a -180..180 grid is regridded to a 0..360 grid
+    (and back) by longitude modulo 360.
+    """
+
+    west = regions.RegionMask({'West': np.broadcast_to(lon < 0,
+                                                       (lat.size, lon.size))},
+                              lat, lon)
+    lon_360 = np.arange(0.5, 360, 1.)
+    regridded = west.regrid(lat, lon_360)
+
+    assert regridded.masks.sum() == west.masks.sum()
+    assert (regridded.masks[0] == (lon_360 > 180)[np.newaxis]).all()
+
+    back = regridded.regrid(lat, lon)
+    assert (back.masks == west.masks).all()
+
+    # Nearest across the wrap: -0.2 is next to 359.5, not 0.5.
+    assert regions._nearest(lon_360, [-0.2])[0] == 0
+    assert regions._nearest(lon_360, [-0.2], period=360)[0] == 359
+
+def test_weights_cache_bounded(monkeypatch):
+    """ Check that only the weights of the most recently used grids are
+    kept.
+    """
+
+    monkeypatch.setattr(regions, 'MAX_WEIGHTS', 2)
+    monkeypatch.setattr(regions, '_WEIGHTS_CACHE', regions.OrderedDict())
+    masks = regions.latitudinal_masks(lat, lon)
+
+    first = masks.weights(lat, lon)
+    second = masks.weights(lat[::2], lon[::2])
+    assert masks.weights(lat, lon) is first
+
+    masks.weights(lat[::3], lon[::3])
+    assert len(regions._WEIGHTS_CACHE) == 2
+    assert masks.weights(lat, lon) is first
+    assert masks.weights(lat[::2], lon[::2]) is not second
+
+def test_dictionary_needs_grid():
+    """ Check that a dictionary of masks without a grid raises an error.
+    """
+
+    with pytest.raises(ValueError):
+        regions.RegionMask({'Earth': np.ones((lat.size, lon.size))})
@@ -0,0 +1,79 @@
+""" pytest: spectral module.
+"""
+
+
+""" IMPORTS """
+from core import spectral
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+from scipy import signal
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global models
+
+    rng = np.random.default_rng(0)
+    time = pd.date_range('1959-01', periods=720, freq='MS')
+
+    models = {}
+    for model in ('CABLE', 'LPJ', 'OCN'):
+        models[model] = xr.Dataset(
+            {
+                'Earth_Land': (('time'), rng.normal(size=time.size)),
+                'North_Land': (('time'), np.sin(np.arange(time.size)
+                                                 * np.pi / 6))
+            },
+            coords={'time': (('time'), time)}
+        )
+
+
+""" TESTS """
+def test_stack():
+    """ Check the dimensions of stacked models and the common time points.
+    """
+
+    data = dict(models)
+    data['short'] = models['LPJ'].isel(time=slice(12, None))
+    da = spectral.stack(data)
+
+    assert da.dims == ('model', 'variable', 'time')
+    assert da.shape == (4, 2, 708)
+
+def test_welch_matches_scipy():
+    """ Check that the batched spectra match scipy.signal.welch on each
+    series.
+    """
+
+    spec = spectral.power_spectrum(models, fs=12)
+    assert spec.dims == ('model', 'variable', 'frequency')
+
+    freqs, expected = signal.welch(models['LPJ'].Earth_Land.values, fs=12)
+    np.testing.assert_allclose(spec.frequency, freqs)
+    np.testing.assert_allclose(spec.sel(model='LPJ', variable='Earth_Land'),
+                               expected)
+    np.testing.assert_allclose(spec.period[1:], 1 / freqs[1:])
+
+def test_methods():
+    """ Check that every method finds the annual cycle and that the white
+    noise spectra integrate to the variance.
+    """
+
+    for method in spectral.METHODS:
+        spec = spectral.power_spectrum(models, fs=12, method=method)
+
+        peak = spec.sel(model='OCN', variable='North_Land').argmax('frequency')
+        peak = peak.item()
+        assert spec.period[peak].item() == pytest.approx(1, rel=0.05)
+
+        noise = spec.sel(model='CABLE', variable='Earth_Land')
+        variance = (noise * spec.frequency[1].item()).sum().item()
+        assert variance == pytest.approx(1, rel=0.2)
+
+    with pytest.raises(ValueError):
+        spectral.power_spectrum(models, fs=12, method='fft')
@@ -0,0 +1,132 @@
+""" pytest: statespace module and feedbacks.time_varying.
+"""
+
+
+""" IMPORTS """
+from core import statespace
+from core import regression
+from core import feedbacks
+from core import synthetic
+
+import numpy as np
+
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global X, Y, beta
+
+    rng = np.random.default_rng(0)
+    batch, n = 4, 60
+
+    # Predictors that vary enough for the coefficients to be identified at
+    # each time point.
+    C = rng.normal(0, 50, (batch, n))
+    T = np.linspace(0, 1, n) + rng.normal(0, 0.2, (batch, n))
+    X = regression.add_constant(np.stack([C, T], axis=-1))
+
+    # Beta drifts as a random walk in the first two series only.
+    beta = np.full((batch, n), 0.02)
+    beta[:2] += np.cumsum(rng.normal(0, 0.002, (2, n)), axis=1)
+    Y = 1 + beta * C - 2 * T + rng.normal(0, 0.1, (batch, n))
+    Y[3, 10:15] = np.nan
+
+
+""" TESTS """
+def test_constant():
+    """ Check that constant coefficients give the OLS fit of each series.
+    """
+
+    result = statespace.smooth(X, Y, state_ratio=0.)
+    ols = regression.ols(X, Y)
+
+    assert result.params.shape == X.shape
+    for t in (0, 30, 59):
+        assert np.allclose(result.params[:, t], ols.params, rtol=1e-3)
+        assert np.allclose(result.bse[:, t], ols.bse, rtol=1e-3)
+    assert np.array_equal(result.nobs, ols.nobs)
+    assert not result.state_var.any()
+
+def test_tuned():
+    """ Check that tuning finds the drift of beta, which the smoother
+    tracks, and keeps constant coefficients of the other series.
+    """
+
+    result = statespace.smooth(X, Y)
+
+    assert (result.loglike >= statespace.loglike(X, Y, 0.) - 1e-9).all()
+    assert (result.state_ratio[:2, 1] > 0).all()
+
+    error = np.abs(result.params[:2, :, 1] - beta[:2])
+    constant = np.abs(regression.ols(X[:2], Y[:2]).params[:, 1:2] - beta[:2])
+    assert error.mean() < 0.5 * constant.mean()
+
+    # The ratios of a series do not depend on the rest of the batch.
+    assert np.array_equal(statespace.tune(X[2:], Y[2:]),
+                          result.state_ratio[2:])
+
+    assert not statespace.tune(X, Y, vary=[False, True, True])[:, 0].any()
+
+def test_empty_series():
+    """ Check that a series without observations has no estimates.
+    """
+
+    Y_empty = Y.copy()
+    Y_empty[1] = np.nan
+    result = statespace.smooth(X, Y_empty, state_ratio=0.1)
+
+    assert result.nobs[1] == 0
+    assert np.isnan(result.params[1]).all()
+    assert np.isnan(result.bse[1]).all()
+    assert np.isfinite(result.params[[0, 2, 3]]).all()
+
+def test_time_varying():
+    """ Check the dimensions of the time-varying feedbacks of several models
+    and variables.
+    """
+
+    feedbacks.clear()
+    co2 = synthetic.co2_series()
+    temp = synthetic.timeseries(('Earth',), 1957, 2018, co2, seed=9)
+    uptake = {model: synthetic.timeseries(seed=i)
+              for i, model in enumerate(('CAMS', 'Rayner'))}
+    uptake['Rayner'] = uptake['Rayner'].sel(time=slice('1992', '2009'))
+
+    ds = feedbacks.time_varying(co2, temp, uptake,
+                                ['Earth_Land', 'Earth_Ocean'])
+
+    assert ds.beta.dims == ('model', 'variable', 'time')
+    assert ds.beta.shape == (2, 2, 60) and ds.time[0] == 1959
+    assert ds.state_var_gamma.shape == (2, 2)
+    assert np.isfinite(ds.cov_beta_gamma.sel(model='CAMS')).all()
+
+    # Rayner is only estimated over its own years.
+    rayner = ds.beta.sel(model='Rayner')
+    assert np.isfinite(rayner.sel(time=slice(1992, 2009))).all()
+    assert rayner.sel(time=slice(None, 1991)).isnull().all()
+    assert rayner.sel(time=slice(2010, None)).isnull().all()
+    assert feedbacks.time_varying(co2, temp, uptake,
+                                  ['Earth_Land', 'Earth_Ocean']) is ds
+
+    ds = feedbacks.time_varying(co2, temp, uptake, ['Earth_Land'],
+                                predictors=('T',), state_ratio=0.)
+    assert 'beta' not in ds and ds.gamma.shape == (2, 1, 60)
+
+def test_time_varying_before_co2():
+    """ Check that years before the CO2 record are not estimated.
+    """
+
+    feedbacks.clear()
+    co2 = synthetic.co2_series()
+    temp = synthetic.timeseries(('Earth',), 1957, 2018, co2, seed=9)
+    uptake = {'CABLE-POP': synthetic.timeseries(('Earth_Land',), 1901, 2018,
+                                                seed=3)}
+
+    ds = feedbacks.time_varying(co2, temp, uptake, ['Earth_Land'])
+    beta = ds.beta.sel(model='CABLE-POP', variable='Earth_Land')
+
+    assert ds.time[0] == 1901
+    assert beta.sel(time=slice(None, 1956)).isnull().all()
+    assert ds.gamma.sel(time=slice(None, 1956)).isnull().all()
+    assert np.isfinite(beta.sel(time=slice(1957, None))).all()
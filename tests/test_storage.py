@@ -0,0 +1,200 @@
+""" pytest: storage module.
+"""
+
+
+""" IMPORTS """
+from core import storage
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+import tempfile
+import os
+from collections import namedtuple
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global arrays
+
+    time = pd.date_range('1980-01', periods=120, freq='MS')
+    values = np.sin(np.arange(120) * np.pi / 6) + np.linspace(0, 1, 120)
+    month = xr.Dataset(
+        {
+            'Earth_Land': (('time'), values),
+            'Earth_Ocean': (('time'), -values)
+        },
+        coords={'time': (('time'), time)}
+    )
+
+    arrays = {
+        'month': month,
+        'year': month.isel(time=slice(None, None, 12)),
+        'whole': month.sum()
+    }
+
+
+""" TESTS """
+def test_default_profile_is_original_layout():
+    """ Check that the default profile writes one float64 file per time
+    resolution.
+    """
+
+    output_folder = tempfile.mkdtemp()
+    storage.write_output(arrays, output_folder)
+
+    assert sorted(os.listdir(output_folder)) == ['month.nc', 'whole.nc',
+                                                 'year.nc']
+
+    month = xr.open_dataset(os.path.join(output_folder, 'month.nc'))
+    assert month.Earth_Land.dtype == np.float64
+    assert month == arrays['month']
+
+def test_profiles_read_back():
+    """ Check that outputs written with every profile are read back by
+    open_output with float32 precision.
+    """
+
+    for profile in storage.PROFILES:
+        output_folder = tempfile.mkdtemp()
+        storage.write_output(arrays, output_folder, profile)
+
+        for freq in arrays:
+            ds = storage.open_output(output_folder, freq)
+            assert np.allclose(ds.Earth_Land.values,
+                               arrays[freq].Earth_Land.values, atol=1e-5)
+
+def test_single_file_layout():
+    """ Check that the single file profile writes one file with a group per
+    time resolution.
+    """
+
+    output_folder = tempfile.mkdtemp()
+    storage.write_output(arrays, output_folder, 'single')
+
+    assert os.listdir(output_folder) == [storage.SINGLE_FILE]
+    assert storage.open_output(output_folder, 'year').Earth_Land.dtype == np.float32
+
+    with pytest.raises(FileNotFoundError):
+        storage.open_output(output_folder, 'decade')
+
+def test_switch_layout():
+    """ Check that rewriting a folder with the other layout removes the
+    outputs of the previous layout, so that open_output reads the new ones.
+    """
+
+    output_folder = tempfile.mkdtemp()
+    storage.write_output(arrays, output_folder)
+    storage.open_output(output_folder, 'year').close()
+
+    doubled = {freq: ds * 2 for freq, ds in arrays.items()}
+    storage.write_output(doubled, output_folder, 'single')
+
+    assert os.listdir(output_folder) == [storage.SINGLE_FILE]
+    with storage.open_output(output_folder, 'year') as ds:
+        assert np.allclose(ds.Earth_Land.values,
+                           doubled['year'].Earth_Land.values, atol=1e-5)
+
+    # The single file is kept while it has time resolutions without a file.
+    storage.write_output({'year': arrays['year']}, output_folder)
+    assert sorted(os.listdir(output_folder)) == [storage.SINGLE_FILE,
+                                                 'year.nc']
+    with storage.open_output(output_folder, 'month') as ds:
+        assert np.allclose(ds.Earth_Land.values,
+                           doubled['month'].Earth_Land.values, atol=1e-5)
+
+    storage.write_output(arrays, output_folder)
+    assert sorted(os.listdir(output_folder)) == ['month.nc', 'whole.nc',
+                                                 'year.nc']
+    with storage.open_output(output_folder, 'year') as ds:
+        assert np.allclose(ds.Earth_Land.values,
+                           arrays['year'].Earth_Land.values)
+
+def test_failed_outputs():
+    """ Check that, unless strict, the outputs that cannot be written are
+    returned and the others are still written, in both layouts.
+    """
+
+    # Python objects cannot be written to netCDF.
+    bad = {'month': arrays['month'], 'decade': xr.Dataset({'x': object()}),
+           'year': arrays['year']}
+
+    with pytest.raises(Exception):
+        storage.write_output(bad, tempfile.mkdtemp())
+
+    for profile in ('default', 'single'):
+        output_folder = tempfile.mkdtemp()
+        failed = storage.write_output(bad, output_folder, profile,
+                                      strict=False)
+
+        assert list(failed) == ['decade']
+        for freq in ('month', 'year'):
+            ds = storage.open_output(output_folder, freq)
+            assert np.allclose(ds.Earth_Land.values,
+                               arrays[freq].Earth_Land.values, atol=1e-5)
+
+def test_encoding():
+    """ Check the encoding of time chunks and scalar variables.
+    """
+
+    profile = storage.EncodingProfile('float32', 'zlib', 5, time_chunk=50)
+
+    month_encoding = profile.encoding(arrays['month'])['Earth_Land']
+    assert month_encoding['chunksizes'] == (50,)
+    assert month_encoding['complevel'] == 5
+
+    whole_encoding = profile.encoding(arrays['whole'])['Earth_Land']
+    assert whole_encoding == {'dtype': np.dtype('float32')}
+
+    with pytest.raises(ValueError):
+        storage.EncodingProfile(compression='gzip')
+
+def test_convert_pickle():
+    """ Check that a pickled cube converted to netCDF is opened lazily by
+    open_cube with the same values.
+    """
+
+    import pickle
+
+    output_folder = tempfile.mkdtemp()
+    fname = os.path.join(output_folder, 'month.pickle')
+    with open(fname, 'wb') as pickle_file:
+        pickle.dump(arrays['month'], pickle_file)
+
+    destination = storage.convert_pickle(fname,
+                                         os.path.join(output_folder, 'month.nc'),
+                                         time_chunk=12)
+    ds = storage.open_cube(destination)
+
+    assert ds.Earth_Land.encoding['chunksizes'] == (12,)
+    assert ds == arrays['month']
+
+    with pytest.warns(DeprecationWarning):
+        assert storage.open_cube(fname) == arrays['month']
+
+def test_save_result():
+    """ Check that results are saved with an extension matching their type.
+    """
+
+    output_folder = tempfile.mkdtemp()
+    Trend = namedtuple('Trend', ['GCP_slope', 'model_slope', 'diff'])
+
+    results = {
+        'series.pik': (arrays['month'].Earth_Land.to_series(), '.csv'),
+        'trend.pik': (Trend(1., 2., -50.), '.csv'),
+        'bandpass.pik': (np.arange(10.), '.npy'),
+        'month.pik': (arrays['month'], '.nc')
+    }
+
+    for fname, (result, extension) in results.items():
+        destination = storage.save_result(result,
+                                          os.path.join(output_folder, fname))
+        assert destination.endswith(extension)
+        storage.load_result(destination)
+
+    trend = storage.load_result(os.path.join(output_folder, 'trend.csv'))
+    assert trend.loc['GCP_slope', 'Trend'] == 1.
+    assert trend.loc['diff', 'Trend'] == -50.
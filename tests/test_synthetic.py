@@ -0,0 +1,89 @@
+""" pytest: synthetic module.
+"""
+
+
+""" IMPORTS """
+from core import synthetic
+
+import numpy as np
+import pandas as pd
+import cftime
+import os
+import tempfile
+
+import pytest
+
+
+""" TESTS """
+def test_calendars():
+    """ Check the time points of each calendar.
+    """
+
+    expected = {
+        'gregorian': np.datetime64,
+        'noleap': cftime.DatetimeNoLeap,
+        '360_day': cftime.Datetime360Day
+    }
+
+    for calendar, time_type in expected.items():
+        ds = synthetic.trendy_cube(10., periods=24, calendar=calendar)
+        assert isinstance(ds.time.values[0], time_type)
+        assert ds.nbp.shape == (24, 18, 36)
+
+    with pytest.raises(ValueError):
+        synthetic.time_axis(calendar='julian')
+
+def test_nan_patterns():
+    """ Check the missing values of each pattern.
+    """
+
+    lat, lon = synthetic.grid(5.)
+    land = synthetic.land_mask(lat, lon)
+    assert 0.2 < land.mean() < 0.45
+
+    ds = synthetic.trendy_cube(5., periods=12, nan='ocean')
+    assert np.isnan(ds.nbp.values[:, ~land]).all()
+    assert not np.isnan(ds.nbp.values[:, land]).any()
+
+    ds = synthetic.hadcrut_cube(5., periods=120, nan='random',
+                                nan_fraction=0.2)
+    assert ds.temperature_anomaly.isnull().mean() == pytest.approx(0.2,
+                                                                   abs=0.02)
+
+    ds = synthetic.inversion_cube(5., periods=120, nan='gaps',
+                                  nan_fraction=0.2)
+    gaps = ds.Ocean_flux.isnull().all(dim=('latitude', 'longitude'))
+    assert gaps.any()
+    assert ds.Ocean_flux.isnull().sum() == gaps.sum() * lat.size * lon.size
+
+    with pytest.raises(ValueError):
+        synthetic.trendy_cube(5., periods=12, nan='coast')
+
+def test_reproducible():
+    """ Check that the same arguments give the same data.
+    """
+
+    first = synthetic.inversion_cube(5., periods=12, seed=3)
+    second = synthetic.inversion_cube(5., periods=12, seed=3)
+
+    assert first.identical(second)
+    assert not first.identical(synthetic.inversion_cube(5., periods=12))
+
+def test_write_data_dir():
+    """ Check that the csv files are read as the data folder files.
+    """
+
+    directory = tempfile.mkdtemp()
+    synthetic.write_data_dir(directory)
+
+    co2 = pd.read_csv(os.path.join(directory, 'data/CO2/co2_year.csv'),
+                      index_col='Year')['CO2']
+    co2_month = pd.read_csv(os.path.join(directory, 'data/CO2/co2_month.csv'),
+                            index_col=['Year', 'Month'])['CO2']
+    budget = pd.read_csv(os.path.join(directory, 'data/GCP/budget.csv'),
+                         index_col='Year')
+
+    assert co2.index[0] == 1957 and co2.index[-1] == 2018
+    assert co2_month.shape == (62 * 12,)
+    assert list(budget.columns) == list(synthetic.BUDGET_COLUMNS)
+    assert list(budget.iloc[:, [3, 4]].columns) == ['ocean sink', 'land sink']
@@ -0,0 +1,132 @@
+""" pytest: temporal module.
+"""
+
+
+""" IMPORTS """
+from core import temporal
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+
+import pytest
+
+
+""" SETUP """
+def setup_module(module):
+    print('--------------------setup--------------------')
+    global ds, cf_ds
+
+    rng = np.random.default_rng(0)
+
+    # Monthly data from July 1959 with missing values and a gap in 1970-1971.
+    time = pd.date_range('1959-07', '1985-12', freq='MS')
+    keep = (time.year < 1970) | (time.year > 1971)
+    values = rng.normal(size=(time.size, 2))
+    values[3, 0] = np.nan
+    values[30:42, 1] = np.nan
+
+    ds = xr.Dataset(
+        {
+            'Earth_Land': (('time'), values[keep, 0]),
+            'Earth_Ocean': (('time'), values[keep, 1])
+        },
+        coords={'time': (('time'), time[keep])}
+    )
+
+    cf_time = xr.date_range('1959-07', '1985-12', freq='MS',
+                            calendar='360_day', use_cftime=True)
+    cf_ds = xr.Dataset(
+        {'Earth_Land': (('time'), values[:, 0])},
+        coords={'time': (('time'), cf_time)}
+    )
+
+
+""" TESTS """
+def test_year():
+    """ Check the yearly sums and means, including the NaN and gap years.
+    """
+
+    year = temporal.TemporalAgg(ds).year()
+    assert year.time.values[0] == np.datetime64('1959-12-31')
+    assert year.time.size == 27
+
+    expected = ds.Earth_Land.sel(time='1960').sum().values
+    assert year.Earth_Land.sel(time='1960').item() == pytest.approx(expected)
+
+    # 1962 has only NaN values and 1970 has no time points.
+    assert year.Earth_Ocean.sel(time='1962').item() == 0
+    assert np.isnan(year.Earth_Land.sel(time='1970').values).all()
+
+    mean = temporal.TemporalAgg(ds, how='mean').year()
+    assert np.isnan(mean.Earth_Ocean.sel(time='1962').values).all()
+    expected = ds.Earth_Land.sel(time='1962').mean().values
+    assert mean.Earth_Land.sel(time='1962').item() == pytest.approx(expected)
+
+def test_decade():
+    """ Check that decades follow pandas' '10Y' bins by default and the
+    anchor otherwise.
+    """
+
+    agg = temporal.TemporalAgg(ds)
+
+    decade = agg.decade()
+    assert list(pd.to_datetime(decade.time.values).year) == [1959, 1969,
+                                                             1979, 1989]
+    expected = ds.Earth_Land.sel(time=slice('1960', '1969')).sum().values
+    assert decade.Earth_Land.values[1] == pytest.approx(expected)
+
+    decade = agg.decade(anchor=1964)
+    assert list(pd.to_datetime(decade.time.values).year) == [1964, 1974,
+                                                             1984, 1994]
+    expected = ds.Earth_Land.sel(time=slice('1975', '1984')).sum().values
+    assert decade.Earth_Land.values[2] == pytest.approx(expected)
+
+def test_whole():
+    """ Check the whole-period sums and means.
+    """
+
+    assert (temporal.TemporalAgg(ds).whole().Earth_Land.values ==
+            pytest.approx(ds.Earth_Land.sum().values))
+    assert (temporal.TemporalAgg(ds, how='mean').whole().Earth_Ocean.values ==
+            pytest.approx(ds.Earth_Ocean.mean().values))
+
+def test_seasonal():
+    """ Check that the seasonal sums match the positive and negative sums of
+    each year present in the data.
+    """
+
+    seasonal = temporal.TemporalAgg(ds).seasonal()
+    years = np.unique(ds.time.dt.year.values)
+
+    assert (pd.to_datetime(seasonal['summer'].time.values).year ==
+            years).all()
+
+    for year, summer, winter in zip(years,
+                                    seasonal['summer'].Earth_Land.values,
+                                    seasonal['winter'].Earth_Land.values):
+        values = ds.Earth_Land.sel(time=str(year)).values
+        assert summer == pytest.approx(values[values < 0].sum())
+        assert winter == pytest.approx(values[values >= 0].sum())
+
+def test_cftime_calendar():
+    """ Check that cftime labels keep the calendar of the data.
+    """
+
+    year = temporal.TemporalAgg(cf_ds).year()
+    label = year.time.values[0]
+
+    assert label.calendar == '360_day'
+    assert (label.year, label.month, label.day) == (1959, 12, 30)
+
+def test_outputs():
+    """ Check the time resolutions of outputs and the monthly check.
+    """
+
+    arrays = temporal.TemporalAgg(ds).outputs()
+    assert list(arrays) == ['month', 'year', 'decade', 'whole', 'summer',
+                            'winter']
+    assert 'summer' not in temporal.TemporalAgg(ds).outputs(seasonal=False)
+
+    with pytest.raises(ValueError):
+        temporal.TemporalAgg(xr.concat([ds, ds], dim='time'))
@@ -0,0 +1,96 @@
+""" pytest: units module and the month lengths of SpatialAgg.
+"""
+
+
+""" IMPORTS """
+from core import units
+from core import synthetic
+from core import trendy_flux
+from core import inv_flux
+
+import numpy as np
+import xarray as xr
+
+import pytest
+
+
+""" SETUP """
+def time(calendar, start='2000-01', periods=24, freq='MS'):
+    return xr.DataArray(synthetic.time_axis(start, periods, freq, calendar),
+                        dims='time', name='time')
+
+
+""" TESTS """
+def test_fixed():
+    """ Check that fixed months are scalars of 30 days.
+    """
+
+    t = time('gregorian')
+    assert units.step_days(t, month_length='fixed') == 30
+    assert units.year_fractions(t, month_length='fixed') == 30 / 365
+    assert units.step_seconds(t, month_length='fixed') == 30 * 24 * 3600
+
+    with pytest.raises(ValueError):
+        units.step_days(t, month_length='exact')
+
+@pytest.mark.parametrize('calendar, february, year',
+                         [('gregorian', 29, 366), ('noleap', 28, 365),
+                          ('360_day', 30, 360)])
+def test_calendar(calendar, february, year):
+    """ Check the calendar month lengths, which sum to whole years and are
+    computed once per time axis.
+    """
+
+    t = time(calendar)
+    days = units.step_days(t, month_length='calendar')
+
+    assert days[1] == february and days[:12].sum() == year
+    assert np.allclose(units.year_fractions(t, month_length='calendar')
+                       .reshape(2, 12).sum(axis=1), 1.)
+    assert np.array_equal(units.step_seconds(t, month_length='calendar'),
+                          days * 24 * 3600)
+
+    assert units.step_days(time(calendar), month_length='calendar') is days
+    assert not days.flags.writeable
+
+    years = time(calendar, '2000', 3, 'YS')
+    assert np.array_equal(units.step_days(years, 'Y', 'calendar'),
+                          [year, year - (calendar == 'gregorian'),
+                           year - (calendar == 'gregorian')])
+
+def test_spatial_agg():
+    """ Check that calendar months scale the TRENDY uptake by the days of
+    each month over 30.
+    """
+
+    cube = synthetic.trendy_cube(10., periods=24)
+
+    splits = {}
+    for month_length in ('fixed', 'calendar'):
+        df = trendy_flux.SpatialAgg(cube, month_length=month_length,
+                                    time_resolution='M', model='OCN')
+        splits[month_length] = df.latitudinal_splits()
+
+    # The integration stops before the last month.
+    days = units.step_days(df.data.time, month_length='calendar')[:-1]
+    assert np.allclose(splits['calendar'].Earth_Land,
+                       splits['fixed'].Earth_Land * days / 30)
+    assert 28 in days
+
+def test_inversion_spatial_agg():
+    """ Check that calendar months scale the inversion uptake by the fraction
+    of the year of each month over 30/365.
+    """
+
+    cube = synthetic.inversion_cube(10., periods=24)
+
+    splits = {}
+    for month_length in ('fixed', 'calendar'):
+        df = inv_flux.SpatialAgg(cube, month_length=month_length)
+        splits[month_length] = df.latitudinal_splits()
+
+    time = splits['fixed'].time
+    fractions = units.year_fractions(df.data.time.sel(time=time),
+                                     month_length='calendar')
+    assert np.allclose(splits['calendar'].Earth_Land,
+                       splits['fixed'].Earth_Land * fractions * 365 / 30)